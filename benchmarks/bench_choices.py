@@ -0,0 +1,164 @@
+"""Benchmarks of ``Choices`` on its own: construction, lookups, subsets, pickling and copies."""
+
+from __future__ import unicode_literals
+
+import pickle
+from copy import deepcopy
+
+from extended_choices import AutoChoices, Choices, OrderedChoices
+from extended_choices.choicesets import ChoiceSet
+
+SIZES = [10, 1000, 10000]
+
+
+def make_choices(size):
+    """Return a list of ``size`` choices tuples."""
+    return [('C%d' % index, index, 'Choice %d' % index) for index in range(size)]
+
+
+class Construction(object):
+    """Creation of ``Choices`` instances."""
+
+    params = SIZES
+
+    def setup(self, size):
+        self.choices = make_choices(size)
+        self.constants = [choice[0] for choice in self.choices]
+
+    def time_choices(self, size):
+        Choices(*self.choices)
+
+    def time_ordered_choices(self, size):
+        OrderedChoices(*self.choices)
+
+    def time_auto_choices(self, size):
+        AutoChoices(*self.constants)
+
+
+class Lookups(object):
+    """Access to the entries and values of a ``Choices``."""
+
+    params = SIZES
+
+    def setup(self, size):
+        self.choices = Choices(*make_choices(size))
+        self.index = size // 2
+        self.constant = 'C%d' % self.index
+        self.display = 'Choice %d' % self.index
+
+    def time_for_value(self, size):
+        self.choices.for_value(self.index)
+
+    def time_for_constant(self, size):
+        self.choices.for_constant(self.constant)
+
+    def time_for_display(self, size):
+        self.choices.for_display(self.display)
+
+    def time_get_for_value(self, size):
+        self.choices.get_for_value(self.index)
+
+    def time_get_for_value_missing(self, size):
+        self.choices.get_for_value(-1)
+
+    def time_for_value_missing(self, size):
+        try:
+            self.choices.for_value(-1)
+        except KeyError:
+            pass
+
+    def time_getitem_constant(self, size):
+        self.choices[self.constant]
+
+    def time_getitem_index(self, size):
+        self.choices[self.index]
+
+    def time_attribute(self, size):
+        getattr(self.choices, self.constant)
+
+    def time_contains(self, size):
+        self.index in self.choices
+
+    def time_contains_missing(self, size):
+        -1 in self.choices
+
+
+class Subsets(object):
+    """Creation of subsets."""
+
+    params = SIZES
+
+    def setup(self, size):
+        self.choices = Choices(*make_choices(size))
+        self.constants = ['C%d' % index for index in range(0, size, 2)]
+
+    def time_extract_subset(self, size):
+        self.choices.extract_subset(*self.constants)
+
+
+class Sets(object):
+    """Sets of entries, as ``ChoiceSet`` or as ``frozenset`` of values."""
+
+    params = [10, 60, 1000]
+
+    def setup(self, size):
+        self.choices = Choices(*make_choices(size))
+        self.even_values = list(range(0, size, 2))
+        self.low_values = list(range(size // 2))
+        self.even = ChoiceSet(self.choices, self.even_values)
+        self.low = ChoiceSet(self.choices, self.low_values)
+        self.even_frozenset = frozenset(self.even_values)
+        self.low_frozenset = frozenset(self.low_values)
+        self.looked_up = list(range(0, size, max(size // 10, 1)))
+
+    def time_create_choice_set(self, size):
+        ChoiceSet(self.choices, self.even_values)
+
+    def time_create_frozenset(self, size):
+        frozenset(self.even_values)
+
+    def time_intersect_choice_sets(self, size):
+        (self.even & self.low) | (self.even - self.low)
+
+    def time_intersect_frozensets(self, size):
+        (self.even_frozenset & self.low_frozenset) | (self.even_frozenset - self.low_frozenset)
+
+    def time_contains_choice_set(self, size):
+        even = self.even
+        for value in self.looked_up:
+            value in even  # noqa: B015 pylint: disable=pointless-statement
+
+    def time_contains_frozenset(self, size):
+        even = self.even_frozenset
+        for value in self.looked_up:
+            value in even  # noqa: B015 pylint: disable=pointless-statement
+
+    def time_hash_choice_set(self, size):
+        hash(ChoiceSet(self.choices, self.even_values))
+
+    def time_hash_frozenset(self, size):
+        hash(frozenset(self.even_values))
+
+
+class Copies(object):
+    """Pickling and copies of ``Choices`` and entries."""
+
+    params = [10, 1000]
+
+    def setup(self, size):
+        self.choices = Choices(*make_choices(size))
+        self.choices.add_subset('EVEN', ['C%d' % index for index in range(0, size, 2)])
+        self.pickled = pickle.dumps(self.choices)
+        self.entry = self.choices.for_value(0)
+
+    def time_pickle_dumps(self, size):
+        pickle.dumps(self.choices)
+
+    def time_pickle_loads(self, size):
+        pickle.loads(self.pickled)
+
+    def time_pickle_round_trip_entry(self, size):
+        pickle.loads(pickle.dumps(self.entry))
+
+    def time_deepcopy(self, size):
+        deepcopy(self.choices)
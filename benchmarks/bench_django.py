@@ -0,0 +1,241 @@
+"""Benchmarks of ``Choices`` used with Django: form field validation, model fields and models."""
+
+from __future__ import unicode_literals
+
+from django.core.exceptions import ValidationError
+
+from benchapp.models import (CATEGORIES, STATES, TARIFFS, CharCategoryContent, Content,
+                             EncodedCategoryContent, ExtendedContent)
+from extended_choices.fields import NamedExtendedChoiceFormField
+
+
+class FormField(object):
+    """Validation with a ``NamedExtendedChoiceFormField``."""
+
+    def setup(self):
+        self.field = NamedExtendedChoiceFormField(choices=TARIFFS)
+
+    def time_clean_valid(self):
+        self.field.clean('TARIFF_500')
+
+    def time_clean_invalid(self):
+        try:
+            self.field.clean('TARIFF_UNKNOWN')
+        except ValidationError:
+            pass
+
+
+class ModelField(object):
+    """Validation by model fields using ``Choices``."""
+
+    def setup(self):
+        self.state_field = Content._meta.get_field('state')
+        self.tariff_field = Content._meta.get_field('tariff')
+
+    def time_validate_small_choices(self):
+        self.state_field.validate(STATES.OFFLINE, None)
+
+    def time_validate_big_choices(self):
+        self.tariff_field.validate(TARIFFS.TARIFF_500, None)
+
+
+class FullClean(object):
+    """Bulk ``full_clean`` of instances, with the last tariff: the worst case for Django."""
+
+    params = [100, 1000]
+
+    def setup(self, size):
+        self.contents = [Content(title='Content', state=STATES.ONLINE, tariff=TARIFFS.TARIFF_999)
+                         for __ in range(size)]
+        self.extended_contents = [
+            ExtendedContent(title='Content', state=STATES.ONLINE, tariff=TARIFFS.TARIFF_999)
+            for __ in range(size)
+        ]
+
+    def time_django_fields(self, size):
+        for content in self.contents:
+            content.full_clean()
+
+    def time_extended_choices_fields(self, size):
+        for content in self.extended_contents:
+            content.full_clean()
+
+
+class Display(object):
+    """``get_FOO_display`` on the fields with the big catalog."""
+
+    def setup(self):
+        self.content = Content(title='Content', tariff=TARIFFS.TARIFF_500)
+        self.extended_content = ExtendedContent(title='Content', tariff=TARIFFS.TARIFF_500)
+
+    def time_django_fields(self):
+        self.content.get_tariff_display()
+
+    def time_extended_choices_fields(self):
+        self.extended_content.get_tariff_display()
+
+
+class Loading(object):
+    """Loading rows, and getting the display name of a value of each one."""
+
+    params = [100000]
+
+    def setup(self, size):
+        tariffs = TARIFFS.entries
+        Content.objects.bulk_create(
+            Content(title='Content', tariff=tariffs[index % len(tariffs)].value)
+            for index in range(size)
+        )
+        ExtendedContent.objects.bulk_create(
+            ExtendedContent(title='Content', tariff=tariffs[index % len(tariffs)].value)
+            for index in range(size)
+        )
+
+    def teardown(self, size):
+        Content.objects.all().delete()
+        ExtendedContent.objects.all().delete()
+
+    def time_django_fields(self, size):
+        for content in Content.objects.all():
+            TARIFFS.for_value(content.tariff).display
+
+    def time_extended_choices_fields(self, size):
+        for content in ExtendedContent.objects.all():
+            content.tariff.display
+
+
+class EncodedValues(object):
+    """Saving and loading string values, stored as strings or as codes."""
+
+    params = [10000]
+
+    def setup(self, size):
+        self.categories = [CATEGORIES.entries[index % len(CATEGORIES)].value for index in range(size)]
+        for model in (CharCategoryContent, EncodedCategoryContent):
+            model.objects.bulk_create(model(category=category) for category in self.categories)
+
+    def teardown(self, size):
+        CharCategoryContent.objects.all().delete()
+        EncodedCategoryContent.objects.all().delete()
+
+    def time_save_strings(self, size):
+        CharCategoryContent.objects.bulk_create(
+            CharCategoryContent(category=category) for category in self.categories)
+
+    def time_save_codes(self, size):
+        EncodedCategoryContent.objects.bulk_create(
+            EncodedCategoryContent(category=category) for category in self.categories)
+
+    def time_load_strings(self, size):
+        list(CharCategoryContent.objects.values_list('category', flat=True))
+
+    def time_load_codes(self, size):
+        list(EncodedCategoryContent.objects.values_list('category', flat=True))
+
+
+class OrderByDisplay(object):
+    """Ordering rows by the display name of their tariff."""
+
+    params = [1000]
+
+    def setup(self, size):
+        tariffs = TARIFFS.entries
+        Content.objects.bulk_create(
+            Content(title='Content', tariff=tariffs[(index * 7) % len(tariffs)].value)
+            for index in range(size)
+        )
+
+    def teardown(self, size):
+        Content.objects.all().delete()
+
+    def time_in_python(self, size):
+        sorted(Content.objects.all(), key=lambda content: TARIFFS.for_value(content.tariff).display)
+
+    def time_in_database(self, size):
+        list(Content.objects.order_by(TARIFFS.order_expression('tariff')))
+
+    def time_in_database_by_declaration(self, size):
+        list(Content.objects.order_by(TARIFFS.order_expression('tariff', by='declaration')))
+
+    def time_display_in_database(self, size):
+        list(Content.objects.annotate(
+            tariff_display=TARIFFS.display_expression('tariff')).values_list('tariff_display'))
+
+
+class CountByChoice(object):
+    """Counting rows for each state."""
+
+    params = [1000]
+
+    def setup(self, size):
+        states = STATES.entries
+        Content.objects.bulk_create(
+            Content(title='Content', state=states[index % len(states)].value)
+            for index in range(size)
+        )
+
+    def teardown(self, size):
+        Content.objects.all().delete()
+
+    def time_one_query_per_choice(self, size):
+        dict((entry, Content.objects.filter(state=entry.value).count()) for entry in STATES.entries)
+
+    def time_count_by(self, size):
+        STATES.count_by(Content.objects.all(), 'state')
+
+
+class FilterSubset(object):
+    """Compiling a query filtering on the values of a subset of 500 tariffs."""
+
+    def time_in_values(self):
+        ExtendedContent.objects.filter(
+            tariff__in=list(TARIFFS.CHEAP.values)).query.sql_with_params()
+
+    def time_in_subset(self):
+        ExtendedContent.objects.filter(tariff__in_subset=TARIFFS.CHEAP).query.sql_with_params()
+
+
+class MigrationsAutodetector(object):
+    """Comparing the deconstructions of two tariff fields, as ``makemigrations`` does."""
+
+    def setup(self):
+        from django.db.migrations.autodetector import MigrationAutodetector
+        from django.db.migrations.state import ProjectState
+
+        self.autodetector = MigrationAutodetector(ProjectState(), ProjectState())
+
+    def compare(self, model):
+        deep_deconstruct = self.autodetector.deep_deconstruct
+        field = model._meta.get_field('tariff')
+        assert deep_deconstruct(field) == deep_deconstruct(field.clone())
+
+    def time_django_field(self):
+        self.compare(Content)
+
+    def time_extended_choices_field(self):
+        self.compare(ExtendedContent)
+
+
+class Models(object):
+    """Saving and loading instances of a model with fields using ``Choices``."""
+
+    def setup(self):
+        self.content = Content.objects.create(
+            title='Content', state=STATES.ONLINE, tariff=TARIFFS.TARIFF_500)
+
+    def teardown(self):
+        Content.objects.all().delete()
+
+    def time_save(self):
+        Content(title='Content', state=STATES.DRAFT, tariff=TARIFFS.TARIFF_10).save()
+
+    def time_load(self):
+        Content.objects.get(pk=self.content.pk)
+
+    def time_load_with_display(self):
+        content = Content.objects.get(pk=self.content.pk)
+        content.get_state_display()
+        content.get_tariff_display()
+
+    def time_filter_subset(self):
+        list(Content.objects.filter(state__in=[STATES.ONLINE, STATES.DRAFT])[:10])
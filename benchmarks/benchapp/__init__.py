@@ -0,0 +1 @@
+"""Django application holding the models used by the benchmarks."""
@@ -0,0 +1,67 @@
+"""Models used by the benchmarks."""
+
+from __future__ import unicode_literals
+
+from django.db import models
+
+from extended_choices import AutoChoices, Choices
+from extended_choices.fields import (ExtendedChoiceCharField, ExtendedChoiceEncodedField,
+                                     ExtendedChoiceIntegerField, ExtendedChoiceSmallIntegerField)
+
+STATES = Choices(
+    ('ONLINE', 1, 'Online'),
+    ('DRAFT', 2, 'Draft'),
+    ('OFFLINE', 3, 'Offline'),
+    ('ARCHIVED', 4, 'Archived'),
+)
+
+# A big catalog, like a list of tariffs.
+TARIFFS = Choices(*[
+    ('TARIFF_%d' % index, index, 'Tariff %d' % index) for index in range(1000)
+], import_path='benchapp.models.TARIFFS')
+TARIFFS.add_subset('CHEAP', ['TARIFF_%d' % index for index in range(500)])
+
+
+class Content(models.Model):
+    """A model with fields using ``Choices``."""
+
+    title = models.CharField(max_length=255)
+    state = models.PositiveSmallIntegerField(choices=STATES, default=STATES.DRAFT)
+    tariff = models.PositiveIntegerField(choices=TARIFFS, default=TARIFFS.TARIFF_0)
+
+    class Meta:
+        app_label = 'benchapp'
+
+
+class ExtendedContent(models.Model):
+    """The same as ``Content``, with the model fields of ``extended_choices``."""
+
+    title = models.CharField(max_length=255)
+    state = ExtendedChoiceSmallIntegerField(choices=STATES, default=STATES.DRAFT)
+    tariff = ExtendedChoiceIntegerField(choices=TARIFFS, default=TARIFFS.TARIFF_0)
+
+    class Meta:
+        app_label = 'benchapp'
+
+
+# String values, stored as is by ``CharCategoryContent``, and as codes by ``EncodedCategoryContent``.
+CATEGORIES = AutoChoices(*[('CATEGORY_%d' % index, ) for index in range(100)])
+CATEGORIES.set_codes(dict(('CATEGORY_%d' % index, index) for index in range(100)))
+
+
+class CharCategoryContent(models.Model):
+    """A model storing the values of ``CATEGORIES`` as strings."""
+
+    category = ExtendedChoiceCharField(choices=CATEGORIES, max_length=11)
+
+    class Meta:
+        app_label = 'benchapp'
+
+
+class EncodedCategoryContent(models.Model):
+    """A model storing the values of ``CATEGORIES`` as codes."""
+
+    category = ExtendedChoiceEncodedField(choices=CATEGORIES)
+
+    class Meta:
+        app_label = 'benchapp'
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Compare the memory used per entry by a ``Choices`` and a ``ColumnarChoices``.
+
+For each class, choices are created with ``tracemalloc`` running, and we report the memory still
+allocated once they are created (after a garbage collection), divided by the number of entries.
+The memory used by ``ColumnarChoices`` after accessing all its entries, that are created and
+cached only up to ``entries_cache_size``, is also reported.
+
+Usage::
+
+    python benchmarks/columnar_memory.py --entries 100000
+
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from extended_choices import Choices  # noqa: E402
+from extended_choices.columnar import ColumnarChoices  # noqa: E402
+
+
+def build(klass, nb_entries):
+    """Create a ``klass`` instance with ``nb_entries`` choices, added by batches."""
+
+    choices = klass()
+    for start in range(0, nb_entries, 1000):
+        choices.add_choices(*[
+            ('CODE_%d' % index, index, 'Code number %d' % index, {'rank': index % 7})
+            for index in range(start, min(start + 1000, nb_entries))
+        ])
+    return choices
+
+
+def traced_memory():
+    """Return the memory currently allocated, after a garbage collection."""
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--entries', type=int, default=100000)
+    args = parser.parse_args()
+
+    results = {'entries': args.entries}
+
+    for name, klass in (('choices', Choices), ('columnar_choices', ColumnarChoices)):
+        tracemalloc.start()
+        start = traced_memory()
+        choices = build(klass, args.entries)
+        results[name] = {'bytes_per_entry': (traced_memory() - start) // args.entries}
+        if klass is ColumnarChoices:
+            len(choices.entries)
+            results[name]['bytes_per_entry_after_access'] = (
+                (traced_memory() - start) // args.entries)
+        tracemalloc.stop()
+        del choices
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Configure Django for the benchmarks, with an in-memory SQLite database.
+
+``setup`` must be called before importing the benchmarks using models.
+
+"""
+
+from __future__ import unicode_literals
+
+import django
+from django.conf import settings
+
+
+def setup():
+    """Configure Django, then create the tables of the ``benchapp`` models."""
+
+    if settings.configured:
+        return
+
+    settings.configure(
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': ':memory:',
+            },
+        },
+        INSTALLED_APPS=['benchapp'],
+        USE_I18N=True,
+    )
+    django.setup()
+
+    from django.apps import apps
+    from django.db import connection
+
+    with connection.schema_editor() as schema_editor:
+        for model in apps.get_app_config('benchapp').get_models():
+            schema_editor.create_model(model)
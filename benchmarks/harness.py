@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""Run the benchmarks of ``extended_choices``, and compare results between commits.
+
+Benchmarks are written like for ``asv``, without needing it: each ``bench_*.py`` module in this
+directory defines classes having ``time_*`` methods. A class can define ``params``, a list of
+values each benchmark is run with, and a ``setup`` method, called (with the param if any) before
+running its benchmarks. Django is configured with an in-memory SQLite database (see
+``django_setup.py``), so everything runs offline.
+
+Usage::
+
+    # Run all the benchmarks, results are saved in ``results/<commit>.json``
+    python benchmarks/harness.py run
+
+    # Only the ones matching a pattern, in a specific file, quickly
+    python benchmarks/harness.py run --filter Lookups --output /tmp/lookups.json --quick
+
+    # Compare two results files
+    python benchmarks/harness.py compare results/abc1234.json results/def5678.json
+
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import argparse
+import datetime
+import fnmatch
+import glob
+import importlib
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+
+import django_setup  # noqa: E402
+
+django_setup.setup()
+
+import django  # noqa: E402
+
+import extended_choices  # noqa: E402
+
+
+def get_commit():
+    """Return the short hash of the current git commit, or ``None`` if not available."""
+
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         cwd=BENCHMARKS_DIR, stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.decode('ascii').strip()
+
+
+def iter_benchmarks(pattern=None):
+    """Yield the name, class, method name and param of each benchmark matching ``pattern``.
+
+    The name is ``module.Class.method`` followed by the param between parentheses, if any.
+
+    """
+
+    for path in sorted(glob.glob(os.path.join(BENCHMARKS_DIR, 'bench_*.py'))):
+        module = importlib.import_module(os.path.splitext(os.path.basename(path))[0])
+
+        for class_name, klass in sorted(inspect.getmembers(module, inspect.isclass)):
+            if klass.__module__ != module.__name__:
+                continue
+
+            for method_name in sorted(name for name in dir(klass) if name.startswith('time_')):
+                for param in getattr(klass, 'params', [None]):
+                    name = '%s.%s.%s' % (module.__name__, class_name, method_name)
+                    if param is not None:
+                        name = '%s(%s)' % (name, param)
+                    if pattern and not fnmatch.fnmatch(name, '*%s*' % pattern):
+                        continue
+                    yield name, klass, method_name, param
+
+
+def run_benchmark(klass, method_name, param, repeat, min_time):
+    """Run one benchmark and return its timings, in seconds per call.
+
+    The number of calls per measure is chosen so a measure takes at least ``min_time`` seconds,
+    then ``repeat`` measures are done.
+
+    """
+
+    args = () if param is None else (param, )
+
+    instance = klass()
+    if hasattr(instance, 'setup'):
+        instance.setup(*args)
+
+    method = getattr(instance, method_name)
+    timer = timeit.Timer(lambda: method(*args))
+
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 10
+
+    timings = sorted(duration / number for duration in timer.repeat(repeat, number))
+
+    if hasattr(instance, 'teardown'):
+        instance.teardown(*args)
+
+    return {
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def format_duration(seconds):
+    """Return the given duration with a readable unit."""
+
+    for unit, factor in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * factor >= 1:
+            return '%.2f%s' % (seconds * factor, unit)
+    return '%.2fns' % (seconds * 1e9)
+
+
+def command_run(args):
+    """Run the benchmarks and save the results as JSON."""
+
+    repeat, min_time = (3, 0.02) if args.quick else (5, 0.2)
+    commit = get_commit()
+
+    results = {}
+    for name, klass, method_name, param in iter_benchmarks(args.filter):
+        results[name] = run_benchmark(klass, method_name, param, repeat, min_time)
+        print('%-70s %10s' % (name, format_duration(results[name]['min'])))
+
+    data = {
+        'meta': {
+            'commit': commit,
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'extended_choices': extended_choices.EXACT_VERSION,
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+    output = args.output
+    if not output:
+        if not os.path.isdir(RESULTS_DIR):
+            os.makedirs(RESULTS_DIR)
+        output = os.path.join(RESULTS_DIR, '%s.json' % (commit or 'unknown'))
+
+    with open(output, 'w') as results_file:
+        json.dump(data, results_file, indent=2, sort_keys=True)
+
+    print('Results saved in %s' % output)
+
+
+def command_compare(args):
+    """Compare two results files, and return 1 if some benchmarks are slower than expected."""
+
+    with open(args.old) as old_file:
+        old = json.load(old_file)
+    with open(args.new) as new_file:
+        new = json.load(new_file)
+
+    print('Comparing %s (%s) to %s (%s)' % (
+        args.old, old['meta'].get('commit'), args.new, new['meta'].get('commit')))
+
+    slower = 0
+    for name in sorted(set(old['results']) & set(new['results'])):
+        old_time = old['results'][name]['min']
+        new_time = new['results'][name]['min']
+        ratio = new_time / old_time if old_time else float('inf')
+
+        mark = ''
+        if ratio > args.threshold:
+            mark = 'slower'
+            slower += 1
+        elif ratio < 1 / args.threshold:
+            mark = 'faster'
+
+        print('%-70s %10s %10s %6.2f %s' % (
+            name, format_duration(old_time), format_duration(new_time), ratio, mark))
+
+    for name in sorted(set(old['results']) ^ set(new['results'])):
+        print('%-70s only in %s' % (name, args.old if name in old['results'] else args.new))
+
+    return 1 if slower and args.fail else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmarks")
+    run_parser.add_argument('--filter', help="Only run benchmarks whose name contains this")
+    run_parser.add_argument('--output', help="JSON file to save the results in "
+                                             "(default: results/<commit>.json)")
+    run_parser.add_argument('--quick', action='store_true',
+                            help="Do less and shorter measures, less accurate")
+
+    compare_parser = subparsers.add_parser('compare', help="Compare two results files")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=1.1,
+                                help="Ratio above which a benchmark is considered slower "
+                                     "(default: 1.1)")
+    compare_parser.add_argument('--fail', action='store_true',
+                                help="Exit with an error if some benchmarks are slower")
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        command_run(args)
+    elif args.command == 'compare':
+        sys.exit(command_compare(args))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
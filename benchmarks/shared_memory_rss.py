@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Compare the memory used by forked workers using a ``Choices`` or a ``SharedChoices``.
+
+A big ``Choices`` is created in the parent process, then ``--workers`` processes are forked, each
+one looking up values spread over the whole catalog, like a pre-fork server worker would do over
+time. For each worker we report the memory it doesn't share anymore with its parent
+(``Private_Dirty``, Linux only), when using ``for_value`` (that creates, once, the entries it
+returns, for ``SharedChoices``) and ``has_value``.
+
+Usage::
+
+    python benchmarks/shared_memory_rss.py --entries 200000 --workers 4 --lookups 5000
+
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
+import gc
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from extended_choices import Choices  # noqa: E402
+from extended_choices.shared import SharedChoices  # noqa: E402
+
+
+def private_dirty_kb():
+    """Return the memory of the current process not shared with any other one, in kB."""
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            if line.startswith('Private_Dirty:'):
+                return int(line.split()[1])
+    raise RuntimeError("Private_Dirty not found")
+
+
+def run_workers(lookup, values, nb_workers):
+    """Fork workers calling ``lookup`` for all values, and return their private memory, in kB."""
+
+    pipes = []
+    for __ in range(nb_workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if not pid:
+            os.close(read_fd)
+            before = private_dirty_kb()
+            for value in values:
+                lookup(value)
+            os.write(write_fd, str(private_dirty_kb() - before).encode('ascii'))
+            os._exit(0)
+        os.close(write_fd)
+        pipes.append((pid, read_fd))
+
+    results = []
+    for pid, read_fd in pipes:
+        os.waitpid(pid, 0)
+        results.append(int(os.read(read_fd, 100)))
+        os.close(read_fd)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--lookups', type=int, default=1000,
+                        help="Number of values looked up by each worker")
+    args = parser.parse_args()
+
+    choices = Choices()
+    for start in range(0, args.entries, 1000):
+        choices.add_choices(*[
+            ('CODE_%d' % index, index, 'Code number %d' % index, {'rank': index % 7})
+            for index in range(start, min(start + 1000, args.entries))
+        ])
+    step = max(1, args.entries // args.lookups)
+    values = list(range(0, args.entries, step))[:args.lookups]
+
+    shared = SharedChoices.create(choices)
+    # Avoid the garbage collector touching every object in the workers.
+    gc.freeze() if hasattr(gc, 'freeze') else gc.disable()
+
+    results = {
+        'entries': args.entries,
+        'workers': args.workers,
+        'lookups': len(values),
+        'choices': {
+            'for_value_private_kb': run_workers(choices.for_value, values, args.workers),
+            'has_value_private_kb': run_workers(choices.has_value, values, args.workers),
+        },
+        'shared_choices': {
+            'for_value_private_kb': run_workers(shared.for_value, values, args.workers),
+            'has_value_private_kb': run_workers(shared.has_value, values, args.workers),
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+    shared.close()
+
+
+if __name__ == '__main__':
+    main()
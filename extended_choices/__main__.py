@@ -1,13 +1,139 @@
-"""Run doctests on choices.py and helpers.py"""
+"""Run doctests on the modules of ``extended_choices``, or inspect ``Choices`` instances.
 
+Usage::
+
+    # Run the doctests
+    python -m extended_choices
+
+    # Inspect some ``Choices`` instances, given their import paths
+    python -m extended_choices myapp.constants.STATES myapp.constants.TARIFFS
+
+    # Inspect all the ``Choices`` instances of a Django project
+    DJANGO_SETTINGS_MODULE=myproject.settings python -m extended_choices --all
+
+"""
+
+from __future__ import print_function, unicode_literals
+
+import argparse
 import doctest
+import json
+import os
 import sys
-from . import choices, helpers
 
-failures = 0
 
-failures += doctest.testmod(m=choices, report=True)[0]
-failures += doctest.testmod(m=helpers, report=True)[0]
+def run_doctests():
+    """Run the doctests of all the modules and return the number of failures."""
+
+    from . import (aggregates, choices, choicesets, columnar, constraints, expressions, fields,
+                   helpers, inspector, instrumentation, lookups, mmap, packed, references, schema,
+                   shared)
+
+    failures = 0
+
+    failures += doctest.testmod(m=choices, report=True)[0]
+    failures += doctest.testmod(m=helpers, report=True)[0]
+    failures += doctest.testmod(m=choicesets, report=True)[0]
+    failures += doctest.testmod(m=fields, report=True)[0]
+    failures += doctest.testmod(m=expressions, report=True)[0]
+    failures += doctest.testmod(m=aggregates, report=True)[0]
+    failures += doctest.testmod(m=lookups, report=True)[0]
+    failures += doctest.testmod(m=constraints, report=True)[0]
+    failures += doctest.testmod(m=references, report=True)[0]
+    failures += doctest.testmod(m=columnar, report=True)[0]
+    failures += doctest.testmod(m=instrumentation, report=True)[0]
+    failures += doctest.testmod(m=inspector, report=True)[0]
+    failures += doctest.testmod(m=schema, report=True)[0]
+    failures += doctest.testmod(m=mmap, report=True)[0]
+    failures += doctest.testmod(m=packed, report=True)[0]
+    failures += doctest.testmod(m=shared, report=True)[0]
+
+    return failures
+
+
+def get_parser():
+    """Return the parser of the command line arguments."""
+
+    parser = argparse.ArgumentParser(
+        prog='python -m extended_choices',
+        description="Inspect ``Choices`` instances. Without arguments, run the doctests.",
+    )
+    parser.add_argument('paths', nargs='*', metavar='PATH',
+                        help="Import path of a ``Choices`` instance, like myapp.constants.STATES")
+    parser.add_argument('--all', action='store_true',
+                        help="Inspect all the ``Choices`` instances found after ``django.setup()``")
+    parser.add_argument('--number', type=int, default=10000,
+                        help="Number of times each lookup is done by the benchmark (default: 10000)")
+    parser.add_argument('--no-benchmark', action='store_true',
+                        help="Do not run the lookups benchmark")
+    parser.add_argument('--json', action='store_true',
+                        help="Output the reports as JSON")
+
+    return parser
+
+
+def format_report(path, report):
+    """Return the given report about a ``Choices`` instance, formatted as text."""
+
+    lines = [
+        '%s (%s)' % (path, report['class']),
+        '    entries: %d, subsets: %d, memory: %d bytes' % (
+            report['entries'], report['subsets'], report['memory']),
+        '    value types: %s' % ', '.join(
+            '%s: %d' % item for item in sorted(report['value_types'].items())),
+        '    fast paths: %s' % (', '.join(report['fast_paths']) or '-'),
+    ]
+
+    for name, duration in sorted(report.get('benchmark', {}).items()):
+        lines.append('    %-20s %10.1fns' % (name, duration * 1e9))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Run the command line interface, and return its exit code."""
+
+    args = get_parser().parse_args(argv)
+
+    if not args.paths and not args.all:
+        return 1 if run_doctests() else 0
+
+    from .inspector import benchmark_choices, find_choices, import_choices, inspect_choices
+
+    # Set up Django if configured, as the ``Choices`` may be defined with models.
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+    if args.all or settings.configured or os.environ.get('DJANGO_SETTINGS_MODULE'):
+        import django
+        try:
+            django.setup()
+        except (ImproperlyConfigured, ImportError) as exc:
+            print("Django is not configured, set DJANGO_SETTINGS_MODULE to use --all (%s)" % exc,
+                  file=sys.stderr)
+            return 2
+
+    found = find_choices() if args.all else []
+
+    try:
+        found.extend((path, import_choices(path)) for path in args.paths)
+    except (ImportError, TypeError) as exc:
+        print(exc, file=sys.stderr)
+        return 2
+
+    reports = []
+    for path, choices in found:
+        report = inspect_choices(choices)
+        if not args.no_benchmark:
+            report['benchmark'] = benchmark_choices(choices, args.number)
+        reports.append((path, report))
+
+    if args.json:
+        print(json.dumps(dict(reports), indent=2, sort_keys=True))
+    else:
+        print('\n\n'.join(format_report(path, report) for path, report in reports))
+
+    return 0
+
 
-if failures > 0:
-    sys.exit(1)
+if __name__ == '__main__':
+    sys.exit(main())
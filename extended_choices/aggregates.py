@@ -0,0 +1,179 @@
+"""Provides a way to count the rows of a queryset for each entry of a ``Choices`` instance.
+
+``count_by`` runs a single ``GROUP BY`` query, instead of one ``count()`` per choice, and returns
+the counts by entry, in the order of the ``Choices``, with a zero for the entries without rows.
+
+Example
+-------
+
+.. code-block:: python
+
+    counts = STATES.count_by(Content.objects.all(), 'state')
+    for entry, count in counts.items():
+        print(entry.display, count)
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+
+import six
+
+from django.db.models import Count
+
+__all__ = [
+    'ChoicesCounts',
+    'count_by',
+]
+
+# Name of the annotation holding the count, unlikely to clash with a field of the model.
+COUNT_ANNOTATION = 'extended_choices_count'
+
+
+class ChoicesCounts(OrderedDict):
+    """Ordered mapping of the entries of a ``Choices`` instance to a number of rows.
+
+    Attributes
+    ----------
+    unknown : dict
+        The number of rows for each value that is not in the ``Choices`` instance (including
+        ``None``).
+
+    Example
+    -------
+
+    >>> from extended_choices import Choices
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'))
+    >>> counts = _count_rows(STATES.entries, [(2, 3), (4, 1)], STATES)
+    >>> counts
+    ChoicesCounts([('ONLINE', 0), ('DRAFT', 3)], unknown={4: 1})
+    >>> counts[STATES.for_constant('DRAFT')], counts.total
+    (3, 4)
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ChoicesCounts, self).__init__(*args, **kwargs)
+        self.unknown = {}
+
+    @property
+    def total(self):
+        """The total number of rows, including the ones with unknown values."""
+        return sum(self.values()) + sum(self.unknown.values())
+
+    def __repr__(self):
+        return '%s(%r, unknown=%r)' % (
+            self.__class__.__name__,
+            [(entry.constant.original_value, count) for entry, count in self.items()],
+            self.unknown,
+        )
+
+
+def _count_rows(entries, rows, choices):
+    """Return the counts of the entries from the ``(value, count)`` rows, zero for the others.
+
+    Parameters
+    ----------
+    entries : list of ChoiceEntry
+        The entries to count, in order.
+    rows : iterable of tuples
+        The ``(value, count)`` pairs, one per distinct value.
+    choices : Choices
+        The ``Choices`` instance used to find the entry of each value.
+
+    Returns
+    -------
+    ChoicesCounts
+        The counts.
+
+    """
+
+    counts = ChoicesCounts((entry, 0) for entry in entries)
+
+    for value, count in rows:
+        # Don't use ``get_for_value``, that would return the fallback entry.
+        entry = choices.for_value(value) if choices.has_value(value) else None
+        if entry is not None and entry in counts:
+            counts[entry] += count
+        else:
+            counts.unknown[value] = counts.unknown.get(value, 0) + count
+
+    return counts
+
+
+def _get_entries(choices, subset):
+    """Return the entries to count, and the ``Choices`` they are from."""
+
+    if subset is None:
+        return choices.entries, choices
+
+    if isinstance(subset, six.string_types):
+        if subset not in choices.subsets:
+            raise ValueError("'%s' is not a subset of this ``Choices`` instance." % subset)
+        subset = getattr(choices, subset)
+
+    return subset.entries, subset
+
+
+def count_by(choices, queryset, field_name, subset=None, cache=None):
+    """Count the rows of ``queryset`` for each entry of ``choices``, in a single query.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` used by the field.
+    queryset : QuerySet
+        The rows to count.
+    field_name : string
+        The name of the field, or a path to it, like ``author__state``.
+    subset : string or Choices, optional
+        A subset (or its name) to only count the rows having one of its values. Then the query is
+        filtered on these values, and ``unknown`` stays empty.
+    cache : dict, optional
+        A dict to cache the result in, for example one per request, so the same counts are only
+        queried once. The key is made from the counted ``Choices``, the database alias, the SQL
+        of the query and its params.
+
+    Returns
+    -------
+    ChoicesCounts
+        The number of rows for each entry, in order, the entries without rows having ``0``. The
+        rows with values not in ``choices`` are counted in its ``unknown`` attribute.
+
+    Raises
+    ------
+    ValueError
+        If ``subset`` is a name that is not a subset of ``choices``.
+
+    """
+
+    entries, counted_choices = _get_entries(choices, subset)
+
+    if subset is not None:
+        queryset = queryset.filter(**{
+            '%s__in' % field_name: [entry.value.original_value for entry in entries]
+        })
+
+    # Without ordering, so only the field is in the ``GROUP BY``.
+    queryset = queryset.order_by().values(field_name).annotate(
+        **{COUNT_ANNOTATION: Count('*')}
+    ).values_list(field_name, COUNT_ANNOTATION)
+
+    if cache is None:
+        return _count_rows(entries, queryset, counted_choices)
+
+    sql, params = queryset.query.sql_with_params()
+    key = ('count_by', id(counted_choices), queryset.db, sql, tuple(params))
+    counts = cache.get(key)
+    if counts is None:
+        counts = cache[key] = _count_rows(entries, queryset, counted_choices)
+
+    return counts
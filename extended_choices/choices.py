@@ -59,15 +59,19 @@ The documentation format in this file is numpydoc_.
 """
 
 from __future__ import unicode_literals
+import json
 import six
+import pickle
+import sys
+import threading
 
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 try:
     from collections.abc import Mapping
 except ImportError:
     from collections import Mapping
 
-from .helpers import ChoiceEntry
+from .helpers import ChoiceEntry, UnknownTracker, import_from_path
 
 __all__ = [
     'Choices',
@@ -78,6 +82,25 @@ __all__ = [
 
 _NO_SUBSET_NAME_ = '__NO_SUBSET_NAME__'
 
+# Holds the entries, the ``(value, display name)`` tuples of the choices, and the dicts to access
+# the entries, for a ``Choices`` instance. It is never updated in place: writers create a new one
+# and replace the previous one in one step.
+_ChoicesIndex = namedtuple('_ChoicesIndex', ['entries', 'choices', 'constants', 'values',
+                                             'displays'])
+
+
+def _get_duplicates(items):
+    """Return the set of the items present more than once in ``items``, in linear time."""
+
+    seen = set()
+    duplicates = set()
+    for item in items:
+        if item in seen:
+            duplicates.add(item)
+        seen.add(item)
+
+    return duplicates
+
 
 class Choices(list):
     """Helper class for choices fields in Django
@@ -104,6 +127,20 @@ class Choices(list):
         ``dict`` by default, it's the dict class to use to create dictionaries (``constants``,
         ``values`` and ``displays``. Could be set for example to ``OrderedDict`` (you can use
         ``OrderedChoices`` that is a simple subclass using ``OrderedDict``.
+    import_path : string, optional
+        If set, it must be the python path where this instance is available, like
+        ``myapp.constants.STATES``. The instance, its subsets, entries and their attributes will
+        then be pickled by reference (only the path and the constant) and unpickled as the
+        existing objects, instead of being recreated.
+    fallback : string, optional
+        The constant of the entry returned by ``get_for_constant``, ``get_for_value`` and
+        ``get_for_display`` for unknown keys, when no ``default`` is given. Like ``UNKNOWN``. It
+        must be one of the given choices, or, if none are given, be added before the first
+        lookup of an unknown key.
+    track_unknown : int, optional
+        If set, the unknown keys passed to ``get_for_constant``, ``get_for_value`` and
+        ``get_for_display`` are counted in ``unknown_values``, an ``UnknownTracker`` keeping at
+        most this number of distinct keys. Unhashable keys are not counted.
 
     Example
     -------
@@ -204,24 +241,57 @@ class Choices(list):
         # Class to use for dicts.
         self.dict_class = kwargs.get('dict_class', dict)
 
-        # List of ``ChoiceEntry``, one for each choice in this instance.
-        self.entries = []
+        # Lock used to serialize the writers. Readers never use it.
+        self._write_lock = threading.RLock()
+
+        # Python path to this instance, to pickle it by reference.
+        self.import_path = kwargs.get('import_path', None)
+        self._import_path_checked = False
+
+        # Constant of the entry returned by the ``get_for_*`` methods for unknown keys.
+        self.fallback = kwargs.get('fallback', None)
+
+        # Counters of the unknown keys passed to the ``get_for_*`` methods.
+        track_unknown = kwargs.get('track_unknown', None)
+        self.unknown_values = UnknownTracker(track_unknown) if track_unknown else None
 
         # List of the created subsets
         self.subsets = []
 
-        # Dicts to access ``ChoiceEntry`` instances by constant, value or display value.
-        self.constants = self.dict_class()
-        self.values = self.dict_class()
-        self.displays = self.dict_class()
+        # Values computed from the entries, like expressions for the database. Reset when new
+        # entries are published.
+        self._derived_cache = {}
+
+        # Integer codes of the constants, to store entries as codes in the database. Append-only,
+        # see ``set_codes``.
+        self.codes = {}
+
+        # List of ``ChoiceEntry``, one for each choice in this instance, tuple of the choices as
+        # expected by django, and dicts to access the entries by constant, value or display value.
+        # See the ``entries``, ``choices``, ``constants``, ``values`` and ``displays`` properties.
+        self._index = _ChoicesIndex([], (), self.dict_class(), self.dict_class(),
+                                    self.dict_class())
 
         # For now this instance is mutable: we need to add the given choices.
         self._mutable = True
         self.add_choices(*choices, name=kwargs.get('name', None))
 
+        if kwargs.get('codes'):
+            self.set_codes(kwargs['codes'])
+
+        if choices:
+            self._check_fallback()
+
         # Now we can set ``_mutable`` to its correct value.
         self._mutable = kwargs.get('mutable', True)
 
+    def _check_fallback(self):
+        """Raise a ``ValueError`` if the ``fallback`` constant is not one of the choices."""
+
+        if self.fallback is not None and not self.has_constant(self.fallback):
+            raise ValueError("The fallback '%s' is not a constant of this ``Choices`` instance."
+                             % self.fallback)
+
     @property
     def choices(self):
         """Property that returns a tuple formatted as expected by Django.
@@ -234,7 +304,41 @@ class Choices(list):
         ((1, 'foo'), (2, 'bar'))
 
         """
-        return tuple(self)
+        return self._index.choices
+
+    @property
+    def entries(self):
+        """Property that returns the list of ``ChoiceEntry``, one for each choice."""
+        return self._index.entries
+
+    @property
+    def constants(self):
+        """Property that returns the dict of ``ChoiceEntry`` by constant."""
+        return self._index.constants
+
+    @property
+    def values(self):
+        """Property that returns the dict of ``ChoiceEntry`` by value."""
+        return self._index.values
+
+    @property
+    def displays(self):
+        """Property that returns the dict of ``ChoiceEntry`` by display name."""
+        return self._index.displays
+
+    def __getattr__(self, name):
+        """Return the value of a constant not yet available as an attribute.
+
+        It happens only for a really short time, when choices are being added by another thread:
+        the new constants are available in ``constants`` before being set as attributes.
+
+        """
+
+        try:
+            return self.__dict__['_index'].constants[name].value
+        except KeyError:
+            raise AttributeError("'%s' object has no attribute '%s'" % (
+                self.__class__.__name__, name))
 
     def _convert_choices(self, choices):
         """Validate each choices
@@ -253,13 +357,13 @@ class Choices(list):
 
         # Check that each new constant is unique.
         constants = [c[0] for c in choices]
-        constants_doubles = [c for c in constants if constants.count(c) > 1]
+        constants_doubles = _get_duplicates(constants)
         if constants_doubles:
             raise ValueError("You cannot declare two constants with the same constant name. "
-                             "Problematic constants: %s " % list(set(constants_doubles)))
+                             "Problematic constants: %s " % list(constants_doubles))
 
         # Check that none of the new constants already exists.
-        bad_constants = set(constants).intersection(self.constants)
+        bad_constants = set(c for c in constants if self.has_constant(c))
         if bad_constants:
             raise ValueError("You cannot add existing constants. "
                              "Existing constants: %s." % list(bad_constants))
@@ -272,14 +376,17 @@ class Choices(list):
 
         # Check that each new value is unique.
         values = [c[1] for c in choices]
-        values_doubles = [c for c in values if values.count(c) > 1]
+        try:
+            values_doubles = _get_duplicates(values)
+        except TypeError:
+            raise ValueError("One value cannot be used in: %s" % list(values))
         if values_doubles:
             raise ValueError("You cannot declare two choices with the same name."
-                             "Problematic values: %s " % list(set(values_doubles)))
+                             "Problematic values: %s " % list(values_doubles))
 
         # Check that none of the new values already exists.
         try:
-            bad_values = set(values).intersection(self.values)
+            bad_values = set(value for value in values if self.has_value(value))
         except TypeError:
             raise ValueError("One value cannot be used in: %s" % list(values))
         else:
@@ -287,29 +394,69 @@ class Choices(list):
                 raise ValueError("You cannot add existing values. "
                                  "Existing values: %s." % list(bad_values))
 
-        # We can now add each choice.
-        for choice_tuple in choices:
+        # Convert the choice tuples in ``ChoiceEntry`` instances if it's not already done.
+        # It allows to share choice entries between a ``Choices`` instance and its subsets.
+        choice_entries = [
+            choice_tuple if isinstance(choice_tuple, self.ChoiceEntryClass)
+            else self.ChoiceEntryClass(choice_tuple)
+            for choice_tuple in choices
+        ]
 
-            # Convert the choice tuple in a ``ChoiceEntry`` instance if it's not already done.
-            # It allows to share choice entries between a ``Choices`` instance and its subsets.
-            choice_entry = choice_tuple
-            if not isinstance(choice_entry, self.ChoiceEntryClass):
-                choice_entry = self.ChoiceEntryClass(choice_entry)
+        # We can now add all the choices.
+        self._publish_entries(choice_entries)
 
-            # Append to the main list the choice as expected by django: (value, display name).
-            self.append(choice_entry.choice)
-            # And the ``ChoiceEntry`` instance to our own internal list.
-            self.entries.append(choice_entry)
+        return constants
 
-            # Make the value accessible via an attribute (the constant being its name).
-            setattr(self, choice_entry.constant, choice_entry.value)
+    def _publish_entries(self, choice_entries):
+        """Make the given entries available in the current ``Choices`` instance.
 
-            # Fill dicts to access the ``ChoiceEntry`` instance by its constant, value or display..
-            self.constants[choice_entry.constant] = choice_entry
-            self.values[choice_entry.value] = choice_entry
-            self.displays[choice_entry.display] = choice_entry
+        Parameters
+        ----------
+        choice_entries : list of ``ChoiceEntry``
+            The entries to add, already validated.
 
-        return constants
+        Notes
+        -----
+        The existing list of entries, tuple of choices and dicts are never updated in place: new
+        ones are created then published in one step, so readers in other threads either see all
+        the new entries, or none of them, without having to use a lock. Iterating, ``len`` and
+        ``choices`` use the published tuple of choices, so they always agree with the lookups.
+
+        """
+
+        index = self._index
+
+        # Prepare the new list of ``ChoiceEntry``, the new tuple of choices, and the new dicts to
+        # access the entries by their constant, value or display name.
+        new_index = _ChoicesIndex(
+            index.entries + choice_entries,
+            index.choices + tuple(choice_entry.choice for choice_entry in choice_entries),
+            self.dict_class(index.constants),
+            self.dict_class(index.values),
+            self.dict_class(index.displays),
+        )
+        for choice_entry in choice_entries:
+            new_index.constants[choice_entry.constant] = choice_entry
+            new_index.values[choice_entry.value] = choice_entry
+            new_index.displays[choice_entry.display] = choice_entry
+
+            # Allow entries to be pickled by reference. Entries shared with a subset, or coming
+            # from another ``Choices`` instance, keep their first reference.
+            if self.import_path and not getattr(choice_entry, '_import_path', None):
+                choice_entry._import_path = self.import_path
+
+        # Publish the new index: from now on, readers use it.
+        self._index = new_index
+        self._derived_cache = {}
+
+        # Extend the main list with the choices as expected by django: (value, display name).
+        # It's only read directly by code using the C API of lists, like the ``json`` encoder.
+        self.extend([choice_entry.choice for choice_entry in choice_entries])
+
+        # Make the values accessible via an attribute (the constant being its name). Until it's
+        # done, ``__getattr__`` gets them from the new index.
+        for choice_entry in choice_entries:
+            setattr(self, choice_entry.constant, choice_entry.value)
 
     def add_choices(self, *choices, **kwargs):
         """Add some choices to the current ``Choices`` instance.
@@ -385,11 +532,14 @@ class Choices(list):
                                  "argument and also as a named argument")
             subset_name = kwargs['name']
 
-        constants = self._convert_choices(choices)
+        # Only one writer at a time, to not lose choices added concurrently.
+        with self._write_lock:
+
+            constants = self._convert_choices(choices)
 
-        # If we have a subset name, create a new subset with all the given constants.
-        if subset_name:
-            self.add_subset(subset_name, constants)
+            # If we have a subset name, create a new subset with all the given constants.
+            if subset_name:
+                self.add_subset(subset_name, constants)
 
     def extract_subset(self, *constants):
         """Create a subset of entries
@@ -407,6 +557,11 @@ class Choices(list):
         Choices
             The newly created subset, which is a ``Choices`` object
 
+        Notes
+        -----
+        The subset keeps the ``fallback`` of this instance if its entry is in the subset, and
+        counts its unknown keys in the ``unknown_values`` of this instance.
+
 
         Example
         -------
@@ -456,8 +611,11 @@ class Choices(list):
             **{
                 'dict_class': self.dict_class,
                 'mutable': False,
+                'codes': dict((constant, code) for constant, code in self.codes.items()
+                              if constant in constants),
             }
         )
+        self._share_unknown_handling(subset)
 
         return subset
 
@@ -518,16 +676,87 @@ class Choices(list):
 
         """
 
-        # Ensure that the name is not already used as an attribute.
-        if hasattr(self, name):
-            raise ValueError("Cannot use '%s' as a subset name. "
-                             "It's already an attribute." % name)
+        with self._write_lock:
+
+            # Ensure that the name is not already used as an attribute.
+            if hasattr(self, name):
+                raise ValueError("Cannot use '%s' as a subset name. "
+                                 "It's already an attribute." % name)
 
-        subset = self.extract_subset(*constants)
+            subset = self.extract_subset(*constants)
+            if self.import_path:
+                subset.import_path = '%s.%s' % (self.import_path, name)
 
-        # Make the subset accessible via an attribute.
-        setattr(self, name, subset)
-        self.subsets.append(name)
+            # Make the subset accessible via an attribute, then publish its name with a new list.
+            setattr(self, name, subset)
+            self.subsets = self.subsets + [name]
+
+    def set_codes(self, codes):
+        """Set the integer codes of some constants, to store their entries as codes in a database.
+
+        Codes are append-only: once set, the code of a constant cannot change, and a code cannot
+        be used by another constant, so codes already stored stay valid. The codes are also set
+        on the subsets having the constants.
+
+        Parameters
+        ----------
+        codes : dict
+            The code (an integer between 0 and 32767) of each constant.
+
+        Raises
+        ------
+        ValueError
+
+            * If a constant is not in this ``Choices`` instance.
+            * If a code is not an integer between 0 and 32767.
+            * If a constant already has another code, or a code is already used by another
+              constant.
+
+        Example
+        -------
+
+        >>> STATES = Choices(('ONLINE', 'online', 'Online'), ('DRAFT', 'draft', 'Draft'))
+        >>> STATES.set_codes({'ONLINE': 1})
+        >>> STATES.set_codes({'ONLINE': 1, 'DRAFT': 2})
+        >>> sorted(STATES.codes.items())
+        [('DRAFT', 2), ('ONLINE', 1)]
+        >>> STATES.set_codes({'DRAFT': 3})
+        Traceback (most recent call last):
+        ...
+        ValueError: The code of 'DRAFT' is already 2.
+
+        """
+
+        with self._write_lock:
+
+            new_codes = dict(self.codes)
+            constants_by_code = dict((code, constant) for constant, code in new_codes.items())
+
+            for constant, code in codes.items():
+                if not self.has_constant(constant):
+                    raise ValueError("'%s' is not a constant of this ``Choices`` instance."
+                                     % constant)
+                is_integer = isinstance(code, six.integer_types) and not isinstance(code, bool)
+                if not is_integer or not 0 <= code <= 32767:
+                    raise ValueError("The code of '%s' must be an integer between 0 and 32767."
+                                     % constant)
+                if new_codes.get(constant, code) != code:
+                    raise ValueError("The code of '%s' is already %s." % (
+                        constant, new_codes[constant]))
+                if constants_by_code.get(code, constant) != constant:
+                    raise ValueError("The code %s is already used by '%s'." % (
+                        code, constants_by_code[code]))
+                new_codes[constant] = code
+                constants_by_code[code] = constant
+
+            # Publish the new codes, and reset the values computed from them.
+            self.codes = new_codes
+            self._derived_cache = {}
+
+            for subset_name in self.subsets:
+                subset = getattr(self, subset_name)
+                subset.set_codes(dict((constant, code) for constant, code in codes.items()
+                                      if subset.has_constant(constant)))
 
     def for_constant(self, constant):
         """Returns the ``ChoiceEntry`` for the given constant.
@@ -562,7 +791,7 @@ class Choices(list):
 
         """
 
-        return self.constants[constant]
+        return self._index.constants[constant]
 
     def for_value(self, value):
         """Returns the ``ChoiceEntry`` for the given value.
@@ -597,7 +826,7 @@ class Choices(list):
 
         """
 
-        return self.values[value]
+        return self._index.values[value]
 
     def for_display(self, display):
         """Returns the ``ChoiceEntry`` for the given display name.
@@ -632,7 +861,159 @@ class Choices(list):
 
         """
 
-        return self.displays[display]
+        return self._index.displays[display]
+
+    def get_for_constant(self, constant, default=None):
+        """Returns the ``ChoiceEntry`` for the given constant, without raising if it's unknown.
+
+        Parameters
+        ----------
+        constant: string
+            Name of the constant for which we want the choice entry.
+        default: ?, optional
+            Returned if the constant is unknown. If not set, the ``fallback`` entry is returned.
+
+        Returns
+        -------
+        ChoiceEntry
+            The instance of ``ChoiceEntry`` for the given constant, else ``default``, else the
+            ``fallback`` entry, else ``None``.
+
+        Example
+        -------
+
+        >>> MY_CHOICES = Choices(('FOO', 1, 'foo'), ('BAR', 2, 'bar'))
+        >>> MY_CHOICES.get_for_constant('FOO')
+        ('FOO', 1, 'foo')
+        >>> MY_CHOICES.get_for_constant('QUX') is None
+        True
+        >>> MY_CHOICES.get_for_constant('QUX', 'qux')
+        'qux'
+
+        """
+
+        try:
+            entry = self._index.constants.get(constant)
+        except TypeError:
+            # Unhashable keys cannot be in the choices.
+            entry = None
+        if entry is None:
+            return self._get_unknown('constant', constant, default)
+        return entry
+
+    def get_for_value(self, value, default=None):
+        """Returns the ``ChoiceEntry`` for the given value, without raising if it's unknown.
+
+        Parameters
+        ----------
+        value: ?
+            Value for which we want the choice entry.
+        default: ?, optional
+            Returned if the value is unknown. If not set, the ``fallback`` entry is returned.
+
+        Returns
+        -------
+        ChoiceEntry
+            The instance of ``ChoiceEntry`` for the given value, else ``default``, else the
+            ``fallback`` entry, else ``None``.
+
+        Example
+        -------
+
+        >>> MY_CHOICES = Choices(('UNKNOWN', 0, 'unknown'), ('FOO', 1, 'foo'),
+        ...                      fallback='UNKNOWN', track_unknown=100)
+        >>> MY_CHOICES.get_for_value(1)
+        ('FOO', 1, 'foo')
+        >>> MY_CHOICES.get_for_value(3)
+        ('UNKNOWN', 0, 'unknown')
+        >>> MY_CHOICES.get_for_value(3, default=-1)
+        -1
+        >>> MY_CHOICES.unknown_values.most_common()
+        [(('value', 3), 2)]
+
+        """
+
+        try:
+            entry = self._index.values.get(value)
+        except TypeError:
+            # Unhashable keys cannot be in the choices.
+            entry = None
+        if entry is None:
+            return self._get_unknown('value', value, default)
+        return entry
+
+    def get_for_display(self, display, default=None):
+        """Returns the ``ChoiceEntry`` for the given display name, without raising if it's unknown.
+
+        Parameters
+        ----------
+        display: string
+            Display name for which we want the choice entry.
+        default: ?, optional
+            Returned if the display name is unknown. If not set, the ``fallback`` entry is
+            returned.
+
+        Returns
+        -------
+        ChoiceEntry
+            The instance of ``ChoiceEntry`` for the given display name, else ``default``, else
+            the ``fallback`` entry, else ``None``.
+
+        Example
+        -------
+
+        >>> MY_CHOICES = Choices(('FOO', 1, 'foo'), ('BAR', 2, 'bar'))
+        >>> MY_CHOICES.get_for_display('foo')
+        ('FOO', 1, 'foo')
+        >>> MY_CHOICES.get_for_display('qux') is None
+        True
+
+        """
+
+        try:
+            entry = self._index.displays.get(display)
+        except TypeError:
+            # Unhashable keys cannot be in the choices.
+            entry = None
+        if entry is None:
+            return self._get_unknown('display', display, default)
+        return entry
+
+    def _get_unknown(self, kind, key, default):
+        """Track an unknown key, and return ``default``, or the ``fallback`` entry.
+
+        Unhashable keys, that cannot be in the choices, are unknown keys, but are not tracked.
+
+        Raises
+        ------
+        ValueError
+            If the ``fallback`` entry is needed but ``fallback`` is not a constant of the choices.
+
+        """
+
+        if self.unknown_values is not None:
+            try:
+                self.unknown_values.track(kind, key)
+            except TypeError:
+                pass
+
+        if default is not None or self.fallback is None:
+            return default
+
+        self._check_fallback()
+        return self.for_constant(self.fallback)
+
+    def _share_unknown_handling(self, subset):
+        """Give to ``subset`` the ``fallback``, if it's in the subset, and the unknown keys tracker.
+
+        The unknown keys looked up in subsets are counted in the ``unknown_values`` of the main
+        ``Choices`` instance.
+
+        """
+
+        if self.fallback is not None and subset.has_constant(self.fallback):
+            subset.fallback = self.fallback
+        subset.unknown_values = self.unknown_values
 
     def has_constant(self, constant):
         """Check if the current ``Choices`` object has the given constant.
@@ -658,7 +1039,7 @@ class Choices(list):
 
         """
 
-        return constant in self.constants
+        return constant in self._index.constants
 
     def has_value(self, value):
         """Check if the current ``Choices`` object has the given value.
@@ -684,7 +1065,7 @@ class Choices(list):
 
         """
 
-        return value in self.values
+        return value in self._index.values
 
     def has_display(self, display):
         """Check if the current ``Choices`` object has the given display name.
@@ -710,7 +1091,7 @@ class Choices(list):
 
         """
 
-        return display in self.displays
+        return display in self._index.displays
 
     def __contains__(self, item):
         """Check if the current ``Choices`` object has the given value.
@@ -745,9 +1126,9 @@ class Choices(list):
 
         """
 
-        # If the key is an int, call ``super`` to access the list[key] item
+        # If the key is an int, return the choice at this position.
         if isinstance(key, int):
-            return super(Choices, self).__getitem__(key)
+            return self._index.choices[key]
 
         if not hasattr(self, key):
             raise KeyError("Attribute '%s' not found." % key)
@@ -804,10 +1185,309 @@ class Choices(list):
         if other and len(other[0]) == 3:
             return self.entries == other
 
-        return super(Choices, self).__eq__(other)
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(self) == other
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __len__(self):
+        """Return the number of choices."""
+        return len(self._index.choices)
+
+    def __iter__(self):
+        """Iterate on the choices as expected by django, ie tuples (value, display name)."""
+        return iter(self._index.choices)
+
+    def __reversed__(self):
+        """Iterate on the choices as expected by django, from the last one."""
+        return reversed(self._index.choices)
 
     # TODO: implement __iadd__ and __add__
 
+    def memory_usage(self, deep=True):
+        """Return the memory used by the current ``Choices`` instance, in bytes.
+
+        Parameters
+        ----------
+        deep : boolean
+            If ``True`` (the default), also count the objects used to create the choices, that
+            may be shared with other objects: the original constants, values and display names,
+            and the content of the additional attributes.
+
+        Returns
+        -------
+        dict
+            The memory used, in bytes, by:
+
+            * ``entries``: the ``ChoiceEntry`` instances, with their ``(value, display)`` tuples
+            * ``attributes``: the choice attributes (``constant``, ``value`` and ``display``) of
+              the entries
+            * ``indexes``: the list and the dicts used to access the entries
+            * ``subsets``: the subsets, without the entries shared with the current instance
+            * ``extra_attributes``: the dicts of additional attributes of the entries
+            * ``total``: the sum of all of these
+
+        Notes
+        -----
+        Sizes are computed with ``sys.getsizeof``, each object being counted only once.
+
+        Example
+        -------
+
+        >>> MY_CHOICES = Choices(('FOO', 1, 'foo'), ('BAR', 2, 'bar', {'bar': True}))
+        >>> MY_CHOICES.add_subset('BAR_ONLY', ('BAR', ))
+        >>> usage = MY_CHOICES.memory_usage()
+        >>> sorted(usage)
+        ['attributes', 'entries', 'extra_attributes', 'indexes', 'subsets', 'total']
+        >>> usage['total'] == sum(size for part, size in usage.items() if part != 'total')
+        True
+        >>> usage['subsets'] < usage['indexes']
+        True
+        >>> MY_CHOICES.memory_usage(deep=False)['total'] < usage['total']
+        True
+
+        """
+
+        return self._get_memory_usage(set(), deep)
+
+    def _get_memory_usage(self, seen, deep):
+        """Compute ``memory_usage``, ignoring the objects whose ids are in ``seen``.
+
+        The ids of the counted objects are added to ``seen``, so objects shared with the subsets
+        are counted only once.
+
+        """
+
+        def sizeof(*objects):
+            """Return the size of the given objects, not already counted."""
+            size = 0
+            for obj in objects:
+                if id(obj) not in seen:
+                    seen.add(id(obj))
+                    size += sys.getsizeof(obj)
+            return size
+
+        usage = dict.fromkeys(('entries', 'attributes', 'indexes', 'subsets', 'extra_attributes'), 0)
+        self._add_memory_usage(usage, sizeof, deep)
+
+        for subset_name in self.subsets:
+            usage['subsets'] += getattr(self, subset_name)._get_memory_usage(seen, deep)['total']
+
+        usage['total'] = sum(usage.values())
+
+        return usage
+
+    def _add_memory_usage(self, usage, sizeof, deep):
+        """Add, in the ``usage`` dict, the memory used by the indexes and the entries."""
+
+        index = self._index
+        usage['indexes'] += sizeof(self, vars(self), index, index.entries,
+                                   index.constants, index.values, index.displays)
+        self._add_entries_memory_usage(usage, index.entries, sizeof, deep)
+
+    @staticmethod
+    def _add_entries_memory_usage(usage, entries, sizeof, deep):
+        """Add, in the ``usage`` dict, the memory used by the given entries."""
+
+        for entry in entries:
+            usage['entries'] += sizeof(entry, vars(entry), entry.choice)
+
+            for attribute in (entry.constant, entry.value, entry.display):
+                usage['attributes'] += sizeof(attribute, vars(attribute))
+                if deep:
+                    usage['attributes'] += sizeof(attribute.original_value)
+
+            if entry.attributes:
+                usage['extra_attributes'] += sizeof(entry.attributes)
+                if deep:
+                    for key, value in entry.attributes.items():
+                        usage['extra_attributes'] += sizeof(key, value)
+
+    def model_field(self, default_constant=None, **kwargs):
+        """Return the smallest model field able to store the values of this ``Choices``.
+
+        See ``extended_choices.fields.get_model_field``.
+
+        Parameters
+        ----------
+        default_constant : string, optional
+            The constant of the entry whose value is the default value of the field.
+        **kwargs
+            Other arguments for the field, like ``null`` or ``db_index``.
+
+        Returns
+        -------
+        Field
+            An integer field (from ``PositiveSmallIntegerField`` to ``BigIntegerField``) or a
+            ``CharField`` with the length of the longest value, from ``extended_choices.fields``.
+
+        Example
+        -------
+
+        >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', -1, 'Draft'))
+        >>> STATES.model_field(default_constant='DRAFT').__class__.__name__
+        'ExtendedChoiceSmallIntegerField'
+
+        """
+
+        from .fields import get_model_field
+        return get_model_field(self, default_constant, **kwargs)
+
+    def resolve_expression(self, *args, **kwargs):  # pylint: disable=unused-argument
+        """Return a ``ChoicesValue`` wrapping the instance, when used as a value in a queryset.
+
+        Django rebuilds the lists and tuples used as filter values, from their items, which
+        would fail as the items of a ``Choices`` are ``(value, display)`` pairs. The wrapper is
+        used as is by the ``in_subset``, ``has_any`` and ``has_all`` lookups, and the other
+        lookups raise a ``ValueError``, instead of sending the instance to the database (see
+        ``extended_choices.lookups``).
+
+        """
+
+        from .lookups import ChoicesValue
+        return ChoicesValue(self)
+
+    def display_expression(self, field_name):
+        """Return an expression giving the display name of the value of a field, in the database.
+
+        See ``extended_choices.expressions.display_expression``.
+
+        Example
+        -------
+
+        >>> MY_CHOICES = Choices(('FOO', 1, 'foo'), ('BAR', 2, 'bar'))
+        >>> expression = MY_CHOICES.display_expression('state')
+        >>> expression
+        <ValuesMap: F(state), 2 values, 0 ranges>
+        >>> MY_CHOICES.display_expression('state') is expression
+        True
+
+        """
+
+        from .expressions import display_expression
+        return display_expression(self, field_name)
+
+    def order_expression(self, field_name, by='display'):
+        """Return an expression giving the rank of the value of a field, to order by it.
+
+        See ``extended_choices.expressions.order_expression``.
+
+        Example
+        -------
+
+        >>> MY_CHOICES = Choices(('FOO', 1, 'foo'), ('BAR', 2, 'bar'), ('BAZ', 3, 'baz'))
+        >>> # Consecutive values with consecutive ranks need only one condition.
+        >>> expression = MY_CHOICES.order_expression('state', by='declaration')
+        >>> expression.ranges, expression.mapping
+        (((1, 3, -1),), ())
+        >>> # By display: 'bar' (2) and 'baz' (3) are grouped, then 'foo' (1) is mapped.
+        >>> expression = MY_CHOICES.order_expression('state', by='display')
+        >>> expression.ranges, expression.mapping
+        (((2, 3, -2),), ((1, 2),))
+
+        """
+
+        from .expressions import order_expression
+        return order_expression(self, field_name, by)
+
+    def count_by(self, queryset, field_name, subset=None, cache=None):
+        """Count the rows of a queryset for each entry, in a single ``GROUP BY`` query.
+
+        See ``extended_choices.aggregates.count_by``.
+
+        Parameters
+        ----------
+        queryset : QuerySet
+            The rows to count.
+        field_name : string
+            The name of the field, or a path to it, like ``author__state``.
+        subset : string or Choices, optional
+            A subset (or its name) to only count the rows having one of its values.
+        cache : dict, optional
+            A dict to cache the result in, for example one per request.
+
+        Returns
+        -------
+        ChoicesCounts
+            An ordered mapping of each entry to its number of rows, ``0`` if none, with the rows
+            having unknown values counted in its ``unknown`` attribute.
+
+        """
+
+        from .aggregates import count_by
+        return count_by(self, queryset, field_name, subset, cache)
+
+    def to_dict(self):
+        """Export the current ``Choices`` instance to a dict, in a versioned columnar format.
+
+        See ``extended_choices.schema.choices_to_dict`` for the format.
+
+        Example
+        -------
+
+        >>> MY_CHOICES = Choices(('FOO', 1, 'foo'), ('BAR', 2, 'bar'))
+        >>> data = MY_CHOICES.to_dict()
+        >>> data['constants'], data['values'], data['displays']
+        (['FOO', 'BAR'], [1, 2], ['foo', 'bar'])
+
+        """
+
+        from .schema import choices_to_dict
+        return choices_to_dict(self)
+
+    def to_json(self, **kwargs):
+        """Export the current ``Choices`` instance to JSON. See ``to_dict``.
+
+        Parameters
+        ----------
+        **kwargs : dict
+            Passed to ``json.dumps``.
+
+        """
+
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_msgpack(self):
+        """Export the current ``Choices`` instance to msgpack, if installed. See ``to_dict``."""
+
+        from .schema import choices_to_msgpack
+        return choices_to_msgpack(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a ``Choices`` instance from a dict created by ``to_dict``.
+
+        The class of the new instance is the one saved in ``data``, that must be the current class
+        or a subclass. See ``extended_choices.schema.choices_from_dict``.
+
+        Example
+        -------
+
+        >>> MY_CHOICES = Choices(('FOO', 1, 'foo'), ('BAR', 2, 'bar'))
+        >>> Choices.from_dict(MY_CHOICES.to_dict())
+        [('FOO', 1, 'foo'), ('BAR', 2, 'bar')]
+
+        """
+
+        from .schema import choices_from_dict
+        return choices_from_dict(data, cls)
+
+    @classmethod
+    def from_json(cls, serialized):
+        """Create a ``Choices`` instance from JSON created by ``to_json``. See ``from_dict``."""
+
+        return cls.from_dict(json.loads(serialized))
+
+    @classmethod
+    def from_msgpack(cls, packed):
+        """Create a ``Choices`` instance from msgpack created by ``to_msgpack``. See ``from_dict``."""
+
+        from .schema import choices_from_msgpack
+        return choices_from_msgpack(packed, cls)
+
     def __reduce__(self):
         """Reducer to make the auto-created classes picklable.
 
@@ -818,8 +1498,32 @@ class Choices(list):
             1. a callable to recreate the object
             2. a tuple with all positioned arguments expected by this callable
 
+        Raises
+        ------
+        pickle.PicklingError
+            If ``import_path`` is set but doesn't lead to the current instance.
+
+        Notes
+        -----
+        If the instance was defined with an ``import_path``, only this path is pickled and the
+        existing instance will be returned when unpickling. It's also the case for ``copy`` and
+        ``deepcopy``.
+
         """
 
+        if self.import_path:
+            if not self._import_path_checked:
+                try:
+                    obj = import_from_path(self.import_path)
+                except ImportError:
+                    obj = None
+                if obj is not self:
+                    raise pickle.PicklingError("The ``Choices`` instance is not available at '%s'."
+                                               % self.import_path)
+                self._import_path_checked = True
+
+            return (import_from_path, (self.import_path, ))
+
         return (
             # Function to create a ``Choices`` instance
             create_choice,
@@ -853,6 +1557,9 @@ class Choices(list):
                 {
                     'dict_class': self.dict_class,
                     'mutable': self._mutable,
+                    'fallback': self.fallback,
+                    'track_unknown': self.unknown_values.max_size if self.unknown_values else None,
+                    'codes': self.codes,
                 }
             )
         )
@@ -0,0 +1,479 @@
+"""Provides ``ChoiceSet``, an immutable set of entries of a ``Choices`` instance, stored as a bitmask.
+
+Sets of choices, like the allowed states of a content, are often python sets of values, created,
+intersected and compared on each request, each operation hashing all the values. A ``ChoiceSet``
+is bound to a ``Choices`` instance and stores its entries as the bits of an integer, the entry at
+position ``n`` having the bit ``1 << n``: set operations are bitwise operations on integers, and
+membership is a dict lookup followed by a bitwise ``AND``.
+
+``ChoiceSet`` instances are hashable, so they can be used as cache keys, and are the values of
+``ChoicesBitmaskField``.
+
+Example
+-------
+
+.. code-block:: python
+
+    PUBLISHABLE = ChoiceSet(STATES, ['DRAFT', 'OFFLINE'])
+    if content.state in PUBLISHABLE & allowed_states:
+        ...
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import unicode_literals
+
+import operator
+from collections import namedtuple
+
+import six
+
+from .choices import Choices
+from .helpers import ChoiceEntry
+
+__all__ = [
+    'ChoiceSet',
+    'get_bit_tables',
+]
+
+# Up to this number of entries, sets are iterated with a table per byte of their bitmask.
+MAX_BYTE_TABLES_ENTRIES = 64
+
+BitTables = namedtuple('BitTables', ['bits_by_value', 'bits_by_constant', 'entries', 'byte_tables'])
+
+
+def get_bit_tables(choices):
+    """Return the tables to convert sets of entries of a ``Choices`` instance to bitmasks, and back.
+
+    The entry at position ``n`` in ``choices`` has the bit ``1 << n``. The tables are cached in
+    ``choices`` until choices are added.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance.
+
+    Returns
+    -------
+    BitTables
+        A named tuple with:
+
+        * ``bits_by_value``, a dict of the bits by value,
+        * ``bits_by_constant``, a dict of the bits by constant,
+        * ``entries``, the tuple of the entries,
+        * ``byte_tables``, for each byte of the bitmasks, the tuples of the entries of each of the
+          256 possible values of this byte, or ``None`` if there are more than 64 entries.
+
+    Example
+    -------
+
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'), ('OFFLINE', 3, 'Offline'))
+    >>> tables = get_bit_tables(STATES)
+    >>> tables.bits_by_value
+    {1: 1, 2: 2, 3: 4}
+    >>> [entry.constant for entry in tables.byte_tables[0][5]]
+    ['ONLINE', 'OFFLINE']
+
+    """
+
+    cache = choices._derived_cache  # pylint: disable=protected-access
+
+    tables = cache.get('bit_tables')
+    if tables is None:
+        entries = tuple(choices.entries)
+
+        bits_by_value, bits_by_constant = {}, {}
+        for index, entry in enumerate(entries):
+            bits_by_value[entry.value.original_value] = 1 << index
+            bits_by_constant[entry.constant.original_value] = 1 << index
+
+        byte_tables = None
+        if len(entries) <= MAX_BYTE_TABLES_ENTRIES:
+            byte_tables = []
+            for start in range(0, len(entries), 8):
+                byte_entries = entries[start:start + 8]
+                byte_tables.append([
+                    tuple(entry for index, entry in enumerate(byte_entries) if byte & (1 << index))
+                    for byte in range(256)
+                ])
+
+        tables = cache.setdefault('bit_tables', BitTables(bits_by_value, bits_by_constant, entries,
+                                                          byte_tables))
+
+    return tables
+
+
+def _new_set(cls, choices, mask, bits_by_value):
+    """Create a set of ``choices`` with a bitmask known to be valid, without checking it."""
+
+    choice_set = object.__new__(cls)
+    choice_set.choices = choices
+    choice_set.mask = mask
+    choice_set._bits_by_value = bits_by_value  # pylint: disable=protected-access
+    return choice_set
+
+
+def _difference(mask, other_mask):
+    """Return the bits of ``mask`` that are not in ``other_mask``."""
+    return mask & ~other_mask
+
+
+def _get_bit(tables, item):
+    """Return the bit of an entry, value or constant, or ``None`` if it's not in the tables."""
+
+    if isinstance(item, ChoiceEntry):
+        item = item.value
+
+    try:
+        return tables.bits_by_value[item]
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable items cannot be in the choices.
+        return None
+
+    if isinstance(item, six.string_types):
+        return tables.bits_by_constant.get(item)
+
+    return None
+
+
+class ChoiceSet(object):
+    """An immutable set of entries of a ``Choices`` instance, stored as a bitmask.
+
+    Items are given and looked up as entries, values or constants. Iterating gives the entries,
+    in the order of the ``Choices``. Set operators (``|``, ``&``, ``-``, ``^``) and comparisons
+    (``<=``, ``<``, ``>=``, ``>``) work with the sets of the same ``Choices`` instance, and with
+    python sets of items. Items of python sets that are not in the choices follow the set
+    semantics: they are ignored by ``&`` and ``-``, and are taken into account by comparisons.
+    As a ``ChoiceSet`` cannot hold them, ``|``, ``^`` and ``set - choice_set`` return a
+    ``frozenset`` of the entries and of these items when there are some.
+
+    A ``ChoiceSet`` is only equal to the sets of the same ``Choices`` instance having the same
+    entries, and is hashable. Use ``frozenset(choice_set)`` to compare it with other sets.
+
+    As positions define the bits, sets are only valid while entries are only added at the end of
+    the ``Choices``, and should not be kept between processes if it's not always the case.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance (or subset) having the entries.
+    items : iterable, optional
+        The entries, values or constants in the set, or a subset of ``choices``.
+
+    Attributes
+    ----------
+    choices : Choices
+        The ``Choices`` instance having the entries.
+    mask : int
+        The bitmask of the entries.
+
+    Raises
+    ------
+    ValueError
+        If an item is not in ``choices``.
+
+    Example
+    -------
+
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'), ('OFFLINE', 3, 'Offline'))
+    >>> STATES.add_subset('NOT_ONLINE', ('DRAFT', 'OFFLINE'))
+    >>> choice_set = ChoiceSet(STATES, [3, 'ONLINE'])
+    >>> choice_set
+    <ChoiceSet: ONLINE, OFFLINE>
+    >>> choice_set.mask, len(choice_set), 1 in choice_set, 'DRAFT' in choice_set
+    (5, 2, True, False)
+    >>> choice_set & ChoiceSet(STATES, STATES.NOT_ONLINE)
+    <ChoiceSet: OFFLINE>
+    >>> choice_set | {'DRAFT'}
+    <ChoiceSet: ONLINE, DRAFT, OFFLINE>
+    >>> choice_set & {1, 4}, choice_set <= {1, 3, 4}
+    (<ChoiceSet: ONLINE>, True)
+    >>> choice_set | {4} == frozenset(choice_set) | {4}
+    True
+    >>> ChoiceSet.from_subset(STATES, 'NOT_ONLINE').to_subset()
+    [('DRAFT', 2, 'Draft'), ('OFFLINE', 3, 'Offline')]
+
+    """
+
+    # ``_bits_by_value`` is the dict of the bits by value of the tables of ``choices``, kept to
+    # look up values without going through the cache of ``choices``. When choices are added,
+    # the bits of the existing entries don't change, so it's still valid for them.
+    __slots__ = ('choices', 'mask', '_bits_by_value')
+
+    def __init__(self, choices, items=()):
+        tables = get_bit_tables(choices)
+
+        if isinstance(items, Choices):
+            items = items.entries
+
+        bits_by_value = tables.bits_by_value
+        mask = 0
+        for item in items:
+            try:
+                mask |= bits_by_value[item]
+                continue
+            except (KeyError, TypeError):
+                pass
+            # Entries, constants, and items that are not in the choices.
+            bit = _get_bit(tables, item)
+            if bit is None:
+                raise ValueError("%r is not in the choices of the set." % (item, ))
+            mask |= bit
+
+        self.choices = choices
+        self.mask = mask
+        self._bits_by_value = bits_by_value
+
+    @classmethod
+    def from_mask(cls, choices, mask):
+        """Return the set of the entries of ``choices`` having their bit set in ``mask``.
+
+        Bits without entry are ignored.
+
+        """
+
+        tables = get_bit_tables(choices)
+        return _new_set(cls, choices, mask & ((1 << len(tables.entries)) - 1),
+                        tables.bits_by_value)
+
+    @classmethod
+    def from_subset(cls, choices, subset_name):
+        """Return the set of the entries of the subset of ``choices`` named ``subset_name``."""
+
+        if subset_name not in choices.subsets:
+            raise ValueError("'%s' is not a subset of this ``Choices`` instance." % subset_name)
+
+        return cls(choices, getattr(choices, subset_name))
+
+    def to_subset(self):
+        """Return a new subset of the ``Choices`` instance, with the entries of the set."""
+        return self.choices.extract_subset(*self.constants)
+
+    @property
+    def entries(self):
+        """The entries of the set, in the order of the ``Choices``."""
+        return list(self)
+
+    @property
+    def constants(self):
+        """The constants of the entries of the set, in the order of the ``Choices``."""
+        return [entry.constant for entry in self]
+
+    @property
+    def values(self):
+        """The values of the entries of the set, in the order of the ``Choices``."""
+        return [entry.value for entry in self]
+
+    def __iter__(self):
+        tables = get_bit_tables(self.choices)
+        mask = self.mask
+
+        if tables.byte_tables is not None:
+            for byte_table in tables.byte_tables:
+                if not mask:
+                    return
+                for entry in byte_table[mask & 0xFF]:
+                    yield entry
+                mask >>= 8
+            return
+
+        entries = tables.entries
+        while mask:
+            lowest_bit = mask & -mask
+            yield entries[lowest_bit.bit_length() - 1]
+            mask ^= lowest_bit
+
+    def __contains__(self, item):
+        # Directly look up values, ``in`` being the most common operation.
+        try:
+            return self.mask & self._bits_by_value[item] != 0
+        except (KeyError, TypeError):
+            pass
+        # Entries, constants, values of added entries, and items not in the choices.
+        bit = _get_bit(get_bit_tables(self.choices), item)
+        return bit is not None and bool(self.mask & bit)
+
+    def __len__(self):
+        return bin(self.mask).count('1')
+
+    def __bool__(self):
+        return bool(self.mask)
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return '<%s: %s>' % (self.__class__.__name__, ', '.join(self.constants))
+
+    def __reduce__(self):
+        return self.__class__.from_mask, (self.choices, self.mask)
+
+    def __eq__(self, other):
+        if not isinstance(other, ChoiceSet):
+            return NotImplemented
+        return self.choices is other.choices and self.mask == other.mask
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash((id(self.choices), self.mask))
+
+    def _split_other(self, other):
+        """Return the bitmask of the items of another set, and its items not in the choices.
+
+        Returns
+        -------
+        tuple or None
+            The bitmask of the items in the choices, and the list of the other items (only
+            python sets can have some), or ``None`` if ``other`` is not a set.
+
+        """
+
+        if isinstance(other, ChoiceSet):
+            if other.choices is not self.choices:
+                raise ValueError("Cannot combine sets of different ``Choices`` instances.")
+            return other.mask, ()
+
+        if isinstance(other, Choices):
+            return self.__class__(self.choices, other).mask, ()
+
+        if isinstance(other, (set, frozenset)):
+            tables = get_bit_tables(self.choices)
+            mask, unknown_items = 0, []
+            for item in other:
+                bit = _get_bit(tables, item)
+                if bit is None:
+                    unknown_items.append(item)
+                else:
+                    mask |= bit
+            return mask, unknown_items
+
+        return None
+
+    def _combine(self, other, combine, keep_unknown_items=False):
+        """Return the set of the combination of the bitmasks of ``self`` and ``other``.
+
+        If ``keep_unknown_items`` is set, the items of ``other`` that are not in the choices are
+        in the result, that is then a ``frozenset`` of entries and of these items.
+
+        """
+
+        if isinstance(other, ChoiceSet) and other.choices is self.choices:
+            # The most common case, directly combined.
+            return _new_set(self.__class__, self.choices, combine(self.mask, other.mask),
+                            self._bits_by_value)
+
+        split = self._split_other(other)
+        if split is None:
+            return NotImplemented
+        other_mask, unknown_items = split
+
+        # Both bitmasks are valid, so is their combination.
+        combined = _new_set(self.__class__, self.choices, combine(self.mask, other_mask),
+                            self._bits_by_value)
+
+        if keep_unknown_items and unknown_items:
+            return frozenset(combined).union(unknown_items)
+        return combined
+
+    def __or__(self, other):
+        return self._combine(other, operator.or_, True)
+
+    def __and__(self, other):
+        return self._combine(other, operator.and_)
+
+    def __sub__(self, other):
+        return self._combine(other, _difference)
+
+    def __xor__(self, other):
+        return self._combine(other, operator.xor, True)
+
+    __ror__ = __or__
+    __rand__ = __and__
+    __rxor__ = __xor__
+
+    def __rsub__(self, other):
+        return self._combine(other, lambda mask, other_mask: _difference(other_mask, mask), True)
+
+    def _compare(self, other, compare):
+        """Return the comparison of the bitmasks of ``self`` and ``other``.
+
+        ``compare`` also gets if ``other`` has items that are not in the choices.
+
+        """
+
+        split = self._split_other(other)
+        if split is None:
+            return NotImplemented
+        other_mask, unknown_items = split
+
+        return compare(self.mask, other_mask, bool(unknown_items))
+
+    def __le__(self, other):
+        return self._compare(other, lambda mask, other_mask, has_unknown: (
+            _is_subset(mask, other_mask)))
+
+    def __lt__(self, other):
+        return self._compare(other, lambda mask, other_mask, has_unknown: (
+            (mask != other_mask or has_unknown) and _is_subset(mask, other_mask)))
+
+    def __ge__(self, other):
+        return self._compare(other, lambda mask, other_mask, has_unknown: (
+            not has_unknown and _is_subset(other_mask, mask)))
+
+    def __gt__(self, other):
+        return self._compare(other, lambda mask, other_mask, has_unknown: (
+            not has_unknown and mask != other_mask and _is_subset(other_mask, mask)))
+
+    def _as_set(self, items):
+        """Return ``items`` as a set, of the same ``Choices`` instance if it's a ``Choices``."""
+
+        if isinstance(items, (ChoiceSet, set, frozenset)):
+            return items
+
+        if isinstance(items, Choices):
+            return self.__class__(self.choices, items)
+
+        return frozenset(items)
+
+    def union(self, items):
+        """Return the set of the entries of the set or of the iterable ``items``."""
+        return self | self._as_set(items)
+
+    def intersection(self, items):
+        """Return the set of the entries of the set and of the iterable ``items``."""
+        return self & self._as_set(items)
+
+    def difference(self, items):
+        """Return the set of the entries of the set not in the iterable ``items``."""
+        return self - self._as_set(items)
+
+    def symmetric_difference(self, items):
+        """Return the set of the entries either in the set or in the iterable ``items``."""
+        return self ^ self._as_set(items)
+
+    def issubset(self, items):
+        """Tell if all the entries of the set are in the iterable ``items``."""
+        return self <= self._as_set(items)
+
+    def issuperset(self, items):
+        """Tell if all the entries of the iterable ``items`` are in the set."""
+        return self >= self._as_set(items)
+
+    def isdisjoint(self, items):
+        """Tell if the set has no entry in common with the iterable ``items``."""
+        return not self & self._as_set(items)
+
+
+def _is_subset(mask, other_mask):
+    """Tell if all the bits of ``mask`` are set in ``other_mask``."""
+    return mask & ~other_mask == 0
@@ -0,0 +1,611 @@
+"""Provides a ``ColumnarChoices`` class, storing the choices in columns instead of objects.
+
+A ``Choices`` instance keeps, for each choice, a ``ChoiceEntry`` (a tuple with a ``__dict__``)
+holding three wrapped attributes, plus a ``(value, display)`` tuple in the list itself.
+
+For catalogs with a lot of choices, ``ColumnarChoices`` stores the constants, values and displays
+in parallel arrays instead: integer values in an ``array``, texts in a pool where each distinct
+text is stored once. The ``ChoiceEntry`` objects are only created when asked for, and the most
+recently used ones are kept in a bounded cache.
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import unicode_literals
+
+from array import array
+from collections import OrderedDict, namedtuple
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:  # pragma: no cover
+    from collections import Mapping, Sequence
+
+import six
+
+from .choices import Choices, create_choice
+
+__all__ = [
+    'ColumnarChoices',
+]
+
+# Default maximum number of ``ChoiceEntry`` kept in the cache of a ``ColumnarChoices``.
+DEFAULT_ENTRIES_CACHE_SIZE = 1024
+
+# Typecode of the array of integer values: 64 bits, or on Python 2, that has no ``q``, the C
+# ``long`` (64 bits on most 64-bit platforms).
+try:
+    array(str('q'))
+    INT_TYPECODE = str('q')
+except ValueError:  # pragma: no cover
+    INT_TYPECODE = str('l')
+
+# Bounds of the integers that can be stored in the array of values. Others go to the pool.
+_INT_MIN = -2 ** (array(INT_TYPECODE).itemsize * 8 - 1)
+_INT_MAX = -_INT_MIN - 1
+
+if hasattr(OrderedDict, 'move_to_end'):
+    _OrderedDict = OrderedDict
+else:  # pragma: no cover
+    class _OrderedDict(OrderedDict):
+        """``OrderedDict`` with the ``move_to_end`` method of Python 3."""
+
+        def move_to_end(self, key):
+            """Move an existing key at the end, or raise ``KeyError``."""
+            self[key] = self.pop(key)
+
+
+# Positions (in the columns) of the choices of a ``ColumnarChoices``, and dicts to get these
+# positions by constant, value or display name. Replaced as a whole at each update.
+_ColumnarIndex = namedtuple('_ColumnarIndex', ['positions', 'constants', 'values', 'displays'])
+
+
+class _ChoicesColumns(object):
+    """Parallel arrays holding the choices of a ``ColumnarChoices`` and of its subsets.
+
+    Columns are only appended to, by the ``ColumnarChoices`` owning them, under its write lock.
+    A position is never used by a reader before all its columns are filled.
+
+    Parameters
+    ----------
+    entry_class : type
+        The ``ChoiceEntry`` class to use to create the entries.
+    cache_size : int or None
+        The maximum number of entries to keep in the cache. ``None`` for no limit.
+    import_path : string or None
+        The ``import_path`` of the owning ``ColumnarChoices``, to pickle entries by reference.
+
+    """
+
+    def __init__(self, entry_class, cache_size, import_path):
+        self.entry_class = entry_class
+        self.cache_size = cache_size
+        self.import_path = import_path
+
+        # Texts (and other objects) used in the columns. Each distinct text is stored once.
+        self.pool = []
+        self._pool_ids = {}
+
+        # Ids, in the pool, of the constant and display name of each choice.
+        self.constants = array(str('I'))
+        self.displays = array(str('I'))
+
+        # The raw values as long as they are all integers in the bounds of the array, else their
+        # ids in the pool.
+        self.values = array(INT_TYPECODE)
+
+        # Additional attributes, only for the choices having some.
+        self.attributes = {}
+
+        # Cache of the created ``ChoiceEntry``, by position, from the least recently used.
+        self.entries = _OrderedDict()
+
+    def _get_pool_id(self, obj):
+        """Return the id of the given object in the pool, adding it if needed."""
+
+        is_text = type(obj) is six.text_type
+        if is_text:
+            try:
+                return self._pool_ids[obj]
+            except KeyError:
+                pass
+
+        self.pool.append(obj)
+        pool_id = len(self.pool) - 1
+        if is_text:
+            self._pool_ids[obj] = pool_id
+
+        return pool_id
+
+    def append(self, entry):
+        """Add the given ``ChoiceEntry`` at the end of the columns and return its position."""
+
+        position = len(self.constants)
+        value = entry.value.original_value
+
+        values = self.values
+        if values.typecode == INT_TYPECODE and not (
+                type(value) in six.integer_types and _INT_MIN <= value <= _INT_MAX):
+            # Not an integer that fits in the array: from now on, values are stored in the pool.
+            # Readers still using the previous array get the same values for the positions they
+            # know.
+            values = self.values = array(str('I'), [self._get_pool_id(v) for v in values])
+
+        values.append(value if values.typecode == INT_TYPECODE else self._get_pool_id(value))
+        self.constants.append(self._get_pool_id(entry.constant.original_value))
+        self.displays.append(self._get_pool_id(entry.display.original_value))
+        if entry.attributes:
+            self.attributes[position] = entry.attributes
+
+        return position
+
+    def value_at(self, position):
+        """Return the raw value of the choice at the given position."""
+
+        values = self.values
+        if values.typecode == INT_TYPECODE:
+            return values[position]
+        return self.pool[values[position]]
+
+    def keys_at(self, position):
+        """Return the raw constant, value and display name of the choice at the given position."""
+
+        return (
+            self.pool[self.constants[position]],
+            self.value_at(position),
+            self.pool[self.displays[position]],
+        )
+
+    def choice_at(self, position):
+        """Return the raw ``(value, display name)`` of the choice at the given position."""
+
+        return self.value_at(position), self.pool[self.displays[position]]
+
+    def entry_at(self, position):
+        """Return the ``ChoiceEntry`` of the choice at the given position, creating it if needed.
+
+        When the cache is full, the least recently used entries are removed from it.
+
+        """
+
+        entries = self.entries
+        cache_size = self.cache_size
+
+        try:
+            entry = entries[position]
+            if cache_size is not None:
+                entries.move_to_end(position)
+            return entry
+        except KeyError:
+            # Not created yet, or removed by another thread in the meantime.
+            pass
+
+        entry = self.entry_class(self.keys_at(position) + (self.attributes.get(position), ))
+        if self.import_path:
+            entry._import_path = self.import_path  # pylint: disable=protected-access
+
+        if cache_size is not None:
+            while len(entries) >= cache_size:
+                try:
+                    entries.popitem(last=False)
+                except KeyError:
+                    break
+
+        # If another thread created it in the meantime, use the same one.
+        return entries.setdefault(position, entry)
+
+
+class _EntriesSequence(Sequence):
+    """Read-only sequence of the ``ChoiceEntry`` of the choices at the given positions.
+
+    Entries are got from the columns when accessed, so they are not all kept in memory.
+
+    """
+
+    __hash__ = None
+
+    def __init__(self, storage, positions):
+        self._storage = storage
+        self._positions = positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._storage.entry_at(position) for position in self._positions[index]]
+        return self._storage.entry_at(self._positions[index])
+
+    def __iter__(self):
+        entry_at = self._storage.entry_at
+        for position in self._positions:
+            yield entry_at(position)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, _EntriesSequence)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class _EntriesMapping(Mapping):
+    """Read-only mapping of the ``ChoiceEntry`` by constant, value or display name.
+
+    It wraps the dict of the positions of the choices by this key, and entries are got from the
+    columns when accessed, so they are not all kept in memory. As for ``Choices``, the keys are
+    the choice attributes of the entries.
+
+    """
+
+    def __init__(self, storage, positions, attribute):
+        self._storage = storage
+        self._positions = positions
+        self._attribute = attribute
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, key):
+        return self._storage.entry_at(self._positions[key])
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __iter__(self):
+        entry_at = self._storage.entry_at
+        attribute = self._attribute
+        for position in self._positions.values():
+            yield getattr(entry_at(position), attribute)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class ColumnarChoices(Choices):
+    """A ``Choices`` storing its choices in columns, for catalogs with a lot of choices.
+
+    It can be used as a ``Choices`` instance, with these differences:
+
+    * ``ChoiceEntry`` objects are created when needed, and only the last ones are cached, so the
+      same entry may be returned as a different (but equal) object after a while.
+    * Iterating on it returns the raw ``(value, display name)`` tuples.
+    * ``entries`` is a read-only sequence, and ``constants``, ``values`` and ``displays`` are
+      read-only mappings, whatever the ``dict_class``. These views are cached until choices are
+      added, and get the entries from the columns when accessed.
+    * Adding it to a list returns a list of the ``(value, display name)`` tuples, as for a list.
+
+    Parameters
+    ----------
+    *choices : list of tuples
+        See ``Choices``.
+    **kwargs : dict
+        entries_cache_size : int or None
+            The maximum number of ``ChoiceEntry`` to keep in the cache, shared with subsets.
+            ``None`` to cache them all. Default to ``DEFAULT_ENTRIES_CACHE_SIZE``.
+
+        And all the named arguments accepted by ``Choices``.
+
+    Example
+    -------
+
+    >>> STATES = ColumnarChoices(
+    ...     ('ONLINE',  1, 'Online'),
+    ...     ('DRAFT',   2, 'Draft'),
+    ...     ('OFFLINE', 3, 'Offline'),
+    ...     entries_cache_size=100,
+    ... )
+    >>> STATES
+    [('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'), ('OFFLINE', 3, 'Offline')]
+    >>> STATES.DRAFT
+    2
+    >>> STATES.DRAFT.display
+    'Draft'
+    >>> STATES.for_display('Offline')
+    ('OFFLINE', 3, 'Offline')
+    >>> STATES.choices
+    ((1, 'Online'), (2, 'Draft'), (3, 'Offline'))
+    >>> STATES.add_subset('NOT_ONLINE', ('DRAFT', 'OFFLINE'))
+    >>> STATES.NOT_ONLINE.for_constant('DRAFT') is STATES.for_constant('DRAFT')
+    True
+
+    """
+
+    def __init__(self, *choices, **kwargs):
+
+        self.entries_cache_size = kwargs.pop('entries_cache_size', DEFAULT_ENTRIES_CACHE_SIZE)
+
+        # The columns holding the choices, shared with the subsets.
+        self._storage = _ChoicesColumns(self.ChoiceEntryClass, self.entries_cache_size,
+                                        kwargs.get('import_path', None))
+
+        # Positions, in the columns, of the choices of this instance.
+        self._columns = _ColumnarIndex(array(str('I')), {}, {}, {})
+
+        super(ColumnarChoices, self).__init__(*choices, **kwargs)
+
+    def _get_view(self, index_name, *args):
+        """Return the view of the entries in the given index of the columns, cached until update.
+
+        Parameters
+        ----------
+        index_name : string
+            The name of the index in ``_columns``: ``positions`` for the sequence of the entries,
+            else the name of a dict of positions, for the mapping of the entries by this key.
+        *args
+            The name of the attribute of the entries used as keys, for a mapping.
+
+        """
+
+        # Read the cache before the columns, as they are published in the other order.
+        cache = self._derived_cache
+        key = ('view', index_name)
+
+        view = cache.get(key)
+        if view is None:
+            view_class = _EntriesMapping if args else _EntriesSequence
+            view = cache.setdefault(key, view_class(self._storage,
+                                                    getattr(self._columns, index_name), *args))
+
+        return view
+
+    @property
+    def choices(self):
+        """Property that returns a tuple formatted as expected by Django. See ``Choices.choices``."""
+        return tuple(self)
+
+    @property
+    def entries(self):
+        """Property that returns a read-only sequence of ``ChoiceEntry``, one for each choice."""
+        return self._get_view('positions')
+
+    @property
+    def constants(self):
+        """Property that returns a read-only mapping of ``ChoiceEntry`` by constant."""
+        return self._get_view('constants', 'constant')
+
+    @property
+    def values(self):
+        """Property that returns a read-only mapping of ``ChoiceEntry`` by value."""
+        return self._get_view('values', 'value')
+
+    @property
+    def displays(self):
+        """Property that returns a read-only mapping of ``ChoiceEntry`` by display name."""
+        return self._get_view('displays', 'display')
+
+    def __getattr__(self, name):
+        """Return the value of a constant, constants not being set as attributes."""
+
+        try:
+            position = self.__dict__['_columns'].constants[name]
+        except KeyError:
+            raise AttributeError("'%s' object has no attribute '%s'" % (
+                self.__class__.__name__, name))
+
+        return self.__dict__['_storage'].entry_at(position).value
+
+    def _publish_entries(self, choice_entries):
+        """Add the given entries to the columns, then make them available in this instance."""
+
+        self._publish_positions([self._storage.append(entry) for entry in choice_entries])
+
+    def _publish_positions(self, positions):
+        """Make the choices at the given positions in the columns available in this instance.
+
+        Like in ``Choices._publish_entries``, a new index is created then published in one step.
+
+        """
+
+        columns = self._columns
+        new_columns = _ColumnarIndex(
+            array(str('I'), columns.positions),
+            dict(columns.constants),
+            dict(columns.values),
+            dict(columns.displays),
+        )
+        new_columns.positions.extend(positions)
+
+        for position in positions:
+            constant, value, display = self._storage.keys_at(position)
+            new_columns.constants[constant] = position
+            new_columns.values[value] = position
+            new_columns.displays[display] = position
+
+        self._columns = new_columns
+        self._derived_cache = {}
+
+    def extract_subset(self, *constants):
+        """Create a subset of entries, sharing the columns of this instance.
+
+        See ``Choices.extract_subset``.
+
+        """
+
+        columns = self._columns
+
+        bad_constants = set(c for c in constants if c not in columns.constants)
+        if bad_constants:
+            raise ValueError("All constants in subsets should be in parent choice. "
+                             "Missing constants: %s." % list(bad_constants))
+
+        subset = self.__class__(
+            dict_class=self.dict_class,
+            mutable=False,
+            entries_cache_size=self.entries_cache_size,
+        )
+        subset._storage = self._storage
+        subset._publish_positions([columns.constants[c] for c in constants])
+        subset.set_codes(dict((constant, code) for constant, code in self.codes.items()
+                              if constant in constants))
+        self._share_unknown_handling(subset)
+
+        return subset
+
+    def for_constant(self, constant):
+        """Returns the ``ChoiceEntry`` for the given constant. See ``Choices.for_constant``."""
+        return self._storage.entry_at(self._columns.constants[constant])
+
+    def for_value(self, value):
+        """Returns the ``ChoiceEntry`` for the given value. See ``Choices.for_value``."""
+        return self._storage.entry_at(self._columns.values[value])
+
+    def for_display(self, display):
+        """Returns the ``ChoiceEntry`` for the given display name. See ``Choices.for_display``."""
+        return self._storage.entry_at(self._columns.displays[display])
+
+    def get_for_constant(self, constant, default=None):
+        """Returns the entry for a constant, or a default. See ``Choices.get_for_constant``."""
+        try:
+            position = self._columns.constants.get(constant)
+        except TypeError:
+            position = None
+        if position is None:
+            return self._get_unknown('constant', constant, default)
+        return self._storage.entry_at(position)
+
+    def get_for_value(self, value, default=None):
+        """Returns the entry for a value, or a default. See ``Choices.get_for_value``."""
+        try:
+            position = self._columns.values.get(value)
+        except TypeError:
+            position = None
+        if position is None:
+            return self._get_unknown('value', value, default)
+        return self._storage.entry_at(position)
+
+    def get_for_display(self, display, default=None):
+        """Returns the entry for a display name, or a default. See ``Choices.get_for_display``."""
+        try:
+            position = self._columns.displays.get(display)
+        except TypeError:
+            position = None
+        if position is None:
+            return self._get_unknown('display', display, default)
+        return self._storage.entry_at(position)
+
+    def has_constant(self, constant):
+        """Check if the given constant exists. See ``Choices.has_constant``."""
+        return constant in self._columns.constants
+
+    def has_value(self, value):
+        """Check if the given value exists. See ``Choices.has_value``."""
+        return value in self._columns.values
+
+    def has_display(self, display):
+        """Check if the given display name exists. See ``Choices.has_display``."""
+        return display in self._columns.displays
+
+    def __len__(self):
+        """Return the number of choices."""
+        return len(self._columns.positions)
+
+    def __iter__(self):
+        """Iterate on the raw ``(value, display name)`` tuples, as expected by django."""
+        storage = self._storage
+        for position in self._columns.positions:
+            yield storage.choice_at(position)
+
+    def __reversed__(self):
+        """Iterate on the raw ``(value, display name)`` tuples, from the last one."""
+        storage = self._storage
+        for position in reversed(self._columns.positions):
+            yield storage.choice_at(position)
+
+    def __getitem__(self, key):
+        """Return the ``(value, display name)`` tuple for an int, else the attribute ``key``.
+
+        See ``Choices.__getitem__``.
+
+        """
+
+        if isinstance(key, int):
+            return self._storage.choice_at(self._columns.positions[key])
+
+        return super(ColumnarChoices, self).__getitem__(key)
+
+    def __eq__(self, other):
+        """Compare with a list or tuple of choices. See ``Choices.__eq__``."""
+
+        if not isinstance(other, (list, tuple)):
+            return False
+
+        other = list(other)
+        if other and len(other[0]) == 3:
+            return self.entries == other
+
+        return list(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __add__(self, other):
+        """Return the list of the ``(value, display name)`` tuples, followed by ``other``.
+
+        The choices are not in the list itself, so the one of ``list`` would only return
+        ``other``.
+
+        """
+
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        """Return ``other`` followed by the list of the ``(value, display name)`` tuples."""
+
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(other) + list(self)
+
+    def _add_memory_usage(self, usage, sizeof, deep):
+        """Add, in the ``usage`` dict, the memory used by the columns, indexes and cached entries.
+
+        The memory used by the columns, shared with the subsets, is counted in a ``columns``
+        entry. Only the entries currently in the cache are counted.
+
+        """
+
+        columns = self._columns
+        usage['indexes'] += sizeof(self, vars(self), self._index, columns, columns.positions,
+                                   columns.constants, columns.values, columns.displays)
+
+        storage = self._storage
+        # pylint: disable=protected-access
+        usage['columns'] = usage.get('columns', 0) + sizeof(
+            storage, vars(storage), storage.pool, storage._pool_ids, storage.constants,
+            storage.values, storage.displays, storage.attributes, storage.entries)
+        if deep:
+            usage['columns'] += sum(sizeof(obj) for obj in storage.pool)
+
+        for attributes in storage.attributes.values():
+            usage['extra_attributes'] += sizeof(attributes)
+            if deep:
+                for key, value in attributes.items():
+                    usage['extra_attributes'] += sizeof(key, value)
+
+        self._add_entries_memory_usage(usage, list(storage.entries.values()), sizeof, deep)
+
+    def __reduce__(self):
+        """Reducer to pickle the instance, keeping the size of the cache.
+
+        See ``Choices.__reduce__``.
+
+        """
+
+        reduced = super(ColumnarChoices, self).__reduce__()
+        if reduced[0] is create_choice:
+            reduced[1][3]['entries_cache_size'] = self.entries_cache_size
+
+        return reduced
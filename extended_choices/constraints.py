@@ -0,0 +1,250 @@
+"""Provides database constraints and indexes built from ``Choices`` instances.
+
+* ``check_constraint``, a ``CheckConstraint`` allowing only the values of a ``Choices``, enforced
+  by the database even for ``bulk_create`` and ``update``, that skip the validation in python.
+* ``subset_index`` and ``subset_indexes``, partial indexes on the rows having a value of a
+  subset, for the queries filtering on it.
+
+The values are sorted and the names are derived from the model (its name for constraints, a
+given prefix for indexes), field and subset names, so they are unique in the database and the
+migrations don't change as long as the values don't. They need Django 2.2 or later.
+
+Example
+-------
+
+.. code-block:: python
+
+    class Content(models.Model):
+        state = models.PositiveSmallIntegerField(choices=STATES)
+
+        class Meta:
+            constraints = [check_constraint(STATES, 'state')]
+            indexes = subset_indexes(STATES, 'state', prefix='content')
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+
+import django
+from django.db.models import Index, Q
+
+try:
+    from django.db.models import CheckConstraint
+except ImportError:
+    CheckConstraint = None
+
+__all__ = [
+    'check_constraint',
+    'subset_index',
+    'subset_indexes',
+]
+
+# Maximum length of the name of an index, as checked by Django.
+MAX_INDEX_NAME_LENGTH = 30
+
+
+def _check_django_version():
+    """Raise an ``ImportError`` if Django doesn't support check constraints and partial indexes."""
+    if CheckConstraint is None:
+        raise ImportError("Django 2.2 or later is needed to use constraints and partial indexes.")
+
+
+def get_sorted_values(choices):
+    """Return the values of a ``Choices`` instance, sorted if they can be.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance (or subset).
+
+    Returns
+    -------
+    list
+        The values, sorted, or in the order of the entries if they cannot be compared.
+
+    Example
+    -------
+
+    >>> from extended_choices import Choices
+    >>> get_sorted_values(Choices(('TWO', 2, 'Two'), ('ONE', 1, 'One')))
+    [1, 2]
+
+    """
+
+    values = [entry.value.original_value for entry in choices.entries]
+    try:
+        return sorted(values)
+    except TypeError:
+        return values
+
+
+def get_index_name(prefix, field_name, subset_name):
+    """Return the name of the partial index of a subset, shortened with a hash if too long.
+
+    Parameters
+    ----------
+    prefix : string
+        The prefix of the name, unique to the model, like the name of its table, as the names of
+        indexes must be unique in a database.
+    field_name : string
+        The name of the field.
+    subset_name : string
+        The name of the subset.
+
+    Returns
+    -------
+    string
+        ``prefix_field_subset``, in lower case, or its beginning followed by a hash of it if it's
+        longer than 30 characters.
+
+    Example
+    -------
+
+    >>> get_index_name('content', 'state', 'NOT_ONLINE')
+    'content_state_not_online'
+    >>> get_index_name('content', 'publication_state', 'NOT_ONLINE')
+    'content_publication_s_20b1d166'
+
+    """
+
+    name = ('%s_%s_%s' % (prefix, field_name, subset_name)).lower()
+    if len(name) > MAX_INDEX_NAME_LENGTH:
+        digest = hashlib.md5(name.encode('utf-8')).hexdigest()[:8]
+        name = '%s_%s' % (name[:MAX_INDEX_NAME_LENGTH - len(digest) - 1], digest)
+    return name
+
+
+def check_constraint(choices, field_name, name=None):
+    """Return a ``CheckConstraint`` allowing only the values of ``choices`` in the field.
+
+    ``NULL`` is allowed by the constraint, the ``null`` argument of the field deciding if it is
+    allowed in the column.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance (or subset) having the allowed values.
+    field_name : string
+        The name of the field.
+    name : string, optional
+        The name of the constraint. By default ``%(app_label)s_%(class)s_FIELD_choices``, that
+        Django 3.0 or later completes with the application and model names. With older versions,
+        it must be given.
+
+    Returns
+    -------
+    CheckConstraint
+        The constraint, to add to ``Meta.constraints``.
+
+    Raises
+    ------
+    ImportError
+        With Django older than 2.2.
+    ValueError
+        If ``name`` is not given with Django older than 3.0.
+
+    """
+
+    _check_django_version()
+
+    if name is None:
+        if django.VERSION < (3, 0):
+            raise ValueError("The name of the constraint must be given with Django < 3.0.")
+        name = '%%(app_label)s_%%(class)s_%s_choices' % field_name
+
+    return CheckConstraint(check=Q(**{'%s__in' % field_name: get_sorted_values(choices)}),
+                           name=name)
+
+
+def subset_index(choices, field_name, subset_name, fields=None, name=None, prefix=None):
+    """Return a partial index on the rows having a value of a subset of ``choices``.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance having the subset.
+    field_name : string
+        The name of the field.
+    subset_name : string
+        The name of the subset.
+    fields : list, optional
+        The fields to index, ``[field_name]`` by default.
+    name : string, optional
+        The name of the index. By default computed by ``get_index_name`` with ``prefix``.
+    prefix : string, optional
+        The prefix of the default name, unique to the model, like the name of its table. Django
+        cannot add the model name itself, as the names of indexes are limited to 30 characters.
+        Needed if ``name`` is not given.
+
+    Returns
+    -------
+    Index
+        The index, to add to ``Meta.indexes``.
+
+    Raises
+    ------
+    ImportError
+        With Django older than 2.2.
+    ValueError
+        If ``subset_name`` is not a subset of ``choices``, or if neither ``name`` nor ``prefix``
+        is given.
+
+    """
+
+    _check_django_version()
+
+    if subset_name not in choices.subsets:
+        raise ValueError("'%s' is not a subset of this ``Choices`` instance." % subset_name)
+
+    if name is None:
+        if not prefix:
+            raise ValueError("The ``name`` or ``prefix`` of the index must be given, as the "
+                             "names of indexes must be unique in the database.")
+        name = get_index_name(prefix, field_name, subset_name)
+
+    return Index(
+        fields=list(fields or [field_name]),
+        name=name,
+        condition=Q(**{'%s__in' % field_name: get_sorted_values(getattr(choices, subset_name))}),
+    )
+
+
+def subset_indexes(choices, field_name, subset_names=None, prefix=None, names=None):
+    """Return a partial index for each subset of ``choices``.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance having the subsets.
+    field_name : string
+        The name of the field.
+    subset_names : list, optional
+        The names of the subsets to index. All of them by default, in the order they were added.
+    prefix : string, optional
+        The prefix of the names of the indexes, unique to the model. See ``subset_index``.
+    names : dict, optional
+        The names of the indexes, by subset name. The other ones are computed with ``prefix``.
+
+    Returns
+    -------
+    list
+        The indexes, created by ``subset_index``, to add to ``Meta.indexes``.
+
+    """
+
+    if subset_names is None:
+        subset_names = choices.subsets
+    names = names or {}
+
+    return [subset_index(choices, field_name, subset_name, name=names.get(subset_name),
+                         prefix=prefix)
+            for subset_name in subset_names]
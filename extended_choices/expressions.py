@@ -0,0 +1,332 @@
+"""Provides Django expressions to use the display names and order of ``Choices`` in the database.
+
+``display_expression`` and ``order_expression`` compile a ``Choices`` instance into an
+expression, to use in ``annotate`` or ``order_by``, so paginating or exporting rows sorted by
+display name doesn't need to load all the rows in python. It is not faster: the database
+evaluates the ``CASE`` for each row, and sorting the rows of a page in python is cheaper.
+
+Values are mapped with a single ``ValuesMap`` expression, a ``CASE field WHEN value THEN result
+... END`` with integers written inline, compiled only once, instead of one ``When`` expression
+per choice. Many integer values are split in chunks of ``CASE_CHUNK_SIZE`` consecutive values,
+each with its own ``CASE``. When ordering, consecutive integer values with consecutive ranks are
+grouped in a single ``BETWEEN`` condition, so the ranks need no params. The display names are
+params, one per choice, so a query using ``display_expression`` is subject to the limit of params
+of the database, if any (999 for SQLite before 3.32).
+
+The expressions are cached in the ``Choices`` instance, per language if some display names are
+lazy, until new choices are added.
+
+Example
+-------
+
+.. code-block:: python
+
+    Content.objects.annotate(state_display=STATES.display_expression('state'))
+    Content.objects.order_by(STATES.order_expression('state', by='display'))
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import unicode_literals
+
+from operator import itemgetter
+
+import six
+
+from django.db.models import CharField, Expression, F, IntegerField
+from django.utils import translation
+from django.utils.functional import Promise
+
+if six.PY3:
+    from django.utils.encoding import force_str as force_text
+else:
+    from django.utils.encoding import force_text
+
+__all__ = [
+    'ValuesMap',
+    'display_expression',
+    'order_expression',
+]
+
+ORDER_BY_DISPLAY = 'display'
+ORDER_BY_DECLARATION = 'declaration'
+
+# Maximum number of ``WHEN`` branches of a ``CASE`` mapping integer values: above, the values
+# are split in chunks of consecutive values, so the database checks a few bounds, then the values
+# of a single chunk, instead of all the values.
+CASE_CHUNK_SIZE = 64
+
+
+def _is_int(value):
+    """Tell if the value is an integer, but not a boolean."""
+    return isinstance(value, six.integer_types) and not isinstance(value, bool)
+
+
+def _get_sql_and_params(value):
+    """Return the SQL of a value, with integers inline and a placeholder for the others."""
+
+    if _is_int(value):
+        return '%d' % value, []
+    if value is None:
+        return 'NULL', []
+    return '%s', [value]
+
+
+class ValuesMap(Expression):
+    """Expression mapping the values of a field to other values, using a single ``CASE``.
+
+    The SQL is ``CASE field WHEN value THEN result ... ELSE default END``, preceded, if ranges are
+    given, by ``CASE WHEN field BETWEEN first AND last THEN field + offset ... ELSE``. Above
+    ``CASE_CHUNK_SIZE`` integer values, it is instead ``CASE WHEN field BETWEEN first AND last
+    THEN CASE field WHEN value THEN result ... END ... END``, with one ``CASE`` per chunk of
+    consecutive values. It is built once, integers being written inline, so it is cheap to
+    compile. Other values and results are passed as params.
+
+    Parameters
+    ----------
+    field_name : string
+        The name of the field, or a path to it, like ``author__state``.
+    mapping : list of tuples
+        The ``(value, result)`` pairs.
+    default : ?
+        The result for the other values.
+    output_field : Field
+        The type of the results.
+    ranges : list of tuples, optional
+        The ``(first, last, offset)`` integer tuples: the values between ``first`` and ``last``
+        (included) give the value plus ``offset``.
+
+    """
+
+    def __init__(self, field_name, mapping, default, output_field, ranges=()):
+        super(ValuesMap, self).__init__(output_field=output_field)
+        self.source = F(field_name)
+        self.mapping = tuple(mapping)
+        self.default = default
+        self.ranges = tuple(ranges)
+
+        # Build the SQL once, the instances created when used in a query share it. It's split
+        # where the SQL of the field goes (marked with ``None``).
+        tokens = []
+        for first, last, offset in self.ranges:
+            tokens += [' WHEN ', None, ' BETWEEN %d AND %d THEN ' % (first, last), None,
+                       ' + %d' % offset]
+
+        default_sql, self.default_params = _get_sql_and_params(default)
+
+        # Many integer values are split in chunks of consecutive values, each with its own
+        # ``CASE``, so the database checks the bounds of each chunk, then the values of one.
+        mapping = self.mapping
+        if len(mapping) > CASE_CHUNK_SIZE and all(_is_int(value) for value, __ in mapping):
+            mapping = sorted(mapping, key=itemgetter(0))
+            chunks = [mapping[start:start + CASE_CHUNK_SIZE]
+                      for start in range(0, len(mapping), CASE_CHUNK_SIZE)]
+        else:
+            chunks = [mapping] if mapping else []
+
+        self.mapping_params = []
+        mapping_tokens = [default_sql]
+        for chunk in chunks:
+            whens = []
+            for value, result in chunk:
+                value_sql, value_params = _get_sql_and_params(value)
+                result_sql, result_params = _get_sql_and_params(result)
+                whens.append('WHEN %s THEN %s' % (value_sql, result_sql))
+                self.mapping_params.extend(value_params + result_params)
+            case_tokens = ['CASE ', None, ' %s ELSE %s END' % (' '.join(whens), default_sql)]
+            if len(chunks) == 1:
+                mapping_tokens = case_tokens
+            else:
+                tokens += [' WHEN ', None, ' BETWEEN %d AND %d THEN ' % (chunk[0][0], chunk[-1][0])]
+                tokens += case_tokens
+                self.mapping_params.extend(self.default_params)
+
+        if tokens:
+            tokens = ['CASE'] + tokens + [' ELSE '] + mapping_tokens + [' END']
+        else:
+            tokens = mapping_tokens
+
+        self.sql_parts = ['']
+        for token in tokens:
+            if token is None:
+                self.sql_parts.append('')
+            else:
+                self.sql_parts[-1] += token
+
+    def __repr__(self):
+        return '<%s: %s, %d values, %d ranges>' % (
+            self.__class__.__name__, self.source, len(self.mapping), len(self.ranges))
+
+    def get_source_expressions(self):
+        return [self.source]
+
+    def set_source_expressions(self, exprs):
+        self.source, = exprs
+
+    def as_sql(self, compiler, connection):
+        """Return the SQL of the ``CASE``, and its params."""
+
+        source_sql, source_params = compiler.compile(self.source)
+        params = list(source_params) * (len(self.sql_parts) - 1)
+        return source_sql.join(self.sql_parts), params + self.mapping_params + self.default_params
+
+
+def _get_cached(choices, key, build, *args):
+    """Return the expression cached in ``choices`` for ``key``, building it if needed.
+
+    If some display names are lazy, the key includes the current language.
+
+    """
+
+    cache = choices._derived_cache  # pylint: disable=protected-access
+
+    has_lazy_displays = cache.get('has_lazy_displays')
+    if has_lazy_displays is None:
+        has_lazy_displays = cache.setdefault('has_lazy_displays', any(
+            isinstance(entry.display.original_value, Promise) for entry in choices.entries
+        ))
+
+    if has_lazy_displays:
+        key += (translation.get_language(), )
+
+    expression = cache.get(key)
+    if expression is None:
+        expression = cache.setdefault(key, build(choices, *args))
+
+    return expression
+
+
+def compact_ranks(ranks):
+    """Group the ``(value, rank)`` pairs where both values and ranks are consecutive integers.
+
+    Parameters
+    ----------
+    ranks : list of tuples
+        The ``(value, rank)`` pairs, sorted by value.
+
+    Returns
+    -------
+    list of tuples
+        The ``(first value, last value, first rank)`` tuples of each group.
+
+    Example
+    -------
+
+    >>> compact_ranks([(1, 0), (2, 1), (3, 2), (5, 3), (6, 5), (7, 6)])
+    [(1, 3, 0), (5, 5, 3), (6, 7, 5)]
+
+    """
+
+    groups = []
+
+    for value, rank in ranks:
+        if groups:
+            first_value, last_value, first_rank = groups[-1]
+            if value == last_value + 1 and rank == first_rank + value - first_value:
+                groups[-1] = (first_value, value, first_rank)
+                continue
+        groups.append((value, value, rank))
+
+    return groups
+
+
+def _build_display_expression(choices, field_name):
+    """Build the expression returning the display name of the value of the field."""
+
+    return ValuesMap(
+        field_name,
+        [(entry.value.original_value, force_text(entry.display)) for entry in choices.entries],
+        None,
+        CharField(),
+    )
+
+
+def _build_order_expression(choices, field_name, by):
+    """Build the expression returning the rank of the value of the field."""
+
+    entries = choices.entries
+
+    if by == ORDER_BY_DISPLAY:
+        ordered = sorted(range(len(entries)), key=lambda index: force_text(entries[index].display))
+    else:
+        ordered = range(len(entries))
+
+    ranks = [(entries[index].value.original_value, rank) for rank, index in enumerate(ordered)]
+
+    if not ranks or not all(_is_int(value) for value, __ in ranks):
+        # Unknown values come last.
+        return ValuesMap(field_name, ranks, len(ranks), IntegerField())
+
+    # Use ranges when values and ranks are both consecutive, for a compact SQL, and map the
+    # remaining values.
+    ranges, mapping = [], []
+    for first_value, last_value, first_rank in compact_ranks(sorted(ranks)):
+        if first_value == last_value:
+            mapping.append((first_value, first_rank))
+        else:
+            ranges.append((first_value, last_value, first_rank - first_value))
+
+    return ValuesMap(field_name, mapping, len(ranks), IntegerField(), ranges)
+
+
+def display_expression(choices, field_name):
+    """Return an expression giving the display name of the value of a field, in the database.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` used by the field.
+    field_name : string
+        The name of the field, or a path to it, like ``author__state``.
+
+    Returns
+    -------
+    ValuesMap
+        The expression. Values that are not in ``choices`` give ``NULL``. Lazy display names are
+        evaluated in the current language. They are passed as params, plus the values that are
+        not integers: on a database limiting the params of a query, like SQLite before 3.32
+        (999), use a subset of the choices, or get the display names in python.
+
+    """
+
+    return _get_cached(choices, ('display_expression', field_name),
+                       _build_display_expression, field_name)
+
+
+def order_expression(choices, field_name, by=ORDER_BY_DISPLAY):
+    """Return an expression giving the rank of the value of a field, to order by it.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` used by the field.
+    field_name : string
+        The name of the field, or a path to it, like ``author__state``.
+    by : string, optional
+        ``display`` (the default) to order by display name (in the current language for lazy
+        ones), or ``declaration`` to order in the order of the entries in ``choices``.
+
+    Returns
+    -------
+    Expression
+        The expression. Values that are not in ``choices`` come last. When the values are
+        integers, the values having consecutive ranks are grouped in a single range condition.
+
+    Raises
+    ------
+    ValueError
+        If ``by`` is not ``display`` or ``declaration``.
+
+    """
+
+    if by not in (ORDER_BY_DISPLAY, ORDER_BY_DECLARATION):
+        raise ValueError("``by`` must be '%s' or '%s'." % (ORDER_BY_DISPLAY, ORDER_BY_DECLARATION))
+
+    return _get_cached(choices, ('order_expression', field_name, by),
+                       _build_order_expression, field_name, by)
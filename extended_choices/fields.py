@@ -1,4 +1,19 @@
-"""Provides a form field for django to use constants instead of values as available values.
+"""Provides fields for django to use with ``Choices``.
+
+* ``NamedExtendedChoiceFormField``, a form field using constants instead of values as available
+  values.
+* ``ExtendedChoiceFieldMixin``, and the ``ExtendedChoiceIntegerField``,
+  ``ExtendedChoiceSmallIntegerField``, ``ExtendedChoicePositiveSmallIntegerField``,
+  ``ExtendedChoiceBigIntegerField`` and ``ExtendedChoiceCharField`` model fields using it, to
+  validate values in constant time, get their display names with a single lookup, and load them
+  from the database as the choice attributes of the ``Choices``, when the choices are a
+  ``Choices`` instance. The ``in_subset`` and ``const`` lookups are registered on these fields.
+* ``ExtendedChoiceEncodedField``, using the mixin, storing the integer codes of the values in the
+  database, set with ``Choices.set_codes``.
+* ``ChoicesBitmaskField``, storing a ``ChoiceSet`` of entries of a ``Choices`` instance in a
+  single integer column, one bit per entry, with the ``has_any`` and ``has_all`` lookups.
+* ``get_model_field``, returning the smallest of these fields able to store the values of a
+  ``Choices`` instance.
 
 Notes
 -----
@@ -14,8 +29,21 @@ from __future__ import unicode_literals
 import six
 
 from django import forms
+from django.core import exceptions
+from django.db import models
+from django.utils import translation
+from django.utils.functional import Promise, cached_property
+
+if six.PY3:
+    from django.utils.encoding import force_str as force_text
+else:
+    from django.utils.encoding import force_text
 
 from . import Choices
+from .choicesets import ChoiceSet, get_bit_tables
+from .helpers import ChoiceAttributeMixin, ChoiceEntry
+from .lookups import HasAll, HasAny, register_lookups
+from .references import ChoicesReference, register_serializer
 
 
 class NamedExtendedChoiceFormField(forms.Field):
@@ -59,3 +87,693 @@ class NamedExtendedChoiceFormField(forms.Field):
             )
 
         return final
+
+
+def get_loaded_value(attribute):
+    """Return the value to load from the database for a value choice attribute.
+
+    Parameters
+    ----------
+    attribute : ChoiceAttributeMixin
+        The ``value`` attribute of an entry.
+
+    Returns
+    -------
+    ?
+        The attribute itself if its entry is pickled by reference, i.e. its ``Choices`` has an
+        ``import_path``, else its original value.
+
+    Example
+    -------
+
+    >>> STATES = Choices(('ONLINE', 1, 'Online'))
+    >>> type(get_loaded_value(STATES.ONLINE)) is int
+    True
+
+    """
+
+    if getattr(attribute.choice_entry, '_import_path', None):
+        return attribute
+    return attribute.original_value
+
+
+class ExtendedChoiceFieldMixin(object):
+    """Mixin for model fields, to validate the value in constant time if choices are ``Choices``.
+
+    Django validates a value by iterating on all the choices of the field, so a ``full_clean``
+    costs a lot with big catalogs. With this mixin, if the choices are a ``Choices`` instance (or
+    a subset of one, to only allow some values), the value is looked up with ``has_value``.
+
+    The error messages and codes are the ones of Django. If the choices are not a ``Choices``
+    instance, like in migrations, the validation of Django is used.
+
+    The ``get_FOO_display`` method added to the model by Django builds a dict of all the choices
+    on each call. The mixin replaces it with one getting the display name from the ``Choices``,
+    with a cache, per language for lazy display names.
+
+    Loading values as entries is opt-in: by default, the plain values are loaded from the
+    database, as a choice attribute would be pickled with its whole entry, making cached instances
+    bigger, and would not be the same object once unpickled. Give an ``import_path`` to the
+    ``Choices`` to opt in: values loaded from the database are then the ``value`` attributes of
+    its entries, pickled by reference, so ``constant`` and ``display`` are available without
+    creating any object. In both cases, values are saved as their original value.
+
+    Example
+    -------
+
+    >>> from django.db.models import IntegerField
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'))
+    >>> class StateField(ExtendedChoiceFieldMixin, IntegerField):
+    ...     pass
+    >>> StateField(choices=STATES).validate(1, None)
+    >>> try:
+    ...     StateField(choices=STATES).validate(3, None)
+    ... except exceptions.ValidationError as exc:
+    ...     print(exc.code)
+    invalid_choice
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        # Fields are cloned from their deconstruction, where choices may be a reference.
+        if isinstance(kwargs.get('choices'), ChoicesReference):
+            kwargs['choices'] = kwargs['choices'].choices
+
+        super(ExtendedChoiceFieldMixin, self).__init__(*args, **kwargs)
+
+        # The display names already computed, by value, and by language then value for the lazy
+        # ones.
+        self._display_cache = {}
+        self._lazy_display_cache = {}
+
+        # The value choice attributes returned by ``from_db_value``, by database value.
+        self._db_values = {}
+
+    def deconstruct(self):
+        """Deconstruct the field, with a reference to the choices if they have an import path.
+
+        Django deconstructs the choices as the list of their ``(value, display)`` pairs, written
+        in full in migrations. A ``Choices`` instance having an ``import_path`` is deconstructed
+        as a ``ChoicesReference``, written as this import path, and compared by fingerprint.
+
+        """
+
+        name, path, args, kwargs = super(ExtendedChoiceFieldMixin, self).deconstruct()
+
+        if SERIALIZER_REGISTERED and isinstance(self.choices, Choices) and self.choices.import_path:
+            kwargs['choices'] = ChoicesReference(self.choices)
+
+        return name, path, args, kwargs
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        """Add the field to the model, with a ``get_FOO_display`` method using the ``Choices``.
+
+        As for Django, a ``get_FOO_display`` method defined on the model class is not replaced.
+
+        """
+
+        method_name = str('get_%s_display' % name)
+        has_own_method = method_name in cls.__dict__
+
+        super(ExtendedChoiceFieldMixin, self).contribute_to_class(cls, name, *args, **kwargs)
+
+        if has_own_method or not isinstance(self.choices, Choices):
+            return
+
+        field = self
+
+        def get_display(instance):
+            """Return the display name of the value of the field."""
+            return field.get_choice_display(getattr(instance, field.attname))
+
+        get_display.__name__ = method_name
+        setattr(cls, method_name, get_display)
+
+    def from_db_value(self, value, *args):
+        """Return the database value, or the ``value`` attribute of its entry if opted in.
+
+        The ``value`` attribute of the entry is only returned if the ``Choices`` has an
+        ``import_path``, the opt-in (see ``ExtendedChoiceFieldMixin``).
+
+        Parameters
+        ----------
+        value : ?
+            The value loaded from the database.
+        *args
+            The expression and the connection (and the context for Django < 2.0), not used.
+
+        Returns
+        -------
+        ?
+            The value itself by default, or, if the ``Choices`` has an ``import_path``, the value
+            choice attribute already existing in the ``Choices``, or the value itself if it's not
+            in the ``Choices``.
+
+        """
+
+        # Called for each row, so known values are looked up in a single dict.
+        try:
+            return self._db_values[value]
+        except KeyError:
+            pass
+
+        if value is None or not isinstance(self.choices, Choices):
+            return value
+
+        try:
+            attribute = get_loaded_value(self.choices.for_value(value).value)
+        except KeyError:
+            # Unknown values are not cached to keep the cache bounded.
+            return value
+
+        self._db_values[value] = attribute
+        return attribute
+
+    def get_prep_value(self, value):
+        """Return the original value of choice attributes, to save plain values to the database."""
+
+        if isinstance(value, ChoiceAttributeMixin):
+            value = value.original_value
+
+        return super(ExtendedChoiceFieldMixin, self).get_prep_value(value)
+
+    def get_choice_display(self, value):
+        """Return the display name of a value, like ``get_FOO_display``.
+
+        Parameters
+        ----------
+        value : ?
+            The value for which we want the display name.
+
+        Returns
+        -------
+        ?
+            The display name, as a string, of the given value, or the value itself if it's not in
+            the ``Choices`` of the field.
+
+        """
+
+        try:
+            return self._display_cache[value]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable values cannot be in the choices.
+            return force_text(value, strings_only=True)
+
+        try:
+            entry = self.choices.for_value(value)
+        except KeyError:
+            # Unknown values are not cached to keep the cache bounded.
+            return force_text(value, strings_only=True)
+
+        if not isinstance(entry.display.original_value, Promise):
+            display = self._display_cache[value] = force_text(entry.display, strings_only=True)
+            return display
+
+        # Lazy display names are cached per language. Getting the language has a cost, so it's
+        # only done for them.
+        language = translation.get_language()
+        cache = self._lazy_display_cache.get(language)
+        if cache is None:
+            cache = self._lazy_display_cache.setdefault(language, {})
+
+        try:
+            return cache[value]
+        except KeyError:
+            # ``force_text`` to evaluate the lazy display name in the current language.
+            display = cache[value] = force_text(entry.display, strings_only=True)
+            return display
+
+    def validate(self, value, model_instance):
+        """Validate the value like ``Field.validate``, checking the choices in constant time."""
+
+        if not isinstance(self.choices, Choices):
+            return super(ExtendedChoiceFieldMixin, self).validate(value, model_instance)
+
+        if not self.editable:
+            # Skip validation for non-editable fields.
+            return
+
+        if value not in self.empty_values and not self.has_choice_value(value):
+            raise exceptions.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+
+        if value is None and not self.null:
+            raise exceptions.ValidationError(self.error_messages['null'], code='null')
+
+        if not self.blank and value in self.empty_values:
+            raise exceptions.ValidationError(self.error_messages['blank'], code='blank')
+
+    def has_choice_value(self, value):
+        """Tell if the value is one of the values of the ``Choices`` of the field."""
+
+        try:
+            return self.choices.has_value(value)
+        except TypeError:
+            # Unhashable values cannot be in the choices.
+            return False
+
+
+class ExtendedChoiceIntegerField(ExtendedChoiceFieldMixin, models.IntegerField):
+    """An ``IntegerField`` validating its value in its ``Choices`` in constant time."""
+
+
+class ExtendedChoiceSmallIntegerField(ExtendedChoiceFieldMixin, models.SmallIntegerField):
+    """A ``SmallIntegerField`` validating its value in its ``Choices`` in constant time."""
+
+
+class ExtendedChoicePositiveSmallIntegerField(ExtendedChoiceFieldMixin,
+                                              models.PositiveSmallIntegerField):
+    """A ``PositiveSmallIntegerField`` validating its value in its ``Choices`` in constant time."""
+
+
+class ExtendedChoiceBigIntegerField(ExtendedChoiceFieldMixin, models.BigIntegerField):
+    """A ``BigIntegerField`` validating its value in its ``Choices`` in constant time."""
+
+
+class ExtendedChoiceCharField(ExtendedChoiceFieldMixin, models.CharField):
+    """A ``CharField`` validating its value in its ``Choices`` in constant time."""
+
+
+def get_codec(choices):
+    """Return the tables to convert the values of a ``Choices`` instance to their codes, and back.
+
+    They are computed from the codes set with ``Choices.set_codes``, and cached in ``choices``
+    until codes or choices are added.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance.
+
+    Returns
+    -------
+    tuple
+        A dict of the codes by value, and a list of the value choice attributes by code, with
+        ``None`` for the unused codes.
+
+    Example
+    -------
+
+    >>> STATES = Choices(('ONLINE', 'online', 'Online'), ('DRAFT', 'draft', 'Draft'),
+    ...                  codes={'ONLINE': 1, 'DRAFT': 3})
+    >>> get_codec(STATES)
+    ({'online': 1, 'draft': 3}, [None, 'online', None, 'draft'])
+
+    """
+
+    # Read the cache before the codes, as ``set_codes`` publishes them in the other order.
+    cache = choices._derived_cache  # pylint: disable=protected-access
+
+    codec = cache.get('codec')
+    if codec is None:
+        codes = choices.codes
+        codes_by_value = {}
+        values_by_code = [None] * (max(codes.values()) + 1 if codes else 0)
+        for entry in choices.entries:
+            code = codes.get(entry.constant.original_value)
+            if code is not None:
+                codes_by_value[entry.value.original_value] = code
+                values_by_code[code] = entry.value
+        codec = cache.setdefault('codec', (codes_by_value, values_by_code))
+
+    return codec
+
+
+class ExtendedChoiceEncodedField(ExtendedChoiceFieldMixin, models.PositiveSmallIntegerField):
+    """A field storing the integer codes of the values of its ``Choices``, in a small integer.
+
+    Values, often strings like the ones of ``AutoChoices``, are used as for the other fields, but
+    the database stores their codes, set with ``Choices.set_codes``, taking less space in the
+    table and its indexes. Values are converted with the tables returned by ``get_codec``.
+
+    Values without code cannot be saved (or used in a filter), and unknown codes are loaded as
+    is. Expressions like ``display_expression`` don't decode the column, so cannot be used with
+    this field.
+
+    Example
+    -------
+
+    >>> from extended_choices import AutoChoices
+    >>> STATES = AutoChoices(('ONLINE', ), ('DRAFT', ), codes={'ONLINE': 1, 'DRAFT': 2})
+    >>> field = ExtendedChoiceEncodedField(choices=STATES)
+    >>> field.get_prep_value('draft')
+    2
+    >>> field.from_db_value(1, None, None)
+    'online'
+
+    """
+
+    # Tell the ``in_subset`` lookup to filter on the codes.
+    stores_codes = True
+
+    @cached_property
+    def validators(self):
+        """Only the given validators: the ones of ``PositiveSmallIntegerField`` are for codes."""
+        return list(self._validators)
+
+    def to_python(self, value):
+        """Return the value as is, as values are not integers, only their codes."""
+        return value
+
+    def encode(self, value):
+        """Return the code of a value, or raise ``ValueError`` if it has none."""
+
+        if not isinstance(self.choices, Choices):
+            raise ValueError("The choices of the field must be a ``Choices`` instance with codes.")
+
+        try:
+            return get_codec(self.choices)[0][value]
+        except (KeyError, TypeError):
+            raise ValueError("The value %r has no code in the choices of the field." % (value, ))
+
+    def get_prep_value(self, value):
+        """Return the code of the value, to save it in the database."""
+
+        if isinstance(value, ChoiceAttributeMixin):
+            value = value.original_value
+
+        if value is not None:
+            value = self.encode(value)
+
+        return super(ExtendedChoiceEncodedField, self).get_prep_value(value)
+
+    def from_db_value(self, value, *args):
+        """Return the value of the entry having the code loaded from the database.
+
+        As for the other fields, it's the ``value`` attribute only if the ``Choices`` has an
+        ``import_path``. Unknown codes are returned as is.
+
+        """
+
+        if value is None or not isinstance(self.choices, Choices):
+            return value
+
+        values_by_code = get_codec(self.choices)[1]
+        if 0 <= value < len(values_by_code):
+            decoded = values_by_code[value]
+            if decoded is not None:
+                return get_loaded_value(decoded)
+
+        return value
+
+
+# Number of bits usable in a ``BigIntegerField``, the sign bit being left unused.
+MAX_BITMASK_ENTRIES = 63
+
+
+class ChoicesBitmaskFormField(forms.TypedMultipleChoiceField):
+    """Form field of ``ChoicesBitmaskField``, to select some of the values of its ``Choices``."""
+
+    def prepare_value(self, value):
+        """Return the values of the entries of the set, to select them in the widget."""
+
+        if value is None:
+            return value
+
+        return [item.value.original_value if isinstance(item, ChoiceEntry) else item
+                for item in value]
+
+
+class ChoicesBitmaskField(models.BigIntegerField):
+    """A field storing a set of entries of a ``Choices`` instance as a bitmask, in an integer.
+
+    Instead of a many-to-many table or a string of comma-separated values, the set is stored in
+    a single integer column, the entry at position ``n`` in the ``Choices`` having the bit
+    ``1 << n``. As the position defines the bit, entries can be added at the end of the
+    ``Choices``, but never removed or reordered. A ``Choices`` instance can have at most 63
+    entries to be used by this field.
+
+    Sets are loaded from the database as ``ChoiceSet`` instances, and can be saved from a
+    ``ChoiceSet``, any iterable of entries, values or constants (like a subset), or a bitmask.
+    Conversions use the tables returned by ``get_bit_tables``. Bits without entry are ignored
+    when loading. An empty set (a bitmask of ``0``) is blank: it's refused by ``full_clean``
+    unless ``blank=True``.
+
+    The ``has_any`` and ``has_all`` lookups filter the rows having any, or all, of the entries
+    of an iterable, or of a subset given by its name, using a bitwise ``AND`` in SQL.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance having the entries. It's not set in the migrations if it has no
+        ``import_path``, as it does not change the column.
+
+    Example
+    -------
+
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'), ('OFFLINE', 3, 'Offline'))
+    >>> field = ChoicesBitmaskField(choices=STATES)
+    >>> field.get_prep_value([STATES.for_constant('ONLINE'), 3])
+    5
+    >>> field.from_db_value(6, None, None)
+    <ChoiceSet: DRAFT, OFFLINE>
+
+    """
+
+    description = "Set of entries of a Choices instance, stored as a bitmask"
+
+    def __init__(self, *args, **kwargs):
+        choices = kwargs.pop('choices', None)
+
+        # Fields are cloned from their deconstruction, where choices may be a reference.
+        if isinstance(choices, ChoicesReference):
+            choices = choices.choices
+
+        if choices is not None:
+            if not isinstance(choices, Choices):
+                raise ValueError("`choices` must be an instance of `extended_choices.Choices`.")
+            if len(get_bit_tables(choices).entries) > MAX_BITMASK_ENTRIES:
+                raise ValueError("A bitmask cannot store more than %d entries."
+                                 % MAX_BITMASK_ENTRIES)
+
+        # Not passed as ``choices``, that Django would use to validate each value.
+        self.bitmask_choices = choices
+
+        super(ChoicesBitmaskField, self).__init__(*args, **kwargs)
+
+        # An empty set, or its bitmask, is blank, like an empty list: refused if not ``blank``.
+        self.empty_values = list(self.empty_values) + [0]
+        if choices is not None:
+            self.empty_values.append(ChoiceSet(choices))
+
+    def deconstruct(self):
+        """Deconstruct the field, with a reference to the choices if they have an import path."""
+
+        name, path, args, kwargs = super(ChoicesBitmaskField, self).deconstruct()
+
+        if SERIALIZER_REGISTERED and self.bitmask_choices is not None:
+            if self.bitmask_choices.import_path:
+                kwargs['choices'] = ChoicesReference(self.bitmask_choices)
+
+        return name, path, args, kwargs
+
+    @cached_property
+    def validators(self):
+        """Only the given validators: the ones of ``BigIntegerField`` are for bitmasks."""
+        return list(self._validators)
+
+    def encode(self, items):
+        """Return the bitmask of a ``ChoiceSet``, or of an iterable of entries, values or constants.
+
+        Raises
+        ------
+        ValueError
+            If an item is not in the choices of the field, or if the bitmask doesn't fit in the
+            column.
+
+        """
+
+        if self.bitmask_choices is None:
+            raise ValueError("The field has no ``Choices`` to encode the set.")
+
+        if not isinstance(items, ChoiceSet) or items.choices is not self.bitmask_choices:
+            items = ChoiceSet(self.bitmask_choices, items)
+
+        if items.mask >> MAX_BITMASK_ENTRIES:
+            raise ValueError("A bitmask cannot store more than %d entries." % MAX_BITMASK_ENTRIES)
+
+        return items.mask
+
+    def decode(self, mask):
+        """Return the ``ChoiceSet`` of the entries having their bit set in ``mask``."""
+        return ChoiceSet.from_mask(self.bitmask_choices, mask)
+
+    def from_db_value(self, value, *args):
+        """Return the ``ChoiceSet`` of the bitmask loaded from the database."""
+
+        if value is None or self.bitmask_choices is None:
+            return value
+
+        return self.decode(value)
+
+    def to_python(self, value):
+        """Return the ``ChoiceSet`` of a bitmask, or of an iterable of entries, values or constants.
+
+        Strings are bitmasks, as written by ``value_to_string``.
+
+        """
+
+        if value is None or self.bitmask_choices is None:
+            return value
+
+        try:
+            if isinstance(value, six.string_types):
+                value = int(value)
+            if not isinstance(value, six.integer_types):
+                value = self.encode(value)
+        except ValueError:
+            raise exceptions.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+
+        return self.decode(value)
+
+    def pre_save(self, model_instance, add):
+        """Replace a ``Choices`` (like a subset) by its entries, that Django takes for an expression."""
+
+        value = super(ChoicesBitmaskField, self).pre_save(model_instance, add)
+
+        if isinstance(value, Choices):
+            value = ChoiceSet(self.bitmask_choices, value)
+            setattr(model_instance, self.attname, value)
+
+        return value
+
+    def get_prep_value(self, value):
+        """Return the bitmask of the set, to save it in the database. Integers are kept as is."""
+
+        if value is not None and not isinstance(value, six.integer_types):
+            value = self.encode(value)
+
+        return super(ChoicesBitmaskField, self).get_prep_value(value)
+
+    def value_to_string(self, obj):
+        """Return the bitmask of the set, as a string, to serialize it."""
+
+        value = self.get_prep_value(self.value_from_object(obj))
+        return '' if value is None else six.text_type(value)
+
+    def formfield(self, **kwargs):
+        """Return a ``ChoicesBitmaskFormField`` to select the values of the set."""
+
+        if self.bitmask_choices is None:
+            return super(ChoicesBitmaskField, self).formfield(**kwargs)
+
+        values = dict((six.text_type(entry.value.original_value), entry.value.original_value)
+                      for entry in self.bitmask_choices.entries)
+
+        defaults = {
+            'form_class': ChoicesBitmaskFormField,
+            'choices': [(entry.value.original_value, entry.display)
+                        for entry in self.bitmask_choices.entries],
+            'coerce': lambda value: values.get(six.text_type(value), value),
+        }
+        defaults.update(kwargs)
+        # Skip ``BigIntegerField.formfield``, that adds the bounds of bitmasks.
+        return models.Field.formfield(self, **defaults)
+
+
+# The integer fields, from the smallest, with the range of values they accept on all backends.
+INTEGER_FIELDS = (
+    (ExtendedChoicePositiveSmallIntegerField, 0, 32767),
+    (ExtendedChoiceSmallIntegerField, -32768, 32767),
+    (ExtendedChoiceIntegerField, -2147483648, 2147483647),
+    (ExtendedChoiceBigIntegerField, -9223372036854775808, 9223372036854775807),
+)
+
+
+def get_model_field(choices, default_constant=None, **kwargs):
+    """Return the smallest model field able to store the values of a ``Choices`` instance.
+
+    Integer values use the smallest integer field accepting all of them, from
+    ``ExtendedChoicePositiveSmallIntegerField`` to ``ExtendedChoiceBigIntegerField``, and string
+    values an ``ExtendedChoiceCharField`` with ``max_length`` being the length of the longest one.
+    Like all the fields of this module, it validates its values in constant time.
+
+    The field is chosen from the values at the time of the call: if choices are added later,
+    they may not fit anymore.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance to use as choices of the field.
+    default_constant : string, optional
+        The constant of the entry whose value is the default value of the field.
+    **kwargs
+        Other arguments for the field, taking precedence over the computed ones, like
+        ``max_length``.
+
+    Returns
+    -------
+    Field
+        The model field.
+
+    Raises
+    ------
+    ValueError
+
+        * If ``choices`` is empty.
+        * If the values are not all integers, or all strings.
+        * If integer values are too big to be stored.
+        * If ``default_constant`` is not a constant of ``choices``.
+
+    Example
+    -------
+
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'))
+    >>> field = get_model_field(STATES, default_constant='DRAFT')
+    >>> field.__class__.__name__, field.default
+    ('ExtendedChoicePositiveSmallIntegerField', 2)
+    >>> field = get_model_field(Choices(('FR', 'fr-FR', 'French'), ('EN', 'en', 'English')))
+    >>> field.__class__.__name__, field.max_length
+    ('ExtendedChoiceCharField', 5)
+
+    """
+
+    values = [entry.value.original_value for entry in choices.entries]
+    if not values:
+        raise ValueError("Cannot choose a field for an empty ``Choices`` instance.")
+
+    field_kwargs = {'choices': choices}
+
+    if default_constant is not None:
+        if not choices.has_constant(default_constant):
+            raise ValueError("'%s' is not a constant of the ``Choices`` instance."
+                             % default_constant)
+        field_kwargs['default'] = choices.for_constant(default_constant).value.original_value
+
+    if all(isinstance(value, six.integer_types) and not isinstance(value, bool)
+           for value in values):
+        lowest, highest = min(values), max(values)
+        for field_class, min_value, max_value in INTEGER_FIELDS:
+            if min_value <= lowest and highest <= max_value:
+                break
+        else:
+            raise ValueError("The values are too big to be stored in a database.")
+
+    elif all(isinstance(value, six.string_types) for value in values):
+        field_class = ExtendedChoiceCharField
+        field_kwargs['max_length'] = max(len(value) for value in values)
+
+    else:
+        raise ValueError("The values must all be integers, or all be strings, to choose a field.")
+
+    field_kwargs.update(kwargs)
+    return field_class(**field_kwargs)
+
+
+SERIALIZER_REGISTERED = register_serializer()
+
+register_lookups(ExtendedChoiceIntegerField, ExtendedChoiceSmallIntegerField,
+                 ExtendedChoicePositiveSmallIntegerField, ExtendedChoiceBigIntegerField,
+                 ExtendedChoiceCharField, ExtendedChoiceEncodedField)
+
+ChoicesBitmaskField.register_lookup(HasAny)
+ChoicesBitmaskField.register_lookup(HasAll)
@@ -11,12 +11,20 @@ The documentation format in this file is numpydoc_.
 
 from __future__ import unicode_literals
 
+import sys
+import threading
+from decimal import Decimal
+from importlib import import_module
+
 try:
     from collections.abc import Mapping
 except ImportError:
     from collections import Mapping
 
+import six
+
 from django.utils.functional import Promise
+from django.utils.translation import gettext_lazy, pgettext_lazy
 
 
 class ChoiceAttributeMixin(object):
@@ -143,8 +151,13 @@ class ChoiceAttributeMixin(object):
 
         Notes
         -----
-        The  create classes are cached (in ``cls.__classes_by_type``) to avoid recreating already
-        created classes.
+        The  create classes are cached (in ``cls._classes_by_type``) to avoid recreating already
+        created classes. Classes for the most common types are created when this module is
+        imported.
+
+        Reading the cache is done without lock, but the creation of a new class is protected by
+        a lock, so concurrent threads always get the same class for the same type.
+
         """
         type_ = value.__class__
 
@@ -153,17 +166,25 @@ class ChoiceAttributeMixin(object):
             # In this case we can return this type
             return type_
 
-        # Create a new class only if it wasn't already created for this type.
-        if type_ not in cls._classes_by_type:
-            # Compute the name of the class with the name of the type.
-            class_name = str('%sChoiceAttribute' % type_.__name__.capitalize())
-            # Create a new class and save it in the cache.
-            cls._classes_by_type[type_] = type(class_name, (cls, type_), {
-                'creator_type': cls,
-            })
-
-        # Return the class from the cache based on the type.
-        return cls._classes_by_type[type_]
+        # Fast path: return the class from the cache if it was already created for this type.
+        try:
+            return cls._classes_by_type[type_]
+        except KeyError:
+            pass
+
+        with cls._classes_lock:
+            # Create a new class only if it wasn't already created for this type, maybe by
+            # another thread while we were waiting for the lock.
+            if type_ not in cls._classes_by_type:
+                # Compute the name of the class with the name of the type.
+                class_name = str('%sChoiceAttribute' % type_.__name__.capitalize())
+                # Create a new class and save it in the cache.
+                cls._classes_by_type[type_] = type(class_name, (cls, type_), {
+                    'creator_type': cls,
+                })
+
+            # Return the class from the cache based on the type.
+            return cls._classes_by_type[type_]
 
     def __reduce__(self):
         """Reducer to make the auto-created classes picklable.
@@ -175,8 +196,24 @@ class ChoiceAttributeMixin(object):
             1. a callable to recreate the object
             2. a tuple with all positioned arguments expected by this callable
 
+        Notes
+        -----
+        If the attached ``ChoiceEntry`` belongs to a ``Choices`` instance defined with an
+        ``import_path``, only this path, the constant and the name of the attribute are pickled,
+        and the existing object will be returned when unpickling.
+
         """
 
+        import_path = getattr(self.choice_entry, '_import_path', None)
+        if import_path:
+            for attribute_name in ('constant', 'value', 'display'):
+                if getattr(self.choice_entry, attribute_name) is self:
+                    return (
+                        # Function to get the existing choice attribute
+                        get_choice_attribute_by_reference,
+                        (import_path, self.choice_entry.constant.original_value, attribute_name)
+                    )
+
         return (
             # Function to create a choice attribute
             create_choice_attribute,
@@ -195,6 +232,15 @@ class ChoiceAttributeMixin(object):
         return bool(self.original_value)
 
     _classes_by_type = {}
+    _classes_lock = threading.Lock()
+
+
+# Create, when the module is imported, the classes for the most common types of values: integers,
+# strings, floats, decimals and django lazy strings.
+for _value in tuple(int_type(0) for int_type in six.integer_types) + (
+        six.text_type(), six.binary_type(), 0.0, Decimal(0), gettext_lazy(''), pgettext_lazy('', '')):
+    ChoiceAttributeMixin.get_class_for_value(_value)
+del _value
 
 
 def create_choice_attribute(creator_type, value, choice_entry):
@@ -222,6 +268,149 @@ def create_choice_attribute(creator_type, value, choice_entry):
     return klass(value, choice_entry)
 
 
+# Process-wide table of interned strings, ``None`` while interning is not enabled.
+_interned_strings = None
+_interning_lock = threading.Lock()
+_interning_stats = {'hits': 0, 'bytes_saved': 0}
+
+# Strings can't be weakly referenced, so the strings that are only referenced by the table are
+# removed each time its size doubles. Its size is then bounded by twice the number of strings
+# still in use, and each insertion costs a constant time on average.
+MIN_INTERNED_STRINGS_PRUNING_SIZE = 1024
+_next_pruning_size = MIN_INTERNED_STRINGS_PRUNING_SIZE
+
+# References to a string only referenced by the table, as seen in ``_prune_interned_strings``:
+# the key and value of the table, the list of strings, the loop variable and the argument of
+# ``sys.getrefcount``.
+_UNUSED_STRING_REFCOUNT = 5
+
+
+def enable_interning():
+    """Enable the interning of the strings used to create ``ChoiceEntry`` instances.
+
+    Once enabled, each string used as constant, value or display name by a new ``ChoiceEntry`` is
+    replaced by the first equal string seen by the process, so the same constants and display
+    names used in many ``Choices`` are stored only once.
+
+    Notes
+    -----
+    Only the strings are shared: the tuple of each ``ChoiceEntry`` and the ``original_value`` of
+    its choice attributes, so the strings given to create it can be freed. Each ``ChoiceEntry``
+    still has its own choice attributes, that are copies of the strings, and are used as keys to
+    look up the entries: lookups are not faster. Entries created before enabling it are not
+    updated. The strings no longer used are removed from the table each time its size doubles.
+
+    Example
+    -------
+
+    >>> enable_interning()
+    >>> first = ChoiceEntry(('OTHER', 1, ''.join(['Ot', 'her'])))
+    >>> second = ChoiceEntry(('OTHER', 2, ''.join(['Ot', 'her'])))
+    >>> first.display.original_value is second.display.original_value
+    True
+    >>> disable_interning()
+
+    """
+
+    global _interned_strings, _next_pruning_size  # pylint: disable=global-statement
+    with _interning_lock:
+        if _interned_strings is None:
+            _interned_strings = {}
+            _next_pruning_size = MIN_INTERNED_STRINGS_PRUNING_SIZE
+
+
+def disable_interning():
+    """Disable the interning of strings, and forget the interned strings.
+
+    Statistics, returned by ``get_interning_stats``, are kept.
+
+    """
+
+    global _interned_strings  # pylint: disable=global-statement
+    with _interning_lock:
+        _interned_strings = None
+
+
+def _prune_interned_strings(interned_strings):
+    """Remove the strings only referenced by the table, and set the size of the next pruning."""
+
+    global _next_pruning_size  # pylint: disable=global-statement
+    with _interning_lock:
+        if len(interned_strings) < _next_pruning_size:
+            # Already pruned by another thread.
+            return
+        strings = list(interned_strings)
+        for string in strings:
+            if sys.getrefcount(string) <= _UNUSED_STRING_REFCOUNT:
+                # A thread may get it again meanwhile: equal strings are then not shared anymore.
+                interned_strings.pop(string, None)
+        _next_pruning_size = max(MIN_INTERNED_STRINGS_PRUNING_SIZE, 2 * len(interned_strings))
+
+
+def intern_string(value):
+    """Return the interned version of the given value if interning is enabled and it's a string.
+
+    Parameters
+    ----------
+    value : ?
+        The value to intern.
+
+    Returns
+    -------
+    ?
+        The first string equal to ``value`` seen since interning was enabled, or ``value`` itself
+        if interning is disabled or if it's not a string.
+
+    """
+
+    interned_strings = _interned_strings
+    if interned_strings is None or type(value) is not six.text_type:
+        return value
+
+    # ``setdefault`` is atomic, so concurrent threads get the same string.
+    interned = interned_strings.setdefault(value, value)
+    if interned is not value:
+        # The given string is replaced: count the size of the copy that can be freed.
+        with _interning_lock:
+            _interning_stats['hits'] += 1
+            _interning_stats['bytes_saved'] += sys.getsizeof(value)
+    elif len(interned_strings) >= _next_pruning_size:
+        _prune_interned_strings(interned_strings)
+
+    return interned
+
+
+def get_interning_stats():
+    """Return statistics about the interning of strings.
+
+    Returns
+    -------
+    dict
+        A dict with these entries:
+
+        * ``enabled``: if interning is currently enabled
+        * ``strings``: the number of interned strings
+        * ``hits``: the number of times a string was replaced by an interned one
+        * ``bytes_saved``: the size of the strings replaced by interned ones: the copies that
+          the entries don't keep
+
+    Notes
+    -----
+    The statistics are counted when strings are interned, so getting them is cheap. They are not
+    decreased when the entries are freed.
+
+    """
+
+    interned_strings = _interned_strings
+    with _interning_lock:
+        stats = dict(_interning_stats)
+
+    stats['enabled'] = interned_strings is not None
+    stats['strings'] = len(interned_strings or ())
+
+    return stats
+
+
 class ChoiceEntry(tuple):
     """Represents a choice in a ``Choices`` object, with easy access to its attribute.
 
@@ -272,6 +461,10 @@ class ChoiceEntry(tuple):
     def __new__(cls, tuple_):
         """Construct the tuple with 3 entries, and save optional attributes from the 4th one."""
 
+        # Django rebuilds the tuples used in filters from a generator.
+        if not isinstance(tuple_, (tuple, list)):
+            tuple_ = tuple(tuple_)
+
         # Ensure we have exactly 3 entries in the tuple and an optional dict.
         assert 3 <= len(tuple_) <= 4, 'Invalid number of entries in %s' % (tuple_,)
 
@@ -283,15 +476,17 @@ class ChoiceEntry(tuple):
                 for invalid_key in {'constant', 'value', 'display'}:
                     assert invalid_key not in attributes, 'Additional attributes cannot contain one named "%s" in %s' % (invalid_key, tuple_,)
 
-        # Call the ``tuple`` constructor with only the real tuple entries.
-        obj = super(ChoiceEntry, cls).__new__(cls, tuple_[:3])
+        # Call the ``tuple`` constructor with only the real tuple entries, interned if enabled, so
+        # the given strings are not kept.
+        items = tuple(intern_string(item) for item in tuple_[:3])
+        obj = super(ChoiceEntry, cls).__new__(cls, items)
 
         # Save all special attributes.
         # pylint: disable=protected-access
         obj.attributes = attributes
-        obj.constant = obj._get_choice_attribute(tuple_[0])
-        obj.value = obj._get_choice_attribute(tuple_[1])
-        obj.display = obj._get_choice_attribute(tuple_[2])
+        obj.constant = obj._get_choice_attribute(items[0])
+        obj.value = obj._get_choice_attribute(items[1])
+        obj.display = obj._get_choice_attribute(items[2])
 
         # Add an attribute holding values as expected by django.
         obj.choice = (obj.value, obj.display)
@@ -326,7 +521,7 @@ class ChoiceEntry(tuple):
             raise ValueError('Using `None` in a `Choices` object is not supported. You may '
                              'use an empty string.')
 
-        return create_choice_attribute(self.ChoiceAttributeMixin, value, self)
+        return create_choice_attribute(self.ChoiceAttributeMixin, intern_string(value), self)
 
     def __reduce__(self):
         """Reducer to pass attributes when pickling.
@@ -338,8 +533,22 @@ class ChoiceEntry(tuple):
             1. a callable to recreate the object
             2. a tuple with all positioned arguments expected by this callable
 
+        Notes
+        -----
+        If the entry belongs to a ``Choices`` instance defined with an ``import_path``, only this
+        path and the constant are pickled, and the existing entry will be returned when
+        unpickling.
+
         """
 
+        import_path = getattr(self, '_import_path', None)
+        if import_path:
+            return (
+                # Function to get the existing entry
+                get_choice_entry_by_reference,
+                (import_path, self.constant.original_value)
+            )
+
         return (
             # The ``ChoiceEntry`` class, or a subclass, used to create the current instance
             self.__class__,
@@ -353,3 +562,170 @@ class ChoiceEntry(tuple):
                 ),
             )
         )
+
+
+def import_from_path(import_path):
+    """Return the object available at the given import path.
+
+    Parameters
+    ----------
+    import_path : string
+        The full python path of the object, made of a module path followed by one or many
+        attribute names, like ``myapp.constants.STATES`` or ``myapp.constants.STATES.NOT_ONLINE``.
+
+    Returns
+    -------
+    object
+        The object available at the given import path.
+
+    Raises
+    ------
+    ImportError
+        If the import path cannot be resolved.
+
+    Example
+    -------
+
+    >>> import_from_path('extended_choices.helpers.ChoiceEntry') is ChoiceEntry
+    True
+
+    """
+
+    parts = import_path.split('.')
+
+    # Look for the longest importable module path, the remaining parts being attributes.
+    for index in range(len(parts) - 1, 0, -1):
+        try:
+            obj = import_module('.'.join(parts[:index]))
+        except ImportError:
+            continue
+        try:
+            for part in parts[index:]:
+                obj = getattr(obj, part)
+        except AttributeError:
+            break
+        return obj
+
+    raise ImportError("Cannot import '%s'." % import_path)
+
+
+def get_choice_entry_by_reference(import_path, constant):
+    """Return the existing ``ChoiceEntry`` for a constant of the ``Choices`` at ``import_path``.
+
+    Parameters
+    ----------
+    import_path : string
+        The import path of the ``Choices`` instance holding the entry.
+    constant : string
+        The constant of the entry.
+
+    Returns
+    -------
+    ChoiceEntry
+        The entry, as found in the ``Choices`` instance.
+
+    """
+
+    return import_from_path(import_path).for_constant(constant)
+
+
+def get_choice_attribute_by_reference(import_path, constant, attribute_name):
+    """Return an existing choice attribute of a ``ChoiceEntry`` of the ``Choices`` at ``import_path``.
+
+    Parameters
+    ----------
+    import_path : string
+        The import path of the ``Choices`` instance holding the entry.
+    constant : string
+        The constant of the entry.
+    attribute_name : string
+        The attribute of the entry to return: ``constant``, ``value`` or ``display``.
+
+    Returns
+    -------
+    ChoiceAttributeMixin
+        The choice attribute, as found in the ``ChoiceEntry``.
+
+    """
+
+    return getattr(get_choice_entry_by_reference(import_path, constant), attribute_name)
+
+
+class UnknownTracker(object):
+    """Count the unknown constants, values and display names looked up in a ``Choices``.
+
+    At most ``max_size`` distinct keys are tracked, so a stream of random values cannot use all
+    the memory: once full, the lookups of new keys are only counted in ``overflow``.
+
+    Parameters
+    ----------
+    max_size : int
+        The maximum number of distinct keys to track.
+
+    Example
+    -------
+
+    >>> tracker = UnknownTracker(2)
+    >>> for value in (4, 4, 5, 6):
+    ...     tracker.track('value', value)
+    >>> tracker.most_common()
+    [(('value', 4), 2), (('value', 5), 1)]
+    >>> tracker.overflow
+    1
+
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.counts = {}
+        self.overflow = 0
+        self._lock = threading.Lock()
+
+    def track(self, kind, key):
+        """Count a lookup of an unknown key.
+
+        Parameters
+        ----------
+        kind : string
+            What was looked up: ``constant``, ``value`` or ``display``.
+        key : ?
+            The unknown key. Must be hashable.
+
+        """
+
+        with self._lock:
+            tracked_key = (kind, key)
+            count = self.counts.get(tracked_key)
+            if count is not None:
+                self.counts[tracked_key] = count + 1
+            elif len(self.counts) < self.max_size:
+                self.counts[tracked_key] = 1
+            else:
+                self.overflow += 1
+
+    def most_common(self, number=None):
+        """Return the tracked ``((kind, key), count)`` tuples, the most common first.
+
+        Parameters
+        ----------
+        number : int, optional
+            If set, only the ``number`` most common ones are returned.
+
+        Returns
+        -------
+        list
+            The ``((kind, key), count)`` tuples.
+
+        """
+
+        with self._lock:
+            items = list(self.counts.items())
+        items.sort(key=lambda item: item[1], reverse=True)
+        return items if number is None else items[:number]
+
+    def clear(self):
+        """Forget all the tracked keys."""
+
+        with self._lock:
+            self.counts = {}
+            self.overflow = 0
@@ -0,0 +1,230 @@
+"""Provides tools to inspect ``Choices`` instances, used by ``python -m extended_choices``.
+
+It can find the ``Choices`` instances of a project, and report, for each one, its size, its
+memory usage, the types of its values, the fast paths that apply, and the duration of its lookups.
+
+Example
+-------
+
+>>> from extended_choices import Choices
+>>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'))
+>>> report = inspect_choices(STATES)
+>>> report['entries'], report['value_types'], report['fast_paths']
+(2, {'int': 2}, ['inline SQL values', 'BETWEEN lookups', 'ChoiceSet byte tables'])
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import unicode_literals
+
+import sys
+import timeit
+from collections import Counter
+
+import six
+
+from .choices import Choices
+from .choicesets import MAX_BYTE_TABLES_ENTRIES
+from .columnar import INT_TYPECODE, ColumnarChoices
+
+__all__ = [
+    'find_choices',
+    'import_choices',
+    'inspect_choices',
+    'benchmark_choices',
+]
+
+
+def import_choices(import_path):
+    """Return the ``Choices`` instance available at the given import path.
+
+    Parameters
+    ----------
+    import_path : string
+        The python path of the instance, like ``myapp.constants.STATES``.
+
+    Returns
+    -------
+    Choices
+        The instance.
+
+    Raises
+    ------
+    ImportError
+        If the import path cannot be resolved.
+    TypeError
+        If the object at this path is not a ``Choices`` instance.
+
+    """
+
+    from .helpers import import_from_path
+
+    obj = import_from_path(import_path)
+    if not isinstance(obj, Choices):
+        raise TypeError("'%s' is not a ``Choices`` instance." % import_path)
+    return obj
+
+
+def find_choices():
+    """Find the ``Choices`` instances defined in the loaded modules and used by the models.
+
+    Django must be set up before, so the modules of the installed applications are loaded. An
+    instance available at many places is returned once, with its first path in alphabetical
+    order, the ones in the modules coming before the ones in the model fields.
+
+    Returns
+    -------
+    list
+        A list of ``(path, choices)`` tuples, sorted by path. The path is the import path for
+        instances found in modules, and ``app_label.Model.field`` for the ones in model fields.
+
+    """
+
+    found = {}
+
+    for module_name, module in sorted(list(sys.modules.items()), key=lambda item: item[0]):
+        if module is None:
+            continue
+        try:
+            attributes = sorted(vars(module).items(), key=lambda item: item[0])
+        except TypeError:
+            continue
+        for name, obj in attributes:
+            if isinstance(obj, Choices):
+                found.setdefault(id(obj), ('%s.%s' % (module_name, name), obj))
+
+    try:
+        from django.apps import apps
+        models = apps.get_models() if apps.ready else []
+    except ImportError:
+        models = []
+
+    for model in models:
+        for field in model._meta.get_fields():  # pylint: disable=protected-access
+            choices = getattr(field, 'choices', None)
+            if isinstance(choices, Choices):
+                found.setdefault(id(choices), ('%s.%s.%s' % (
+                    model._meta.app_label, model.__name__, field.name), choices))
+
+    return sorted(found.values(), key=lambda item: item[0])
+
+
+def _get_fast_paths(choices):
+    """Return the names of the fast paths of the package that apply to the given ``Choices``."""
+
+    fast_paths = []
+
+    values = [entry.value.original_value for entry in choices.entries]
+    if values and all(isinstance(value, six.integer_types) and not isinstance(value, bool)
+                      for value in values):
+        # ``ValuesMap`` writes integers in the SQL instead of passing them as params.
+        fast_paths.append('inline SQL values')
+        # ``get_lookup_sql`` uses a ``BETWEEN`` instead of an ``IN`` for consecutive values.
+        if max(values) - min(values) + 1 == len(values):
+            fast_paths.append('BETWEEN lookups')
+
+    if 0 < len(values) <= MAX_BYTE_TABLES_ENTRIES:
+        fast_paths.append('ChoiceSet byte tables')
+
+    if isinstance(choices, ColumnarChoices):
+        # pylint: disable=protected-access
+        if choices._storage.values.typecode == INT_TYPECODE:
+            fast_paths.append('columnar integer values')
+
+    if choices.import_path:
+        fast_paths.append('pickled by reference')
+
+    return fast_paths
+
+
+def inspect_choices(choices):
+    """Return a report about the given ``Choices`` instance.
+
+    Parameters
+    ----------
+    choices : Choices
+        The instance to inspect.
+
+    Returns
+    -------
+    dict
+        With these keys:
+
+        * ``class``: the name of the class of the instance
+        * ``entries``: the number of entries
+        * ``subsets``: the number of subsets
+        * ``memory``: the memory used, in bytes (see ``Choices.memory_usage``)
+        * ``value_types``: the number of values for each type name
+        * ``fast_paths``: the names of the fast paths of the package that apply:
+
+          * ``inline SQL values`` if all values are integers, written in the SQL of
+            ``display_expression`` and ``order_expression`` instead of being params
+          * ``BETWEEN lookups`` if they are also consecutive, so ``in_subset`` on the whole
+            instance uses a ``BETWEEN`` instead of an ``IN``
+          * ``ChoiceSet byte tables`` if there are at most 64 entries, so a ``ChoiceSet``
+            is iterated with a table per byte of its bitmask
+          * ``columnar integer values`` if they fit in the ``array`` of integers of ``ColumnarChoices``
+          * ``pickled by reference`` if the instance has an ``import_path``
+
+    """
+
+    value_types = Counter(type(entry.value.original_value).__name__ for entry in choices.entries)
+
+    return {
+        'class': choices.__class__.__name__,
+        'entries': len(choices),
+        'subsets': len(choices.subsets),
+        'memory': choices.memory_usage()['total'],
+        'value_types': dict(value_types),
+        'fast_paths': _get_fast_paths(choices),
+    }
+
+
+def benchmark_choices(choices, number=10000):
+    """Time the main lookups on the given ``Choices`` instance.
+
+    The lookups are done with the constant, value and display name of the entry in the middle.
+
+    Parameters
+    ----------
+    choices : Choices
+        The instance to benchmark.
+    number : int, optional
+        The number of times each lookup is done.
+
+    Returns
+    -------
+    dict
+        The average duration, in seconds, for ``for_constant``, ``for_value``, ``for_display``,
+        ``has_value`` (with a missing value) and the attribute access of a constant. Empty if
+        there is no entry.
+
+    """
+
+    if not len(choices):
+        return {}
+
+    entry = choices.entries[len(choices) // 2]
+    constant = entry.constant.original_value
+    value = entry.value.original_value
+    display = entry.display.original_value
+    missing = object()
+
+    lookups = [
+        ('for_constant', lambda: choices.for_constant(constant)),
+        ('for_value', lambda: choices.for_value(value)),
+        ('for_display', lambda: choices.for_display(display)),
+        ('has_value (missing)', lambda: choices.has_value(missing)),
+        ('attribute', lambda: getattr(choices, constant)),
+    ]
+
+    return dict(
+        (name, min(timeit.repeat(func, number=number, repeat=3)) / number)
+        for name, func in lookups
+    )
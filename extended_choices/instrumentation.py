@@ -0,0 +1,350 @@
+"""Provides an opt-in instrumentation of the lookups done on ``Choices`` instances.
+
+When enabled, calls to ``for_constant``, ``for_value``, ``for_display``, ``has_constant``,
+``has_value``, ``has_display``, ``__contains__`` and ``__getitem__`` are counted, with their hits
+and misses, some of them can be timed, and a callback can be called for each of them, for example
+to export them to a metrics system.
+
+It can be enabled for all the ``Choices`` instances, or only for some of them. When it's not
+enabled, there is no overhead at all: the instrumented methods are only set when enabled, and
+removed when disabled.
+
+Example
+-------
+
+>>> from extended_choices import Choices
+>>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'))
+>>> instrument(STATES)
+>>> STATES.for_value(1)
+('ONLINE', 1, 'Online')
+>>> STATES.has_constant('OFFLINE')
+False
+>>> stats = get_lookup_stats(STATES)
+>>> stats['for_value']['hits'], stats['has_constant']['misses']
+(1, 1)
+>>> uninstrument(STATES)
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import unicode_literals
+
+import functools
+import itertools
+import threading
+import timeit
+
+from .choices import Choices, create_choice
+
+__all__ = [
+    'instrument',
+    'uninstrument',
+    'get_lookup_stats',
+    'INSTRUMENTED_METHODS',
+]
+
+# The instrumented methods, and if a lookup is a miss when it returns a falsy value (else it's a
+# miss when it raises ``KeyError`` or ``IndexError``).
+INSTRUMENTED_METHODS = (
+    ('for_constant', False),
+    ('for_value', False),
+    ('for_display', False),
+    ('has_constant', True),
+    ('has_value', True),
+    ('has_display', True),
+    ('__contains__', True),
+    ('__getitem__', False),
+)
+
+# Instrumentation used by all the ``Choices`` instances when enabled globally, as a template for
+# the instrumentation of each instance.
+_global_instrumentation = None
+
+# The original methods of the classes instrumented globally, by class.
+_original_methods = {}
+
+_lock = threading.Lock()
+
+
+class _Instrumentation(object):
+    """Configuration and counters of the instrumentation of a ``Choices`` instance.
+
+    Parameters
+    ----------
+    sample_every : int
+        Time one call out of ``sample_every``. ``0`` to never time calls.
+    callback : callable or None
+        Called after each call.
+    template : _Instrumentation, optional
+        The global instrumentation this one was created from.
+
+    """
+
+    def __init__(self, sample_every, callback, template=None):
+        self.sample_every = sample_every
+        self.callback = callback
+        self.template = template
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.ticks = itertools.count(1)
+
+    def record(self, choices, method_name, hit, duration):
+        """Count a call, then call the callback, if any."""
+
+        with self.lock:
+            counters = self.counters.get(method_name)
+            if counters is None:
+                counters = self.counters[method_name] = {
+                    'calls': 0, 'hits': 0, 'misses': 0, 'timed': 0,
+                    'total_time': 0.0, 'max_time': 0.0,
+                }
+            counters['calls'] += 1
+            counters['hits' if hit else 'misses'] += 1
+            if duration is not None:
+                counters['timed'] += 1
+                counters['total_time'] += duration
+                counters['max_time'] = max(counters['max_time'], duration)
+
+        if self.callback is not None:
+            self.callback(choices, method_name, hit, duration)
+
+
+def _get_instance_instrumentation(choices):
+    """Return the instrumentation of a ``Choices`` instance instrumented alone."""
+    return choices.__dict__['_instrumentation']
+
+
+def _get_global_instrumentation(choices):
+    """Return the instrumentation of a ``Choices`` instance, when instrumented globally."""
+
+    template = _global_instrumentation
+    instrumentation = choices.__dict__.get('_global_instrumentation')
+    if instrumentation is None or instrumentation.template is not template:
+        instrumentation = _Instrumentation(template.sample_every, template.callback, template)
+        instrumentation = choices.__dict__.setdefault('_global_instrumentation', instrumentation)
+    return instrumentation
+
+
+def _make_instrumented_method(method, method_name, miss_if_falsy, get_instrumentation):
+    """Return a function calling ``method`` and recording the call.
+
+    Parameters
+    ----------
+    method : callable
+        The original method.
+    method_name : string
+        The name of the method, for the counters.
+    miss_if_falsy : boolean
+        If ``True``, a falsy result is a miss, else a ``KeyError`` or ``IndexError`` is a miss.
+    get_instrumentation : callable
+        Returns the ``_Instrumentation`` to use for a ``Choices`` instance.
+
+    """
+
+    timer = timeit.default_timer
+
+    @functools.wraps(method)
+    def instrumented(self, *args, **kwargs):
+        instrumentation = get_instrumentation(self)
+        sample_every = instrumentation.sample_every
+
+        start = None
+        if sample_every and not next(instrumentation.ticks) % sample_every:
+            start = timer()
+
+        try:
+            result = method(self, *args, **kwargs)
+        except (KeyError, IndexError):
+            instrumentation.record(self, method_name, False,
+                                   None if start is None else timer() - start)
+            raise
+
+        instrumentation.record(self, method_name, bool(result) if miss_if_falsy else True,
+                               None if start is None else timer() - start)
+        return result
+
+    instrumented.original_method = method
+    return instrumented
+
+
+def _get_sample_every(sample_rate):
+    """Convert a sample rate (between 0 and 1) to the number of calls between two timed ones."""
+
+    if not sample_rate:
+        return 0
+    if not 0 < sample_rate <= 1:
+        raise ValueError("``sample_rate`` must be between 0 and 1.")
+    return max(1, int(round(1 / sample_rate)))
+
+
+def _iter_classes(klass):
+    """Yield ``klass`` and all its subclasses, except the ones created to instrument instances."""
+
+    if not getattr(klass, '_instrumented_class', False):
+        yield klass
+    for subclass in klass.__subclasses__():
+        for sub_subclass in _iter_classes(subclass):
+            yield sub_subclass
+
+
+def instrument(choices=None, sample_rate=0, callback=None):
+    """Start instrumenting the lookups of one or all ``Choices`` instances.
+
+    Parameters
+    ----------
+    choices : Choices, optional
+        The instance to instrument. If not set, all instances of ``Choices`` and its subclasses
+        are instrumented, each one having its own counters.
+    sample_rate : float, optional
+        The proportion of calls to time, between 0 and 1. ``0`` (the default) to not time any.
+    callback : callable, optional
+        If set, called after each call with four arguments: the ``Choices`` instance, the name of
+        the method, if it was a hit, and its duration in seconds if it was timed (else ``None``).
+
+    Raises
+    ------
+    RuntimeError
+        If the instrumentation is already enabled (for this instance, or globally).
+    ValueError
+        If ``sample_rate`` is not between 0 and 1.
+
+    Notes
+    -----
+    A single instance is instrumented by changing its class to a subclass with the instrumented
+    methods. This subclass has the same name, and instances are pickled with the original class.
+
+    Globally, the methods are replaced in ``Choices`` and all its subclasses. Classes created
+    after that use the instrumented methods they inherit, but not the ones they define.
+
+    ``__contains__`` uses ``has_value``, and the validation of new choices uses ``has_constant``
+    and ``has_value``, so these calls are counted too.
+
+    """
+
+    sample_every = _get_sample_every(sample_rate)
+
+    with _lock:
+        if choices is not None:
+            _instrument_instance(choices, sample_every, callback)
+        else:
+            _instrument_classes(sample_every, callback)
+
+
+def _instrument_instance(choices, sample_every, callback):
+    """Instrument a single instance by changing its class."""
+
+    original_class = choices.__class__
+    if getattr(original_class, '_instrumented_class', False):
+        raise RuntimeError("This ``Choices`` instance is already instrumented.")
+
+    attrs = {
+        '__module__': original_class.__module__,
+        '_instrumented_class': True,
+        '_original_class': original_class,
+        '__reduce__': _reduce_instrumented,
+    }
+    for method_name, miss_if_falsy in INSTRUMENTED_METHODS:
+        method = getattr(original_class, method_name)
+        # Don't count twice if the methods are also instrumented globally.
+        method = getattr(method, 'original_method', method)
+        attrs[method_name] = _make_instrumented_method(
+            method, method_name, miss_if_falsy, _get_instance_instrumentation)
+
+    choices.__dict__['_instrumentation'] = _Instrumentation(sample_every, callback)
+    choices.__class__ = type(original_class.__name__, (original_class, ), attrs)
+
+
+def _reduce_instrumented(self):
+    """Pickle an instrumented instance as an instance of its original class."""
+
+    original_class = self._original_class
+    reduced = original_class.__reduce__(self)
+    if reduced[0] is create_choice:
+        reduced = (reduced[0], (original_class, ) + tuple(reduced[1][1:]))
+    return reduced
+
+
+def _instrument_classes(sample_every, callback):
+    """Instrument ``Choices`` and all its subclasses."""
+
+    global _global_instrumentation  # pylint: disable=global-statement
+
+    if _global_instrumentation is not None:
+        raise RuntimeError("``Choices`` are already instrumented globally.")
+
+    _global_instrumentation = _Instrumentation(sample_every, callback)
+
+    for klass in _iter_classes(Choices):
+        for method_name, miss_if_falsy in INSTRUMENTED_METHODS:
+            method = klass.__dict__.get(method_name)
+            if method is None:
+                continue
+            _original_methods.setdefault(klass, {})[method_name] = method
+            setattr(klass, method_name, _make_instrumented_method(
+                method, method_name, miss_if_falsy, _get_global_instrumentation))
+
+
+def uninstrument(choices=None):
+    """Stop instrumenting the lookups of one or all ``Choices`` instances.
+
+    Parameters
+    ----------
+    choices : Choices, optional
+        The instance to stop instrumenting. If not set, stop the global instrumentation.
+
+    """
+
+    global _global_instrumentation  # pylint: disable=global-statement
+
+    with _lock:
+        if choices is not None:
+            if getattr(choices.__class__, '_instrumented_class', False):
+                choices.__class__ = choices._original_class
+            choices.__dict__.pop('_instrumentation', None)
+            return
+
+        for klass, methods in _original_methods.items():
+            for method_name, method in methods.items():
+                setattr(klass, method_name, method)
+        _original_methods.clear()
+        _global_instrumentation = None
+
+
+def get_lookup_stats(choices, reset=False):
+    """Return the counters of the lookups done on the given ``Choices`` instance.
+
+    Parameters
+    ----------
+    choices : Choices
+        The instrumented instance.
+    reset : boolean, optional
+        If ``True``, the counters are reset after being returned.
+
+    Returns
+    -------
+    dict
+        For each method called at least once, a dict with the number of ``calls``, ``hits``,
+        ``misses``, of ``timed`` calls, their ``total_time`` and ``max_time`` in seconds. If the
+        instance is instrumented alone, the counters of this instrumentation are returned, else
+        the ones of the global instrumentation.
+
+    """
+
+    instrumentation = choices.__dict__.get('_instrumentation')
+    if instrumentation is None:
+        instrumentation = choices.__dict__.get('_global_instrumentation')
+        if instrumentation is None or instrumentation.template is not _global_instrumentation:
+            return {}
+
+    with instrumentation.lock:
+        stats = dict((name, dict(counters)) for name, counters in instrumentation.counters.items())
+        if reset:
+            instrumentation.counters = {}
+
+    return stats
@@ -0,0 +1,295 @@
+"""Provides Django lookups to filter on the entries of a ``Choices`` instance.
+
+* ``in_subset``, to filter on the values of a subset (or of a ``Choices`` instance, or of a subset
+  of the choices of the field, given its name), without building the list of values each time.
+  When the values are consecutive integers, a ``BETWEEN`` is used instead of an ``IN``, to use
+  an index more easily.
+* ``const``, to filter on the value of a constant of the choices of the field.
+
+They are registered on the model fields of ``extended_choices``, and can be registered on other
+fields with ``register_lookups``.
+
+* ``has_any`` and ``has_all``, registered on ``ChoicesBitmaskField``, to filter on the rows
+  having any, or all, of the given entries in their set, with a bitwise ``AND``.
+
+Example
+-------
+
+.. code-block:: python
+
+    Content.objects.filter(state__in_subset=STATES.NOT_ONLINE)
+    Content.objects.filter(state__in_subset='NOT_ONLINE')
+    Content.objects.filter(state__const='ONLINE')
+    Content.objects.filter(channels__has_any=[CHANNELS.EMAIL, CHANNELS.SMS])
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import unicode_literals
+
+import six
+
+try:
+    from django.core.exceptions import EmptyResultSet
+except ImportError:  # Django < 1.11
+    from django.db.models.sql.datastructures import EmptyResultSet
+from django.db.models import Lookup
+from django.db.models.lookups import Exact
+
+from .choices import Choices
+
+__all__ = [
+    'ChoicesValue',
+    'InSubset',
+    'Const',
+    'HasAll',
+    'HasAny',
+    'get_lookup_sql',
+    'register_lookups',
+]
+
+
+def _get_field_choices(lookup):
+    """Return the ``Choices`` of the field of the lookup, or raise ``ValueError``."""
+
+    choices = getattr(lookup.lhs.output_field, 'choices', None)
+    if not isinstance(choices, Choices):
+        raise ValueError("The ``%s`` lookup needs a field having a ``Choices`` as choices."
+                         % lookup.lookup_name)
+    return choices
+
+
+def _build_lookup_sql(choices, codes):
+    """Build the SQL to filter on the values (or codes) of ``choices``, and its params."""
+
+    values = [entry.value.original_value for entry in choices.entries]
+    if codes:
+        values = [choices.codes[entry.constant.original_value] for entry in choices.entries]
+
+    if not values:
+        return None, ()
+
+    if len(values) == 1:
+        return '= %s', tuple(values)
+
+    if all(isinstance(value, six.integer_types) and not isinstance(value, bool)
+           for value in values):
+        first, last = min(values), max(values)
+        if last - first + 1 == len(values):
+            return 'BETWEEN %s AND %s', (first, last)
+
+    return 'IN (%s)' % ', '.join(['%s'] * len(values)), tuple(values)
+
+
+def get_lookup_sql(choices, codes=False):
+    """Return the SQL to add after the field to filter on the values of ``choices``, and its params.
+
+    The result is cached in ``choices`` until new choices or codes are added.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance (or subset) having the values to filter on.
+    codes : boolean, optional
+        If ``True``, filter on the codes of the values (see ``Choices.set_codes``) instead.
+
+    Returns
+    -------
+    tuple
+        The SQL, ``None`` if there is no values, and the tuple of params.
+
+    Example
+    -------
+
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'), ('OFFLINE', 3, 'Offline'))
+    >>> STATES.add_subset('NOT_DRAFT', ('ONLINE', 'OFFLINE'))
+    >>> get_lookup_sql(STATES)
+    ('BETWEEN %s AND %s', (1, 3))
+    >>> get_lookup_sql(STATES.NOT_DRAFT)
+    ('IN (%s, %s)', (1, 3))
+
+    Raises
+    ------
+    KeyError
+        If ``codes`` is ``True`` and a value has no code.
+
+    """
+
+    cache = choices._derived_cache  # pylint: disable=protected-access
+
+    key = ('lookup_sql', codes)
+    lookup_sql = cache.get(key)
+    if lookup_sql is None:
+        lookup_sql = cache.setdefault(key, _build_lookup_sql(choices, codes))
+
+    return lookup_sql
+
+
+class ChoicesValue(object):
+    """Wrap a ``Choices`` instance to pass it as is to the ``in_subset`` lookup.
+
+    Django rebuilds the lists used as filter values from their items, and a ``Choices`` is a list
+    of ``(value, display)`` pairs. So a ``Choices`` used as a filter value is replaced by this
+    wrapper (see ``Choices.resolve_expression``). As it's an expression for Django, the wrapper is
+    passed untouched to the lookup, and is rejected by the lookups not expecting it.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance (or subset) having the values to filter on.
+
+    """
+
+    def __init__(self, choices):
+        if not isinstance(choices, Choices):
+            raise ValueError("``ChoicesValue`` needs a ``Choices`` instance.")
+        self.choices = choices
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.choices)
+
+    def resolve_expression(self, *args, **kwargs):  # pylint: disable=unused-argument
+        """Return the wrapper itself, to be used as is by the lookup."""
+        return self
+
+    def as_sql(self, compiler, connection):  # pylint: disable=unused-argument
+        """Reject the lookups other than ``in_subset``, that would compile the wrapper."""
+        raise ValueError("A ``Choices`` can only be used as a value with the ``in_subset``, "
+                         "``has_any`` and ``has_all`` lookups.")
+
+
+class InSubset(Lookup):
+    """Lookup filtering on the values of a ``Choices`` instance, or of a subset given its name.
+
+    The ``Choices`` instance can be given directly, or wrapped in a ``ChoicesValue``. An empty
+    subset matches no rows.
+
+    """
+
+    lookup_name = 'in_subset'
+    prepare_rhs = False
+
+    def get_prep_lookup(self):
+        """Return the ``Choices`` to filter on, getting the subset from its name if needed."""
+
+        if isinstance(self.rhs, six.string_types):
+            choices = _get_field_choices(self)
+            if self.rhs not in choices.subsets:
+                raise ValueError("'%s' is not a subset of the choices of the field." % self.rhs)
+            return getattr(choices, self.rhs)
+
+        if isinstance(self.rhs, ChoicesValue):
+            return self.rhs.choices
+
+        if not isinstance(self.rhs, Choices):
+            raise ValueError("The ``in_subset`` lookup needs a ``Choices`` or a subset name.")
+
+        return self.rhs
+
+    def as_sql(self, compiler, connection):
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        codes = getattr(self.lhs.output_field, 'stores_codes', False)
+        try:
+            rhs_sql, rhs_params = get_lookup_sql(self.rhs, codes)
+        except KeyError as exc:
+            raise ValueError("The value of %s has no code in the choices." % exc)
+        if rhs_sql is None:
+            raise EmptyResultSet
+        return '%s %s' % (lhs_sql, rhs_sql), list(lhs_params) + list(rhs_params)
+
+
+class Const(Exact):
+    """Lookup filtering on the value of a constant of the choices of the field."""
+
+    lookup_name = 'const'
+
+    def get_prep_lookup(self):
+        """Replace the constant by its value, before preparing it as for ``exact``."""
+
+        choices = _get_field_choices(self)
+        if not choices.has_constant(self.rhs):
+            raise ValueError("'%s' is not a constant of the choices of the field." % self.rhs)
+        self.rhs = choices.for_constant(self.rhs).value.original_value
+
+        return super(Const, self).get_prep_lookup()
+
+    def get_rhs_op(self, connection, rhs):
+        """Use the operator of ``exact``, as ``const`` is not known by the backends."""
+        return connection.operators['exact'] % rhs
+
+
+class BitmaskLookup(Lookup):
+    """Base of the lookups comparing the bitmask of a ``ChoicesBitmaskField`` to a set of entries.
+
+    The right-hand side is an iterable of entries or values, a subset (maybe wrapped in a
+    ``ChoicesValue``), or the name of a subset of the choices of the field. It's converted to a
+    bitmask, written inline in the SQL.
+
+    """
+
+    prepare_rhs = False
+
+    def get_prep_lookup(self):
+        """Return the bitmask of the entries to look for."""
+
+        field = self.lhs.output_field
+        rhs = self.rhs
+
+        if isinstance(rhs, six.string_types):
+            choices = field.bitmask_choices
+            if choices is None or rhs not in choices.subsets:
+                raise ValueError("'%s' is not a subset of the choices of the field." % rhs)
+            rhs = getattr(choices, rhs)
+        elif isinstance(rhs, ChoicesValue):
+            rhs = rhs.choices
+
+        return field.encode(rhs)
+
+    def get_masked_sql(self, compiler, connection):
+        """Return the SQL of the bitwise ``AND`` of the field and the bitmask, and its params."""
+
+        lhs_sql, lhs_params = self.process_lhs(compiler, connection)
+        return connection.ops.combine_expression('&', [lhs_sql, '%d' % self.rhs]), lhs_params
+
+
+class HasAny(BitmaskLookup):
+    """Lookup filtering on the rows having at least one of the entries. None matches no rows."""
+
+    lookup_name = 'has_any'
+
+    def as_sql(self, compiler, connection):
+        if not self.rhs:
+            raise EmptyResultSet
+        masked_sql, params = self.get_masked_sql(compiler, connection)
+        return '%s <> 0' % masked_sql, list(params)
+
+
+class HasAll(BitmaskLookup):
+    """Lookup filtering on the rows having all the entries. None matches all non-null rows."""
+
+    lookup_name = 'has_all'
+
+    def as_sql(self, compiler, connection):
+        masked_sql, params = self.get_masked_sql(compiler, connection)
+        return '%s = %d' % (masked_sql, self.rhs), list(params)
+
+
+def register_lookups(*field_classes):
+    """Register the ``in_subset`` and ``const`` lookups on the given model field classes.
+
+    Parameters
+    ----------
+    *field_classes : list of Field subclasses
+        The classes to register the lookups on, like ``models.IntegerField``.
+
+    """
+
+    for field_class in field_classes:
+        field_class.register_lookup(InSubset)
+        field_class.register_lookup(Const)
@@ -0,0 +1,127 @@
+"""Provides a read-only ``Choices``-like backend for huge catalogs, using a memory-mapped file.
+
+For reference tables with hundreds of thousands of entries, a ``Choices`` instance means millions
+of python objects. Instead, the choices can be written once in a file, using the binary format
+of ``extended_choices.packed``, and read via ``MmapChoices``: lookups are done by binary search
+in the mapped file, and only the returned entries are created.
+
+Example
+-------
+
+At build time:
+
+.. code-block:: python
+
+    from extended_choices.mmap import build_mmap_file
+    build_mmap_file(TARIFF_CODES, '/var/lib/myapp/tariff_codes.choices')
+
+Then at runtime:
+
+.. code-block:: python
+
+    from extended_choices.mmap import MmapChoices
+    TARIFF_CODES = MmapChoices('/var/lib/myapp/tariff_codes.choices')
+
+    code = models.IntegerField(choices=TARIFF_CODES)
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import binascii
+import mmap
+import os
+
+from .packed import PackedChoices, pack_choices
+
+__all__ = [
+    'build_mmap_file',
+    'MmapChoices',
+]
+
+
+def build_mmap_file(choices, path):
+    """Write a ``Choices`` instance in a file to be read by ``MmapChoices``.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance to write. See ``extended_choices.packed.pack_choices`` for the
+        restrictions.
+    path : string
+        The path of the file to write.
+
+    Notes
+    -----
+    The file is first written aside then renamed, so processes having the previous version of
+    the file opened continue to use it safely. As any new file, it's readable by all (``0644``),
+    masked by the current umask.
+
+    """
+
+    data = pack_choices(choices)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    temp_path = os.path.join(
+        directory, '.choices-%s' % binascii.hexlify(os.urandom(8)).decode('ascii'))
+    # Unlike ``tempfile.mkstemp`` (``0600``), the mode lets the kernel apply the umask.
+    fd = os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0),
+                 0o644)
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+        os.rename(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+
+class MmapChoices(PackedChoices):
+    """Read-only ``Choices``-like object reading a file written by ``build_mmap_file``.
+
+    It provides the read API of ``Choices``: ``for_constant``, ``for_value``, ``for_display``,
+    ``has_constant``, ``has_value``, ``has_display``, ``in``, constants as attributes or keys,
+    and iteration and ``choices`` as expected by django.
+
+    Parameters
+    ----------
+    path : string
+        The path of the file written by ``build_mmap_file``.
+
+    Example
+    -------
+
+    >>> import os, tempfile
+    >>> from extended_choices import Choices
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'))
+    >>> path = os.path.join(tempfile.mkdtemp(), 'states.choices')
+    >>> build_mmap_file(STATES, path)
+    >>> MMAP_STATES = MmapChoices(path)
+    >>> MMAP_STATES.for_value(2)
+    ('DRAFT', 2, 'Draft')
+    >>> MMAP_STATES.ONLINE
+    1
+    >>> list(MMAP_STATES)
+    [(1, 'Online'), (2, 'Draft')]
+    >>> MMAP_STATES.close()
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as mapped_file:
+            self.memory = mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+        super(MmapChoices, self).__init__(self.memory)
+
+    def close(self):
+        """Close the memory-mapped file."""
+        self.buffer = None
+        self._entries = {}
+        self.memory.close()
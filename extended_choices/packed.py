@@ -0,0 +1,480 @@
+"""Provides a compact binary format for ``Choices``, usable from any buffer without unpacking it.
+
+Entries are packed in arrays (constants, values, displays and attributes, plus sorted indexes on
+constants, values and displays), and lookups are done by binary search directly in the buffer.
+``ChoiceEntry`` instances are only created when needed, and the additional attributes of an entry,
+saved in JSON, are only decoded when its ``ChoiceEntry`` is created.
+
+As the buffer can be shared memory or a memory-mapped file, it allows many processes to use the
+same choices without each of them holding its own python objects.
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import unicode_literals
+
+import json
+import struct
+
+import six
+
+from .helpers import ChoiceEntry
+
+__all__ = [
+    'pack_choices',
+    'PackedChoices',
+]
+
+MAGIC = b'EXCP'
+FORMAT_VERSION = 2
+
+# Kinds of values that can be packed.
+VALUE_KIND_INT = 0
+VALUE_KIND_TEXT = 1
+
+# String id of the attributes of entries without additional attributes.
+_NO_ATTRIBUTES = 2 ** 32 - 1
+
+# magic, format version, kind of values, number of entries, number of strings in the strings
+# table, size of the strings data.
+_HEADER = struct.Struct(str('<4sHHIII'))
+_UINT32 = struct.Struct(str('<I'))
+_INT64 = struct.Struct(str('<q'))
+_STRING_BOUNDS = struct.Struct(str('<II'))
+
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+
+def _align(offset):
+    """Return the first offset aligned on 8 bytes starting at ``offset``."""
+    return (offset + 7) & ~7
+
+
+def _get_layout(count, nb_strings, strings_size):
+    """Compute the offset of each part of the packed data.
+
+    Parameters
+    ----------
+    count : int
+        The number of entries.
+    nb_strings : int
+        The number of strings in the strings table.
+    strings_size : int
+        The size of all the strings, encoded in utf-8.
+
+    Returns
+    -------
+    dict
+        The offset of each part, and the total ``size``.
+
+    """
+
+    layout = {}
+    offset = _align(_HEADER.size)
+
+    # One int64 by value (a string id for text values)
+    layout['values'] = offset
+    offset += 8 * count
+
+    # Then arrays of uint32: string ids of constants, displays and attributes (JSON), positions
+    # of entries sorted by constant, value and display, and offsets of the strings.
+    for part in ('constants', 'displays', 'attributes', 'by_constant', 'by_value', 'by_display'):
+        layout[part] = offset
+        offset += 4 * count
+    layout['string_offsets'] = offset
+    offset += 4 * (nb_strings + 1)
+
+    layout['strings'] = offset
+    layout['size'] = offset + strings_size
+
+    return layout
+
+
+def pack_choices(choices):
+    """Pack a ``Choices`` instance in the binary format read by ``PackedChoices``.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance to pack. Its values must be all integers (fitting in 64 bits) or
+        all strings. Additional attributes, if any, must be serializable in JSON.
+
+    Returns
+    -------
+    bytes
+        The packed data.
+
+    Raises
+    ------
+    ValueError
+        If the values cannot be packed.
+
+    Notes
+    -----
+    Displays are converted to strings, so lazy ones are translated in the current language.
+
+    Example
+    -------
+
+    >>> from extended_choices import Choices
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'))
+    >>> packed = PackedChoices(pack_choices(STATES))
+    >>> packed.for_value(2)
+    ('DRAFT', 2, 'Draft')
+
+    """
+
+    entries = choices.entries
+    values = [entry.value.original_value for entry in entries]
+
+    if all(isinstance(value, six.integer_types) for value in values):
+        value_kind = VALUE_KIND_INT
+        if values and (min(values) < _INT64_MIN or max(values) > _INT64_MAX):
+            raise ValueError("Only values fitting in 64 bits can be packed.")
+    elif all(isinstance(value, six.string_types) for value in values):
+        value_kind = VALUE_KIND_TEXT
+    else:
+        raise ValueError("Only choices with all values being integers, or all being strings, can "
+                         "be packed.")
+
+    # Table of all strings, each one being saved only once.
+    strings, string_ids = [], {}
+
+    def get_string_id(string):
+        """Return the id of the string in the table, adding it if needed."""
+        encoded = six.text_type(string).encode('utf-8')
+        if encoded not in string_ids:
+            string_ids[encoded] = len(strings)
+            strings.append(encoded)
+        return string_ids[encoded]
+
+    constant_ids = [get_string_id(entry.constant.original_value) for entry in entries]
+    display_ids = [get_string_id(entry.display) for entry in entries]
+    if value_kind == VALUE_KIND_TEXT:
+        value_ids = [get_string_id(value) for value in values]
+
+    attribute_ids = [
+        get_string_id(json.dumps(entry.attributes, sort_keys=True)) if entry.attributes
+        else _NO_ATTRIBUTES
+        for entry in entries
+    ]
+
+    count = len(entries)
+    strings_size = sum(len(string) for string in strings)
+    layout = _get_layout(count, len(strings), strings_size)
+    data = bytearray(layout['size'])
+
+    _HEADER.pack_into(data, 0, MAGIC, FORMAT_VERSION, value_kind, count, len(strings),
+                      strings_size)
+
+    def pack_array(part, format_, items):
+        """Pack all the items in the given part of ``data``."""
+        struct.pack_into(str('<%d%s' % (len(items), format_)), data, layout[part], *items)
+
+    pack_array('values', 'q', values if value_kind == VALUE_KIND_INT else value_ids)
+    pack_array('constants', 'I', constant_ids)
+    pack_array('displays', 'I', display_ids)
+    pack_array('attributes', 'I', attribute_ids)
+
+    # Sorted indexes, strings being sorted by their utf-8 representation, used to search them.
+    positions = range(count)
+    pack_array('by_constant', 'I', sorted(positions, key=lambda pos: strings[constant_ids[pos]]))
+    pack_array('by_display', 'I', sorted(positions, key=lambda pos: strings[display_ids[pos]]))
+    if value_kind == VALUE_KIND_INT:
+        pack_array('by_value', 'I', sorted(positions, key=lambda pos: values[pos]))
+    else:
+        pack_array('by_value', 'I', sorted(positions, key=lambda pos: strings[value_ids[pos]]))
+
+    offset = 0
+    string_offsets = [0]
+    for string in strings:
+        offset += len(string)
+        string_offsets.append(offset)
+    pack_array('string_offsets', 'I', string_offsets)
+    data[layout['strings']:] = b''.join(strings)
+
+    return bytes(data)
+
+
+class PackedChoices(object):
+    """Read-only access to choices packed by ``pack_choices``, directly from a buffer.
+
+    Parameters
+    ----------
+    buffer : buffer
+        Any object supporting the buffer protocol (``bytes``, ``mmap``, shared memory...) holding
+        the data returned by ``pack_choices``. It's never copied.
+
+    Raises
+    ------
+    ValueError
+        If the buffer doesn't hold choices packed by ``pack_choices``.
+
+    Example
+    -------
+
+    >>> from extended_choices import Choices
+    >>> STATES = Choices(
+    ...     ('ONLINE',  1, 'Online'),
+    ...     ('DRAFT',   2, 'Draft'),
+    ...     ('OFFLINE', 3, 'Offline', {'hidden': True}),
+    ... )
+    >>> packed = PackedChoices(pack_choices(STATES))
+    >>> len(packed)
+    3
+    >>> packed.for_constant('OFFLINE').hidden
+    True
+    >>> packed.for_display('Draft').value
+    2
+    >>> packed.has_value(4), 3 in packed
+    (False, True)
+    >>> packed.DRAFT
+    2
+    >>> packed.choices
+    ((1, 'Online'), (2, 'Draft'), (3, 'Offline'))
+
+    Entries are created only once:
+
+    >>> packed.for_value(1) is packed.for_constant('ONLINE')
+    True
+
+    """
+
+    # Allow to easily change the ``ChoiceEntry`` class to use in subclasses.
+    ChoiceEntryClass = ChoiceEntry
+
+    def __init__(self, buffer):
+
+        self.buffer = buffer
+
+        magic, version, value_kind, count, nb_strings, strings_size = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("The buffer doesn't contain packed choices.")
+
+        self.value_kind = value_kind
+        self.count = count
+        self._layout = _get_layout(count, nb_strings, strings_size)
+
+        # ``ChoiceEntry`` instances already created, by position.
+        self._entries = {}
+
+    def __len__(self):
+        """Return the number of entries."""
+        return self.count
+
+    def __iter__(self):
+        """Iterate on choices as expected by django, ie tuples (value, display name).
+
+        Entries are not created.
+
+        """
+
+        for position in range(self.count):
+            yield (self._get_value(position),
+                   self._get_string(self._get_uint32('displays', position)))
+
+    @property
+    def choices(self):
+        """Property that returns a tuple formatted as expected by Django."""
+        return tuple(self)
+
+    def iter_entries(self):
+        """Iterate on all the ``ChoiceEntry``, in declaration order, creating them if needed."""
+        for position in range(self.count):
+            yield self.entry_at(position)
+
+    def __getitem__(self, key):
+        """Return the choice at the given position, or the value of the given constant.
+
+        Like for ``Choices``, an integer key returns the tuple (value, display name) at this
+        position, and a constant returns its value.
+
+        """
+
+        if isinstance(key, six.integer_types):
+            if key < 0:
+                key += self.count
+            if not 0 <= key < self.count:
+                raise IndexError(key)
+            return (self._get_value(key), self._get_string(self._get_uint32('displays', key)))
+
+        return self.for_constant(key).value
+
+    def __getattr__(self, name):
+        """Return the value of the given constant, like for ``Choices``."""
+        if name.startswith('_') or self.__dict__.get('buffer') is None:
+            raise AttributeError(name)
+        try:
+            return self.for_constant(name).value
+        except KeyError:
+            raise AttributeError("'%s' object has no attribute '%s'" % (
+                self.__class__.__name__, name))
+
+    def __repr__(self):
+        """Short representation, without the entries that may be numerous."""
+        return '<%s: %d entries>' % (self.__class__.__name__, self.count)
+
+    def _get_uint32(self, part, position):
+        """Return the uint32 at the given position in an array of the packed data."""
+        return _UINT32.unpack_from(self.buffer, self._layout[part] + 4 * position)[0]
+
+    def _get_string(self, string_id, decode=True):
+        """Return the string of the given id, decoded or not."""
+        start, end = _STRING_BOUNDS.unpack_from(
+            self.buffer, self._layout['string_offsets'] + 4 * string_id)
+        offset = self._layout['strings']
+        string = bytes(self.buffer[offset + start:offset + end])
+        return string.decode('utf-8') if decode else string
+
+    def _get_value(self, position):
+        """Return the value at the given position."""
+        value = _INT64.unpack_from(self.buffer, self._layout['values'] + 8 * position)[0]
+        if self.value_kind == VALUE_KIND_TEXT:
+            value = self._get_string(value)
+        return value
+
+    def _get_attributes(self, position):
+        """Return the additional attributes at the given position, decoded from JSON, or ``None``."""
+        string_id = self._get_uint32('attributes', position)
+        if string_id == _NO_ATTRIBUTES:
+            return None
+        return json.loads(self._get_string(string_id))
+
+    def _search(self, index, get_key, key):
+        """Binary search of a key using a sorted index.
+
+        Parameters
+        ----------
+        index : string
+            The part of the packed data holding the sorted positions.
+        get_key : callable
+            Returns, for a position, the key to compare with ``key``.
+        key : ?
+            The key to search.
+
+        Returns
+        -------
+        int
+            The position of the entry having this key, or ``-1`` if not found.
+
+        """
+
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            position = self._get_uint32(index, middle)
+            current = get_key(position)
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return position
+        return -1
+
+    def _search_string(self, index, column, string):
+        """Search a string (constant or display, or value if strings) using a sorted index."""
+        if not isinstance(string, six.string_types):
+            return -1
+        if column == 'values':
+            get_key = lambda pos: self._get_string(
+                _INT64.unpack_from(self.buffer, self._layout['values'] + 8 * pos)[0], False)
+        else:
+            get_key = lambda pos: self._get_string(self._get_uint32(column, pos), False)
+        return self._search(index, get_key, six.text_type(string).encode('utf-8'))
+
+    def position_for_constant(self, constant):
+        """Return the position of the entry having the given constant, or ``-1``."""
+        return self._search_string('by_constant', 'constants', constant)
+
+    def position_for_display(self, display):
+        """Return the position of the entry having the given display name, or ``-1``."""
+        return self._search_string('by_display', 'displays', display)
+
+    def position_for_value(self, value):
+        """Return the position of the entry having the given value, or ``-1``."""
+        if self.value_kind == VALUE_KIND_TEXT:
+            return self._search_string('by_value', 'values', value)
+        if isinstance(value, bool) or not isinstance(value, six.integer_types):
+            # Accept other numbers equal to an integer, like ``1.0``, as a dict would do.
+            try:
+                if value != int(value):
+                    return -1
+                value = int(value)
+            except (TypeError, ValueError, OverflowError):
+                return -1
+        return self._search('by_value', self._get_value, value)
+
+    def entry_at(self, position):
+        """Return the ``ChoiceEntry`` at the given position, creating it if needed.
+
+        Parameters
+        ----------
+        position : int
+            The position of the entry, in declaration order.
+
+        Returns
+        -------
+        ChoiceEntry
+            Always the same instance for a given position.
+
+        """
+
+        try:
+            return self._entries[position]
+        except KeyError:
+            pass
+
+        if not 0 <= position < self.count:
+            raise IndexError(position)
+
+        entry = self.ChoiceEntryClass((
+            self._get_string(self._get_uint32('constants', position)),
+            self._get_value(position),
+            self._get_string(self._get_uint32('displays', position)),
+            self._get_attributes(position),
+        ))
+
+        # If another thread created it meanwhile, use the same one.
+        return self._entries.setdefault(position, entry)
+
+    def _entry_for(self, position, key):
+        """Return the entry at the given position, or raise ``KeyError`` with ``key``."""
+        if position < 0:
+            raise KeyError(key)
+        return self.entry_at(position)
+
+    def for_constant(self, constant):
+        """Returns the ``ChoiceEntry`` for the given constant. Raise ``KeyError`` if not found."""
+        return self._entry_for(self.position_for_constant(constant), constant)
+
+    def for_value(self, value):
+        """Returns the ``ChoiceEntry`` for the given value. Raise ``KeyError`` if not found."""
+        return self._entry_for(self.position_for_value(value), value)
+
+    def for_display(self, display):
+        """Returns the ``ChoiceEntry`` for the given display. Raise ``KeyError`` if not found."""
+        return self._entry_for(self.position_for_display(display), display)
+
+    def has_constant(self, constant):
+        """Check if the given constant exists, without creating any entry."""
+        return self.position_for_constant(constant) >= 0
+
+    def has_value(self, value):
+        """Check if the given value exists, without creating any entry."""
+        return self.position_for_value(value) >= 0
+
+    def has_display(self, display):
+        """Check if the given display name exists, without creating any entry."""
+        return self.position_for_display(display) >= 0
+
+    def __contains__(self, value):
+        """Check if the given value exists, without creating any entry."""
+        return self.has_value(value)
@@ -0,0 +1,205 @@
+"""Provides references to ``Choices`` instances, to write them in Django migrations by import path.
+
+By default, Django writes the whole list of ``(value, display)`` pairs of the choices of a field
+in each migration altering it, and compares these lists each time ``makemigrations`` runs. With
+big catalogs, migrations become huge, and ``makemigrations`` slow.
+
+The model fields of ``extended_choices`` deconstruct their choices as a ``ChoicesReference`` when
+they are a ``Choices`` instance having an ``import_path``. It is written in migrations as this
+import path, and compared by identity or by fingerprint instead of item by item.
+
+Example
+-------
+
+.. code-block:: python
+
+    STATES = Choices(
+        ('ONLINE', 1, 'Online'),
+        ('DRAFT', 2, 'Draft'),
+        import_path='myapp.constants.STATES',
+    )
+
+    # In a migration:
+    ('state', extended_choices.fields.ExtendedChoiceIntegerField(choices=myapp.constants.STATES))
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+from importlib import import_module
+
+import six
+
+try:
+    from django.db.migrations.serializer import BaseSerializer, Serializer
+except ImportError:
+    BaseSerializer, Serializer = object, None
+
+__all__ = [
+    'ChoicesReference',
+    'ChoicesReferenceSerializer',
+    'get_fingerprint',
+    'register_serializer',
+]
+
+
+def _build_fingerprint(choices):
+    """Compute the fingerprint of the ``(value, display)`` pairs of ``choices``."""
+
+    content = repr([(entry.value.original_value, six.text_type(entry.display))
+                    for entry in choices.entries])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def get_fingerprint(choices):
+    """Return a hash of the ``(value, display)`` pairs of a ``Choices`` instance.
+
+    It is cached in ``choices`` until new choices are added, per language if some display names
+    are lazy.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance.
+
+    Returns
+    -------
+    string
+        The sha256 hex digest of the pairs.
+
+    Example
+    -------
+
+    >>> from extended_choices import Choices
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'))
+    >>> get_fingerprint(STATES) == get_fingerprint(Choices(('A', 1, 'Online'), ('B', 2, 'Draft')))
+    True
+    >>> get_fingerprint(STATES) == get_fingerprint(Choices(('ONLINE', 1, 'Online')))
+    False
+
+    """
+
+    from .expressions import _get_cached
+    return _get_cached(choices, ('fingerprint', ), _build_fingerprint)
+
+
+def get_module_path(import_path):
+    """Return the path of the module from the import path of an object.
+
+    Parameters
+    ----------
+    import_path : string
+        The import path of the object, like ``myapp.constants.STATES.NOT_ONLINE``.
+
+    Returns
+    -------
+    string
+        The longest importable module path, like ``myapp.constants``.
+
+    Raises
+    ------
+    ImportError
+        If no module can be imported.
+
+    Example
+    -------
+
+    >>> get_module_path('extended_choices.helpers.ChoiceEntry.constant')
+    'extended_choices.helpers'
+
+    """
+
+    parts = import_path.split('.')
+
+    for index in range(len(parts) - 1, 0, -1):
+        module_path = '.'.join(parts[:index])
+        try:
+            import_module(module_path)
+        except ImportError:
+            continue
+        return module_path
+
+    raise ImportError("No module found in '%s'." % import_path)
+
+
+class ChoicesReference(object):
+    """Reference to a ``Choices`` instance having an ``import_path``, used in migrations.
+
+    Two references are equal if they are for the same instance, or for instances having the same
+    import path and the same fingerprint (see ``get_fingerprint``), so the entries are not
+    compared one by one.
+
+    Parameters
+    ----------
+    choices : Choices
+        The referenced ``Choices`` instance. It must have an ``import_path``.
+
+    Example
+    -------
+
+    >>> from extended_choices import Choices
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), import_path='myapp.constants.STATES')
+    >>> ChoicesReference(STATES)
+    <ChoicesReference: myapp.constants.STATES>
+    >>> ChoicesReference(STATES) == ChoicesReference(STATES)
+    True
+
+    """
+
+    def __init__(self, choices):
+        if not choices.import_path:
+            raise ValueError("Only a ``Choices`` instance having an ``import_path`` can be "
+                             "referenced.")
+        self.choices = choices
+        self.import_path = choices.import_path
+
+    def __eq__(self, other):
+        if not isinstance(other, ChoicesReference):
+            return NotImplemented
+        if self.choices is other.choices:
+            return True
+        if self.import_path != other.import_path:
+            return False
+        return get_fingerprint(self.choices) == get_fingerprint(other.choices)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<%s: %s>' % (self.__class__.__name__, self.import_path)
+
+
+class ChoicesReferenceSerializer(BaseSerializer):
+    """Migration serializer writing a ``ChoicesReference`` as the import path of its ``Choices``."""
+
+    def serialize(self):
+        import_path = self.value.import_path
+        return import_path, {'import %s' % get_module_path(import_path)}
+
+
+def register_serializer():
+    """Register ``ChoicesReferenceSerializer`` for the ``ChoicesReference`` instances.
+
+    Returns
+    -------
+    boolean
+        ``True`` if registered, ``False`` if not supported by Django (before 2.2).
+
+    """
+
+    if Serializer is None or not hasattr(Serializer, 'register'):
+        return False
+
+    Serializer.register(ChoicesReference, ChoicesReferenceSerializer)
+    return True
@@ -0,0 +1,394 @@
+"""Provides functions to export a ``Choices`` instance to a compact schema, and to load it back.
+
+The schema is a dict, with one list for each column (constants, values, displays and
+attributes), that can be shared as JSON, or msgpack if installed.
+
+Schemas may come from other services, so loading one never imports a module: the class of the
+``Choices`` must be an already loaded subclass of the expected class, and its ``dict_class``
+one of ``ALLOWED_DICT_CLASSES``. The structure of the schema is always checked.
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import json
+from collections import Counter, OrderedDict
+
+import six
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+__all__ = [
+    'ALLOWED_DICT_CLASSES',
+    'SCHEMA_VERSION',
+    'LOADABLE_SCHEMA_VERSIONS',
+    'choices_to_dict',
+    'choices_from_dict',
+    'compute_fingerprint',
+    'choices_to_msgpack',
+    'choices_from_msgpack',
+]
+
+# Version of the schema, to be incremented each time its format changes.
+SCHEMA_VERSION = 2
+
+# Versions of the schema that can still be loaded. Version 1 has no ``codes``, ``fallback`` and
+# ``track_unknown``.
+LOADABLE_SCHEMA_VERSIONS = (1, SCHEMA_VERSION)
+
+# The classes that can be used as ``dict_class`` by a loaded ``Choices``.
+ALLOWED_DICT_CLASSES = (dict, OrderedDict)
+
+
+def _get_class_path(klass):
+    """Return the python path of the given class."""
+    return '%s.%s' % (klass.__module__, klass.__name__)
+
+
+def _find_class(path, classes):
+    """Return the class having the given python path among ``classes``, or ``None``."""
+
+    for klass in classes:
+        if _get_class_path(klass) == path:
+            return klass
+    return None
+
+
+def _get_subclasses(klass):
+    """Return ``klass`` and all its subclasses already loaded."""
+
+    subclasses = [klass]
+    for subclass in subclasses:
+        subclasses.extend(sub for sub in subclass.__subclasses__() if sub not in subclasses)
+    return subclasses
+
+
+def _to_hashable(value):
+    """Convert the lists in a value to tuples, as JSON and msgpack load tuples as lists."""
+
+    if isinstance(value, list):
+        return tuple(_to_hashable(item) for item in value)
+    return value
+
+
+def _is_int(value):
+    """Tell if the value is an integer, but not a boolean."""
+    return isinstance(value, six.integer_types) and not isinstance(value, bool)
+
+
+def _check_structure(data, obj):
+    """Check the columns, subsets and options of a schema, and return its choices and subsets.
+
+    These checks are cheap, and always done, as a schema given by another service is not
+    trusted, even with a valid fingerprint: they ensure that all the columns have an entry for
+    each choice, that constants, values, display names and subset names are unique, that
+    constants and subset names don't replace the attributes of ``obj``, an empty instance of the
+    ``Choices`` class to load, that subsets, codes and the fallback only use known constants, and
+    that codes and ``track_unknown`` are integers.
+
+    Returns
+    -------
+    tuple
+        The list of the ``(constant, value, display, attributes)`` choices, and the list of the
+        ``(name, constants)`` subsets.
+
+    Raises
+    ------
+    ValueError
+        If a check fails.
+
+    """
+
+    constants, values, displays = data['constants'], data['values'], data['displays']
+    attributes = data['attributes']
+    if attributes is None:
+        attributes = [None] * len(constants)
+
+    for column in (constants, values, displays, attributes):
+        if not isinstance(column, list) or len(column) != len(constants):
+            raise ValueError("The columns of the schema must be lists of the same length.")
+
+    values = [_to_hashable(value) for value in values]
+
+    if not all(isinstance(name, six.string_types) for name in constants + displays):
+        raise ValueError("The constants and display names must be strings.")
+    if not all(item is None or isinstance(item, dict) for item in attributes):
+        raise ValueError("The attributes must be dicts.")
+
+    try:
+        unique = all(len(set(column)) == len(column) for column in (constants, values, displays))
+    except TypeError:
+        raise ValueError("The values must be hashable.")
+    if not unique:
+        raise ValueError("The constants, values and display names must be unique.")
+
+    if not isinstance(data['subsets'], list) or not all(
+            isinstance(subset, list) and len(subset) == 2 for subset in data['subsets']):
+        raise ValueError("The subsets must be a list of ``[name, constants]`` lists.")
+    subsets = [(name, subset_constants) for name, subset_constants in data['subsets']]
+    names = [name for name, __ in subsets]
+    if not all(isinstance(name, six.string_types) for name in names):
+        raise ValueError("The subset names must be strings.")
+
+    bad_names = [name for name in constants + names if hasattr(obj, name)]
+    bad_names += sorted(name for name, count in Counter(constants + names).items() if count > 1)
+    if bad_names:
+        raise ValueError("Constants and subset names cannot replace attributes: %s." % bad_names)
+
+    known_constants = set(constants)
+    for name, subset_constants in subsets:
+        # Checking the types first, as ``issuperset`` fails on unhashable items.
+        if not isinstance(subset_constants, list) or not all(
+                isinstance(constant, six.string_types) for constant in subset_constants):
+            raise ValueError("The subset '%s' must be a list of constants." % name)
+        if not known_constants.issuperset(subset_constants):
+            raise ValueError("The subset '%s' must be a list of constants." % name)
+
+    codes = data.get('codes') or {}
+    if not isinstance(codes, dict) or not all(
+            isinstance(constant, six.string_types) and _is_int(code)
+            for constant, code in codes.items()):
+        raise ValueError("The codes must be a dict of integers by constant.")
+    if not known_constants.issuperset(codes):
+        raise ValueError("The codes must be a dict of integers by constant.")
+
+    fallback = data.get('fallback')
+    if fallback is not None and not isinstance(fallback, six.string_types):
+        raise ValueError("The fallback must be one of the constants.")
+    if fallback is not None and fallback not in known_constants:
+        raise ValueError("The fallback must be one of the constants.")
+
+    track_unknown = data.get('track_unknown')
+    if track_unknown is not None and not (_is_int(track_unknown) and track_unknown > 0):
+        raise ValueError("``track_unknown`` must be a positive integer.")
+
+    return list(zip(constants, values, displays, attributes)), subsets
+
+
+def compute_fingerprint(data):
+    """Compute the fingerprint of a schema, ignoring its ``fingerprint`` key.
+
+    It's not a signature: anyone can compute it. It detects changes in the schema.
+
+    Parameters
+    ----------
+    data : dict
+        The schema, as returned by ``choices_to_dict``.
+
+    Returns
+    -------
+    string
+        The sha256 hex digest of the canonical JSON representation of the schema.
+
+    """
+
+    content = dict((key, value) for key, value in data.items() if key != 'fingerprint')
+    serialized = json.dumps(content, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def choices_to_dict(choices):
+    """Export a ``Choices`` instance to a dict, in a versioned columnar format.
+
+    Parameters
+    ----------
+    choices : Choices
+        The ``Choices`` instance to export.
+
+    Returns
+    -------
+    dict
+        A dict with these entries:
+
+        * ``version``: the version of the schema
+        * ``class``: the python path of the ``Choices`` class (or subclass) to use
+        * ``dict_class``: the python path of the ``dict_class`` of the ``Choices`` instance
+        * ``mutable``: if new choices can be added to the ``Choices`` instance
+        * ``constants``, ``values``, ``displays``: one list for each, with one entry per choice
+        * ``attributes``: the additional attributes of each choice, or ``None`` if none of the
+          choices have additional attributes
+        * ``subsets``: a list with the name and the list of constants of each subset
+        * ``codes``: the integer code of each constant having one (see ``Choices.set_codes``)
+        * ``fallback``: the constant of the entry returned for unknown keys, or ``None``
+        * ``track_unknown``: the maximum number of unknown keys tracked, or ``None``
+        * ``fingerprint``: a hash of all the other entries
+
+    Notes
+    -----
+    Displays are converted to strings, so lazy ones are translated in the current language.
+    Values and additional attributes must be serializable in JSON.
+
+    Example
+    -------
+
+    >>> from extended_choices import Choices
+    >>> STATES = Choices(
+    ...     ('ONLINE',  1, 'Online'),
+    ...     ('DRAFT',   2, 'Draft'),
+    ...     ('OFFLINE', 3, 'Offline', {'hidden': True}),
+    ... )
+    >>> STATES.add_subset('NOT_ONLINE', ('DRAFT', 'OFFLINE'))
+    >>> data = choices_to_dict(STATES)
+    >>> data['class'], data['version']
+    ('extended_choices.choices.Choices', 2)
+    >>> data['constants'], data['values'], data['displays']
+    (['ONLINE', 'DRAFT', 'OFFLINE'], [1, 2, 3], ['Online', 'Draft', 'Offline'])
+    >>> data['attributes']
+    [None, None, {'hidden': True}]
+    >>> data['subsets']
+    [['NOT_ONLINE', ['DRAFT', 'OFFLINE']]]
+
+    """
+
+    entries = choices.entries
+
+    attributes = [entry.attributes or None for entry in entries]
+    if not any(attributes):
+        attributes = None
+
+    data = {
+        'version': SCHEMA_VERSION,
+        'class': _get_class_path(choices.__class__),
+        'dict_class': _get_class_path(choices.dict_class),
+        'mutable': choices._mutable,  # pylint: disable=protected-access
+        'constants': [entry.constant.original_value for entry in entries],
+        'values': [entry.value.original_value for entry in entries],
+        'displays': [six.text_type(entry.display) for entry in entries],
+        'attributes': attributes,
+        'subsets': [
+            [name, [constant.original_value for constant in getattr(choices, name).constants]]
+            for name in choices.subsets
+        ],
+        'codes': dict(choices.codes),
+        'fallback': choices.fallback,
+        'track_unknown': choices.unknown_values.max_size if choices.unknown_values else None,
+    }
+    data['fingerprint'] = compute_fingerprint(data)
+
+    return data
+
+
+def choices_from_dict(data, base_class=None):
+    """Create a ``Choices`` instance from a dict created by ``choices_to_dict``.
+
+    Parameters
+    ----------
+    data : dict
+        The schema, as returned by ``choices_to_dict``.
+    base_class : type, optional
+        If set, the class defined in the schema must be this class or a subclass.
+        ``extended_choices.Choices`` by default.
+
+    Returns
+    -------
+    Choices
+        The new ``Choices`` instance (or instance of the class defined in the schema).
+
+    Raises
+    ------
+    ValueError
+        If the version of the schema is not in ``LOADABLE_SCHEMA_VERSIONS``, if its class is not an already loaded
+        subclass of ``base_class``, if its ``dict_class`` is not in ``ALLOWED_DICT_CLASSES``, or
+        if the choices are not valid.
+
+    Notes
+    -----
+    No module is imported: the classes are looked up in the loaded ones. The structure of the
+    schema is always checked (see ``_check_structure``), and lists in values are converted to
+    tuples. If the schema carries a valid fingerprint, entries are then added directly, without
+    going through ``add_choices``. Else all the usual checks of ``add_choices`` are done.
+
+    Example
+    -------
+
+    >>> from extended_choices import AutoChoices
+    >>> STATES = AutoChoices('ONLINE', 'DRAFT', 'OFFLINE')
+    >>> STATES.add_subset('NOT_ONLINE', ('DRAFT', 'OFFLINE'))
+    >>> loaded = choices_from_dict(choices_to_dict(STATES))
+    >>> loaded
+    [('ONLINE', 'online', 'Online'), ('DRAFT', 'draft', 'Draft'), ('OFFLINE', 'offline', 'Offline')]
+    >>> loaded.__class__.__name__
+    'AutoChoices'
+    >>> loaded.NOT_ONLINE
+    [('DRAFT', 'draft', 'Draft'), ('OFFLINE', 'offline', 'Offline')]
+
+    """
+
+    from .choices import Choices
+    if base_class is None:
+        base_class = Choices
+
+    if data.get('version') not in LOADABLE_SCHEMA_VERSIONS:
+        raise ValueError("Unsupported schema version: %s." % data.get('version'))
+
+    klass = _find_class(data['class'], _get_subclasses(base_class))
+    if klass is None:
+        raise ValueError("'%s' is not a loaded subclass of '%s'." % (
+            data['class'], _get_class_path(base_class)))
+
+    dict_class = _find_class(data['dict_class'], ALLOWED_DICT_CLASSES)
+    if dict_class is None:
+        raise ValueError("'%s' is not an allowed dict class." % data['dict_class'])
+
+    options = {
+        'dict_class': dict_class,
+        'fallback': data.get('fallback'),
+        'track_unknown': data.get('track_unknown'),
+    }
+    obj = klass(**options)
+    choices, subsets = _check_structure(data, obj)
+    codes = data.get('codes') or {}
+
+    if data.get('fingerprint') != compute_fingerprint(data):
+        # Changed: do all the usual checks.
+        obj = klass(*choices, mutable=data['mutable'], codes=codes, **options)
+        for name, constants in subsets:
+            obj.add_subset(name, constants)
+        return obj
+
+    # Unchanged, and checked: directly publish the entries and subsets.
+    # pylint: disable=protected-access
+    obj._publish_entries([klass.ChoiceEntryClass(choice) for choice in choices])
+
+    for name, constants in subsets:
+        subset = klass(dict_class=dict_class, mutable=False)
+        subset._publish_entries([obj.constants[constant] for constant in constants])
+        obj._share_unknown_handling(subset)
+        setattr(obj, name, subset)
+        obj.subsets = obj.subsets + [name]
+
+    # Also sets the codes of the subsets, and checks that the codes are unique.
+    obj.set_codes(codes)
+
+    obj._mutable = bool(data['mutable'])
+
+    return obj
+
+
+def _check_msgpack():
+    """Raise an ``ImportError`` if msgpack is not installed."""
+    if msgpack is None:
+        raise ImportError("The ``msgpack`` package is needed to use msgpack.")
+
+
+def choices_to_msgpack(choices):
+    """Export a ``Choices`` instance to msgpack, using ``choices_to_dict``."""
+    _check_msgpack()
+    return msgpack.packb(choices_to_dict(choices), use_bin_type=True)
+
+
+def choices_from_msgpack(packed, base_class=None):
+    """Create a ``Choices`` instance from msgpack data, using ``choices_from_dict``."""
+    _check_msgpack()
+    return choices_from_dict(msgpack.unpackb(packed, raw=False), base_class)
@@ -0,0 +1,162 @@
+"""Provides a way to share a packed ``Choices`` between processes, via shared memory.
+
+Typical usage is with pre-fork servers (gunicorn, uwsgi...): the master process packs the choices
+in shared memory before forking, then each worker does its lookups directly in this memory,
+instead of each one slowly getting its own copy of the pages holding all the python objects of
+the ``Choices`` (because of the reference counting).
+
+Example
+-------
+
+In the master process:
+
+.. code-block:: python
+
+    from extended_choices.shared import SharedChoices
+    SHARED_TARIFFS = SharedChoices.create(TARIFFS)
+
+Then in the workers:
+
+.. code-block:: python
+
+    SHARED_TARIFFS.for_value(value).display
+
+Notes
+-----
+
+The documentation format in this file is numpydoc_.
+
+.. _numpydoc: https://github.com/numpy/numpy/blob/master/doc/HOWTO_DOCUMENT.rst.txt
+
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import mmap
+import os
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+
+from .packed import PackedChoices, pack_choices
+
+__all__ = [
+    'SharedChoices',
+]
+
+# Names of the blocks created by this process (or by its parent before forking), registered in
+# the resource tracker shared with the processes attaching them from the same tree.
+_created_names = set()
+
+
+class SharedChoices(PackedChoices):
+    """Packed choices, stored in memory that can be shared between processes.
+
+    Instances should be created with ``create`` or ``attach``.
+
+    Parameters
+    ----------
+    memory : mmap.mmap or multiprocessing.shared_memory.SharedMemory
+        The memory holding the packed choices.
+
+    Example
+    -------
+
+    >>> from extended_choices import Choices
+    >>> STATES = Choices(('ONLINE', 1, 'Online'), ('DRAFT', 2, 'Draft'))
+    >>> shared = SharedChoices.create(STATES)
+    >>> shared.for_value(1).display
+    'Online'
+    >>> shared.close()
+
+    """
+
+    def __init__(self, memory):
+        self.memory = memory
+        super(SharedChoices, self).__init__(memory if isinstance(memory, mmap.mmap) else memory.buf)
+
+    @classmethod
+    def create(cls, choices, name=None):
+        """Pack a ``Choices`` instance in a new block of shared memory.
+
+        Parameters
+        ----------
+        choices : Choices
+            The ``Choices`` instance to pack. See ``extended_choices.packed.pack_choices``.
+        name : string, optional
+            If not set, an anonymous shared memory map is used, available to the processes
+            forked after its creation. If set, a named block is created, using
+            ``multiprocessing.shared_memory`` (Python 3.8+), other processes being able to use it
+            via ``attach``.
+
+        Returns
+        -------
+        SharedChoices
+            The instance to use to access the choices.
+
+        """
+
+        data = pack_choices(choices)
+
+        if name is None:
+            memory = mmap.mmap(-1, len(data))
+            memory.write(data)
+        else:
+            cls._check_shared_memory()
+            memory = shared_memory.SharedMemory(name=name, create=True, size=len(data))
+            memory.buf[:len(data)] = data
+            _created_names.add(memory.name)
+
+        return cls(memory)
+
+    @classmethod
+    def attach(cls, name):
+        """Access choices packed by another process via ``create`` with a ``name``.
+
+        Parameters
+        ----------
+        name : string
+            The name of the shared memory block.
+
+        Returns
+        -------
+        SharedChoices
+            The instance to use to access the choices.
+
+        """
+
+        cls._check_shared_memory()
+
+        # Only the creator is responsible for destroying the block, so it must not be tracked
+        # by the current process.
+        try:
+            memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13, it's always tracked on posix, so we stop tracking it, except if
+            # it's the registration of the creator, in the same resource tracker.
+            memory = shared_memory.SharedMemory(name=name)
+            if os.name == 'posix' and memory.name not in _created_names:
+                resource_tracker.unregister(memory._name, 'shared_memory')  # pylint: disable=protected-access
+
+        return cls(memory)
+
+    @staticmethod
+    def _check_shared_memory():
+        """Raise an ``ImportError`` if named shared memory is not available."""
+        if shared_memory is None:
+            raise ImportError("Named shared memory needs ``multiprocessing.shared_memory`` "
+                              "(Python 3.8+).")
+
+    def close(self):
+        """Close the access to the shared memory for the current process."""
+        self.buffer = None
+        self._entries = {}
+        self.memory.close()
+
+    def unlink(self):
+        """Destroy a named shared memory block. To be called once, by the creator."""
+        if not isinstance(self.memory, mmap.mmap):
+            self.memory.unlink()
+            _created_names.discard(self.memory.name)
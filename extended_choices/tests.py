@@ -20,28 +20,96 @@ try:
 except ImportError:
     import pickle
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 from collections import OrderedDict
+from decimal import Decimal
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
 import unittest
 
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
 import django
+import six
 
 
 # Minimal django conf to test a real field.
 from django.conf import settings
-settings.configure(DATABASE_ENGINE='sqlite3')
+settings.configure(
+    DATABASE_ENGINE='sqlite3',
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+)
+
+# Init django to define test models, only needed starting from django 1.7
+if django.VERSION >= (1, 7):
+    django.setup()
+
+from django.db import connection, models
 
 from django.core.exceptions import ValidationError
 from django.utils.functional import Promise
 from django.utils.translation import ugettext_lazy
 
 from .choices import Choices, OrderedChoices, AutoDisplayChoices, AutoChoices
-from .fields import NamedExtendedChoiceFormField
-from .helpers import ChoiceAttributeMixin, ChoiceEntry
+from .choicesets import ChoiceSet, get_bit_tables
+from .columnar import INT_TYPECODE, ColumnarChoices, _INT_MAX, _INT_MIN
+from .fields import (ChoicesBitmaskField, ExtendedChoiceBigIntegerField, ExtendedChoiceCharField,
+                     ExtendedChoiceEncodedField, ExtendedChoiceIntegerField, ExtendedChoicePositiveSmallIntegerField,
+                     ExtendedChoiceSmallIntegerField, NamedExtendedChoiceFormField)
+from .helpers import (MIN_INTERNED_STRINGS_PRUNING_SIZE, ChoiceAttributeMixin, ChoiceEntry,
+                      disable_interning, enable_interning, get_interning_stats)
+from .__main__ import main
+from .constraints import check_constraint, get_index_name, subset_index, subset_indexes
+from .expressions import CASE_CHUNK_SIZE
+from .lookups import ChoicesValue, get_lookup_sql
+from .references import ChoicesReference, get_fingerprint
+from .inspector import benchmark_choices, find_choices, inspect_choices
+from .instrumentation import get_lookup_stats, instrument, uninstrument
+from .mmap import MmapChoices, build_mmap_file
+from .packed import PackedChoices, pack_choices
+from .schema import compute_fingerprint, msgpack
+from .shared import SharedChoices, shared_memory
+
+
+# ``Choices`` pickled by reference, so it must be available at module level.
+REFERENCED_CHOICES = Choices(
+    ('ONE', 1, 'One for the money', {'one': 'money'}),
+    ('TWO', 2, 'Two for the show'),
+    ('THREE', 3, 'Three to get ready'),
+    import_path='%s.REFERENCED_CHOICES' % __name__,
+)
+REFERENCED_CHOICES.add_subset('ODD', ('ONE', 'THREE'))
+
+
+class ChoicesModel(models.Model):
+    """Model to test the use of ``Choices`` in the database."""
+
+    state = models.IntegerField(null=True)
+    name = models.CharField(max_length=20, null=True)
+    extended_state = ExtendedChoiceIntegerField(choices=REFERENCED_CHOICES, null=True)
+
+    class Meta:
+        app_label = 'extended_choices'
 
 
 class BaseTestCase(unittest.TestCase):
     """Base test case that define a test ``Choices`` instance with a subset."""
 
+    # The ``Choices`` class (or subclass) to test.
+    choices_class = Choices
+
     def setUp(self):
         super(BaseTestCase, self).setUp()
 
@@ -50,7 +118,7 @@ class BaseTestCase(unittest.TestCase):
 
     def init_choices(self):
 
-        self.MY_CHOICES = Choices(
+        self.MY_CHOICES = self.choices_class(
             ('ONE', 1, 'One for the money', {'one': 'money'}),
             ('TWO', 2, 'Two for the show'),
             ('THREE', 3, 'Three to get ready'),
@@ -103,6 +171,381 @@ class FieldsTestCase(BaseTestCase):
             field.clean(1)
         self.assertEqual(raise_context.exception.code, 'invalid-choice-type')
 
+    def assert_same_validation(self, field, django_field, value):
+        """Assert that both fields raise the same error, if any, when validating ``value``."""
+
+        errors = []
+        for tested_field in (field, django_field):
+            try:
+                tested_field.validate(value, None)
+            except ValidationError as exc:
+                errors.append((exc.code, exc.params, exc.messages))
+            else:
+                errors.append(None)
+
+        self.assertEqual(errors[0], errors[1])
+        return errors[0]
+
+    def test_extended_choice_model_fields_validation(self):
+        """Test that the model fields validate the values like Django."""
+
+        # Init django, only needed starting from django 1.7
+        if django.VERSION >= (1, 7):
+            django.setup()
+
+        from django.db import models
+
+        for field_class, django_field_class, choices, valid, invalid in (
+            (ExtendedChoiceIntegerField, models.IntegerField, self.MY_CHOICES, 2, 4),
+            (ExtendedChoiceSmallIntegerField, models.SmallIntegerField, self.MY_CHOICES, 2, 4),
+            (ExtendedChoiceCharField, models.CharField, Choices(('A', 'a', 'A'), ('B', 'b', 'B')),
+             'a', 'c'),
+        ):
+            for kwargs in ({}, {'null': True, 'blank': True}):
+                field = field_class(choices=choices, max_length=1, **kwargs)
+                django_field = django_field_class(choices=choices, max_length=1, **kwargs)
+                self.assertIsNone(self.assert_same_validation(field, django_field, valid))
+                for value in (invalid, None, '', [], choices.for_value(valid).display):
+                    self.assert_same_validation(field, django_field, value)
+                self.assertEqual(
+                    self.assert_same_validation(field, django_field, invalid)[0],
+                    'invalid_choice',
+                )
+
+        # A subset can be used to restrict the valid values.
+        field = ExtendedChoiceIntegerField(choices=self.MY_CHOICES.ODD)
+        field.validate(self.MY_CHOICES.THREE, None)
+        with self.assertRaises(ValidationError):
+            field.validate(self.MY_CHOICES.TWO, None)
+
+        # Django validation is used if choices are not a ``Choices`` instance.
+        field = ExtendedChoiceIntegerField(choices=[(1, 'One')])
+        field.validate(1, None)
+        with self.assertRaises(ValidationError):
+            field.validate(2, None)
+
+    def test_extended_choice_model_fields_do_not_iterate_choices(self):
+        """Test that the validation does not iterate on the choices."""
+
+        class NotIterableChoices(Choices):
+            def __iter__(self):
+                raise AssertionError("The choices should not be iterated.")
+
+        field = ExtendedChoiceIntegerField(choices=NotIterableChoices(('ONE', 1, 'One')))
+        field.validate(1, None)
+        with self.assertRaises(ValidationError):
+            field.validate(2, None)
+
+    def test_extended_choice_model_fields_display(self):
+        """Test that ``get_FOO_display`` is replaced, and caches the display names per language."""
+
+        # Init django, only needed starting from django 1.7
+        if django.VERSION >= (1, 7):
+            django.setup()
+
+        from django.db import models
+        from django.utils import translation
+
+        choices = Choices(
+            ('ONE', 1, 'One'),
+            ('TWO', 2, ugettext_lazy('Two')),
+        )
+
+        class DisplayModel(models.Model):
+            state = ExtendedChoiceIntegerField(choices=choices)
+            django_state = models.IntegerField(choices=choices)
+            own_state = ExtendedChoiceIntegerField(choices=choices)
+
+            def get_own_state_display(self):
+                return 'own'
+
+            class Meta:
+                app_label = 'extended_choices'
+
+        field = DisplayModel._meta.get_field('state')
+
+        for value in (1, 2, 3, None):
+            instance = DisplayModel(state=value, django_state=value, own_state=value)
+            self.assertEqual(instance.get_state_display(), instance.get_django_state_display())
+            self.assertEqual(instance.get_own_state_display(), 'own')
+
+        self.assertIsInstance(DisplayModel(state=2).get_state_display(), six.text_type)
+        self.assertEqual(field.get_choice_display([1]), '[1]')
+
+        # Only known values are cached, per language.
+        with translation.override('fr'):
+            self.assertEqual(DisplayModel(state=2).get_state_display(), 'Two')
+        self.assertEqual(field._lazy_display_cache['fr'], {2: 'Two'})
+        self.assertEqual(field._display_cache, {1: 'One'})
+
+        # The cache is used.
+        field._lazy_display_cache['fr'][2] = 'Deux'
+        with translation.override('fr'):
+            self.assertEqual(DisplayModel(state=2).get_state_display(), 'Deux')
+        with translation.override('en'):
+            self.assertEqual(DisplayModel(state=2).get_state_display(), 'Two')
+
+    def test_extended_choice_model_fields_database_values(self):
+        """Test that values are loaded as the choice attributes, and saved as plain values."""
+
+        # Init django, only needed starting from django 1.7
+        if django.VERSION >= (1, 7):
+            django.setup()
+
+        from django.db import connection, models
+
+        # Only the values of ``Choices`` with an ``import_path`` are loaded as choice attributes.
+        choices = REFERENCED_CHOICES
+        char_choices = Choices(('A', 'a', 'A'), ('B', 'b', 'B'))
+
+        class DatabaseModel(models.Model):
+            state = ExtendedChoiceSmallIntegerField(choices=choices, null=True)
+            letter = ExtendedChoiceCharField(choices=char_choices, max_length=1)
+            django_state = models.SmallIntegerField(choices=choices, null=True)
+            other_state = ExtendedChoiceSmallIntegerField(choices=self.MY_CHOICES, null=True)
+
+            class Meta:
+                app_label = 'extended_choices'
+
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(DatabaseModel)
+        self.addCleanup(self.drop_table, DatabaseModel)
+
+        field = DatabaseModel._meta.get_field('state')
+        self.assertEqual(field.get_prep_value(choices.ONE), 1)
+        self.assertIs(type(field.get_prep_value(choices.ONE)), int)
+        self.assertIs(type(DatabaseModel._meta.get_field('letter').get_prep_value(char_choices.A)),
+                      type('a'))
+
+        DatabaseModel.objects.create(state=choices.ONE, letter=char_choices.A, django_state=1,
+                                     other_state=self.MY_CHOICES.ONE)
+        DatabaseModel.objects.create(state=4, letter='c', django_state=None)
+        DatabaseModel.objects.create(state=None, letter='b', django_state=None)
+
+        first, unknown, empty = DatabaseModel.objects.order_by('pk')
+        self.assertIs(first.state, choices.ONE)
+        self.assertEqual(first.state.display, 'One for the money')
+        self.assertEqual(first.letter, 'a')
+        self.assertIs(type(first.letter), type('a'))
+        self.assertIs(type(first.django_state), int)
+        self.assertEqual(empty.letter, 'b')
+        self.assertEqual(first.get_letter_display(), 'A')
+
+        self.assertEqual(first.other_state, 1)
+        self.assertIs(type(first.other_state), int)
+        self.assertEqual(first.get_other_state_display(), 'One for the money')
+
+        # So pickled instances, like cached ones, don't contain whole entries, and are loaded
+        # with the same choice attributes. Models pickle their ``__dict__``.
+        pickled = pickle.dumps(first.__dict__)
+        self.assertIs(pickle.loads(pickled)['state'], choices.ONE)
+        self.assertEqual(len(pickled), len(pickle.dumps(dict(first.__dict__, other_state=1))))
+        self.assertLess(len(pickled), len(pickle.dumps(dict(first.__dict__,
+                                                            other_state=self.MY_CHOICES.ONE))))
+
+        # Values not in the choices, or ``None``, are loaded as is.
+        self.assertEqual(unknown.state, 4)
+        self.assertIs(type(unknown.state), int)
+        self.assertIsNone(empty.state)
+
+        # Also with ``values_list``.
+        self.assertEqual(list(DatabaseModel.objects.order_by('pk').values_list('state', flat=True)),
+                         [choices.ONE, 4, None])
+        self.assertIs(DatabaseModel.objects.values_list('state', flat=True).first(), choices.ONE)
+
+        # And lookups use the plain values.
+        self.assertEqual(DatabaseModel.objects.filter(state=choices.ONE).count(), 1)
+        self.assertEqual(DatabaseModel.objects.filter(state__in=[choices.ONE, choices.THREE]).count(), 1)
+
+    def test_model_field(self):
+        """Test that ``model_field`` returns the smallest field for the values."""
+
+        for values, field_class in (
+                ((0, 32767), ExtendedChoicePositiveSmallIntegerField),
+                ((-1, 32767), ExtendedChoiceSmallIntegerField),
+                ((-32768, 32768), ExtendedChoiceIntegerField),
+                ((0, 2 ** 31), ExtendedChoiceBigIntegerField),
+        ):
+            choices = Choices(*[('C%d' % index, value, 'C') for index, value in enumerate(values)])
+            field = choices.model_field()
+            self.assertIs(type(field), field_class)
+            self.assertIs(field.choices, choices)
+
+        field = Choices(('A', 'a', 'A'), ('LONG', 'long', 'Long')).model_field()
+        self.assertIs(type(field), ExtendedChoiceCharField)
+        self.assertEqual(field.max_length, 4)
+
+        # The default comes from a constant, other arguments are passed to the field.
+        field = self.MY_CHOICES.model_field(default_constant='TWO', null=True, max_length=10)
+        self.assertEqual((field.default, type(field.default)), (2, int))
+        self.assertTrue(field.null)
+        self.assertEqual(self.MY_CHOICES.model_field().default, models.NOT_PROVIDED)
+
+        # Validation uses the ``Choices``.
+        field.validate(3, None)
+        with self.assertRaises(ValidationError):
+            field.validate(4, None)
+
+        for choices in (Choices(), Choices(('A', 'a', 'A'), ('ONE', 1, 'One')),
+                        Choices(('HALF', 0.5, 'Half')), Choices(('HUGE', 2 ** 63, 'Huge'))):
+            with self.assertRaises(ValueError):
+                choices.model_field()
+        with self.assertRaises(ValueError):
+            self.MY_CHOICES.model_field(default_constant='FOUR')
+
+    def test_encoded_field(self):
+        """Test that the encoded field stores codes, and loads values."""
+
+        from django.db import connection, models
+
+        choices = AutoChoices(('ONLINE', ), ('DRAFT', ), ('OFFLINE', ),
+                              codes={'ONLINE': 1, 'DRAFT': 2, 'OFFLINE': 5})
+        choices.add_subset('NOT_ONLINE', ('DRAFT', 'OFFLINE'))
+
+        class EncodedModel(models.Model):
+            state = ExtendedChoiceEncodedField(choices=choices, null=True)
+
+            class Meta:
+                app_label = 'extended_choices'
+
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(EncodedModel)
+        self.addCleanup(self.drop_table, EncodedModel)
+
+        EncodedModel.objects.create(state=choices.ONLINE)
+        EncodedModel.objects.create(state='offline')
+        EncodedModel.objects.create(state=None)
+
+        # Codes are stored, values are loaded.
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT state FROM %s ORDER BY id' % EncodedModel._meta.db_table)
+            self.assertEqual([row[0] for row in cursor.fetchall()], [1, 5, None])
+        self.assertEqual([instance.state for instance in EncodedModel.objects.order_by('pk')],
+                         [choices.ONLINE, choices.OFFLINE, None])
+        # Values are plain, as ``choices`` has no ``import_path``.
+        self.assertIs(type(EncodedModel.objects.order_by('pk').first().state), type('online'))
+        self.assertEqual(EncodedModel.objects.order_by('pk').first().get_state_display(), 'Online')
+
+        # Filters use codes.
+        def filtered(**kwargs):
+            return sorted(EncodedModel.objects.filter(**kwargs).values_list('state', flat=True))
+
+        self.assertEqual(filtered(state='online'), ['online'])
+        self.assertEqual(filtered(state__in=['draft', 'offline']), ['offline'])
+        self.assertEqual(filtered(state__in_subset='NOT_ONLINE'), ['offline'])
+        self.assertEqual(filtered(state__const='OFFLINE'), ['offline'])
+
+        # Values are validated as values, not as codes.
+        instance = EncodedModel(state='draft')
+        instance.full_clean()
+        instance.state = 'archived'
+        with self.assertRaises(ValidationError):
+            instance.full_clean()
+        with self.assertRaises(ValueError):
+            instance.save()
+
+        # Unknown codes are loaded as is.
+        EncodedModel.objects.filter(state='online').update(state=models.Value(9))
+        self.assertEqual(list(EncodedModel.objects.filter(state__isnull=False).order_by('pk')
+                              .values_list('state', flat=True)), [9, 'offline'])
+
+    def test_bitmask_field(self):
+        """Test that the bitmask field stores sets of entries in an integer, and filters on them."""
+
+        # More than 8 entries, to use many bytes of the bitmasks.
+        CHANNELS = Choices(('EMAIL', 'email', 'Email'), ('SMS', 'sms', 'SMS'), ('PUSH', 'push', 'Push'))
+        CHANNELS.add_choices(*[('C%d' % index, 'c%d' % index, 'C%d' % index) for index in range(10)])
+        CHANNELS.add_subset('INSTANT', ('SMS', 'PUSH'))
+        email, sms, push, last = (CHANNELS.for_constant(constant)
+                                  for constant in ('EMAIL', 'SMS', 'PUSH', 'C9'))
+
+        class BitmaskModel(models.Model):
+            channels = ChoicesBitmaskField(choices=CHANNELS, null=True)
+
+            class Meta:
+                app_label = 'extended_choices'
+
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(BitmaskModel)
+        self.addCleanup(self.drop_table, BitmaskModel)
+
+        BitmaskModel.objects.create(channels=[email])
+        BitmaskModel.objects.create(channels=['sms', CHANNELS.PUSH, last])
+        BitmaskModel.objects.create(channels=CHANNELS.INSTANT)
+        BitmaskModel.objects.create(channels=[])
+        BitmaskModel.objects.create(channels=None)
+
+        # Bitmasks are stored, sets of entries are loaded.
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT channels FROM %s ORDER BY id' % BitmaskModel._meta.db_table)
+            self.assertEqual([row[0] for row in cursor.fetchall()], [1, 6 + (1 << 12), 6, 0, None])
+        self.assertEqual([instance.channels for instance in BitmaskModel.objects.order_by('pk')],
+                         [ChoiceSet(CHANNELS, [email]), ChoiceSet(CHANNELS, [sms, push, last]),
+                          ChoiceSet(CHANNELS, [sms, push]), ChoiceSet(CHANNELS), None])
+
+        def filtered(**kwargs):
+            return list(BitmaskModel.objects.filter(**kwargs).order_by('pk')
+                        .values_list('pk', flat=True))
+
+        pks = filtered()
+        self.assertEqual(filtered(channels__has_any=[email, 'push']), pks[:3])
+        self.assertEqual(filtered(channels__has_any=[last]), pks[1:2])
+        self.assertEqual(filtered(channels__has_any=[]), [])
+        self.assertEqual(filtered(channels__has_all='INSTANT'), pks[1:3])
+        self.assertEqual(filtered(channels__has_all=ChoicesValue(CHANNELS.INSTANT)), pks[1:3])
+        self.assertEqual(filtered(channels__has_all=CHANNELS.INSTANT), pks[1:3])
+        self.assertEqual(filtered(channels__has_all=[sms, last]), pks[1:2])
+        self.assertEqual(filtered(channels__has_all=[]), pks[:4])
+        self.assertEqual(filtered(channels=[push, sms]), pks[2:3])
+        self.assertEqual(filtered(channels=ChoiceSet.from_subset(CHANNELS, 'INSTANT')), pks[2:3])
+        with self.assertRaises(ValueError):
+            filtered(channels__has_any='UNKNOWN')
+        with self.assertRaises(ValueError):
+            filtered(channels__has_all=['fax'])
+
+        # Values are validated.
+        field = BitmaskModel._meta.get_field('channels')
+        self.assertEqual(frozenset(field.clean(['email', 'C9'], None)), frozenset([email, last]))
+        self.assertEqual(frozenset(field.clean('3', None)), frozenset([email, sms]))
+        with self.assertRaises(ValidationError):
+            field.clean(['fax'], None)
+        with self.assertRaises(ValueError):
+            BitmaskModel.objects.create(channels=['fax'])
+
+        # Empty sets are blank.
+        for empty in ([], ChoiceSet(CHANNELS), 0, '0'):
+            with self.assertRaises(ValidationError) as context:
+                field.clean(empty, None)
+            self.assertEqual(context.exception.code, 'blank')
+        with self.assertRaises(ValidationError):
+            BitmaskModel(channels=ChoiceSet(CHANNELS)).full_clean()
+        blank_field = ChoicesBitmaskField(choices=CHANNELS, blank=True)
+        self.assertEqual(blank_field.clean(0, None), ChoiceSet(CHANNELS))
+        self.assertEqual(blank_field.clean(ChoiceSet(CHANNELS), None), ChoiceSet(CHANNELS))
+
+        # The form field selects values.
+        form_field = field.formfield()
+        self.assertEqual(form_field.clean(['sms', 'email']), ['sms', 'email'])
+        self.assertEqual(form_field.prepare_value(frozenset([email])), ['email'])
+        with self.assertRaises(ValidationError):
+            form_field.clean(['fax'])
+
+        # The choices are not in migrations without import path.
+        self.assertNotIn('choices', field.deconstruct()[3])
+
+        with self.assertRaises(ValueError):
+            ChoicesBitmaskField(choices=[(1, 'One')])
+        with self.assertRaises(ValueError):
+            ChoicesBitmaskField(choices=AutoChoices(*[('C%d' % index, ) for index in range(64)]))
+
+    def drop_table(self, model):
+        """Drop the table of the given model."""
+
+        from django.db import connection
+
+        with connection.schema_editor() as schema_editor:
+            schema_editor.delete_model(model)
+
 
 class ChoicesTestCase(BaseTestCase):
     """Test the ``Choices`` class."""
@@ -500,6 +943,69 @@ class ChoicesTestCase(BaseTestCase):
         with self.assertRaises(KeyError):
             self.MY_CHOICES.for_display('And four to go')
 
+    def test_get_for_methods(self):
+        """Test the ``get_for_constant``, ``get_for_value`` and ``get_for_display`` methods."""
+
+        self.assertEqual(self.MY_CHOICES.get_for_constant('ONE'), self.MY_CHOICES.for_constant('ONE'))
+        self.assertEqual(self.MY_CHOICES.get_for_value(2), self.MY_CHOICES.for_value(2))
+        self.assertEqual(self.MY_CHOICES.get_for_display('Three to get ready'),
+                         self.MY_CHOICES.for_display('Three to get ready'))
+
+        self.assertIsNone(self.MY_CHOICES.get_for_constant('FOUR'))
+        self.assertIsNone(self.MY_CHOICES.get_for_value(4))
+        self.assertIsNone(self.MY_CHOICES.get_for_display('And four to go'))
+        self.assertEqual(self.MY_CHOICES.get_for_value(4, 'default'), 'default')
+        self.assertIsNone(self.MY_CHOICES.unknown_values)
+
+        # With a fallback entry and tracking of the unknown keys.
+        choices = self.choices_class(
+            ('UNKNOWN', 0, 'Unknown'),
+            ('ONE', 1, 'One'),
+            fallback='UNKNOWN',
+            track_unknown=2,
+        )
+        self.assertEqual(choices.get_for_value(1), ('ONE', 1, 'One'))
+        for value in (4, 5, 4, 6):
+            self.assertEqual(choices.get_for_value(value), ('UNKNOWN', 0, 'Unknown'))
+        self.assertEqual(choices.get_for_display('Two', 'default'), 'default')
+        self.assertEqual(choices.get_for_constant('ONE'), ('ONE', 1, 'One'))
+
+        self.assertEqual(choices.unknown_values.most_common(),
+                         [(('value', 4), 2), (('value', 5), 1)])
+        self.assertEqual(choices.unknown_values.overflow, 2)
+        self.assertEqual(choices.unknown_values.most_common(1), [(('value', 4), 2)])
+        choices.unknown_values.clear()
+        self.assertEqual(choices.unknown_values.most_common(), [])
+
+        # The configuration is kept when pickled.
+        unpickled = pickle.loads(pickle.dumps(choices))
+        self.assertEqual(unpickled.fallback, 'UNKNOWN')
+        self.assertEqual(unpickled.unknown_values.max_size, 2)
+
+        # Unhashable keys are unknown keys, but are not tracked.
+        choices.unknown_values.clear()
+        self.assertEqual(choices.get_for_value([1]), ('UNKNOWN', 0, 'Unknown'))
+        self.assertIsNone(self.MY_CHOICES.get_for_constant({}))
+        self.assertEqual(choices.unknown_values.most_common(), [])
+
+        # Subsets keep the fallback if they have its entry, and share the tracker.
+        subset = choices.extract_subset('UNKNOWN')
+        self.assertEqual(subset.get_for_value(7), ('UNKNOWN', 0, 'Unknown'))
+        self.assertIsNone(choices.extract_subset('ONE').fallback)
+        self.assertIsNone(choices.extract_subset('ONE').get_for_value(8))
+        self.assertEqual(choices.unknown_values.most_common(),
+                         [(('value', 7), 1), (('value', 8), 1)])
+
+        # The fallback must be a constant of the choices.
+        with self.assertRaises(ValueError):
+            self.choices_class(('ONE', 1, 'One'), fallback='UNKNOWN')
+        choices = self.choices_class(fallback='UNKNOWN')
+        self.assertEqual(choices.get_for_value(1, 'default'), 'default')
+        with self.assertRaises(ValueError):
+            choices.get_for_value(1)
+        choices.add_choices(('UNKNOWN', 0, 'Unknown'))
+        self.assertEqual(choices.get_for_value(1), ('UNKNOWN', 0, 'Unknown'))
+
     def test_has_methods(self):
         """Test the ``has_constant``, ``has_value`` and ``has_display`` methods."""
 
@@ -560,7 +1066,7 @@ class ChoicesTestCase(BaseTestCase):
         if django.VERSION >= (1, 7):
             django.setup()
 
-        choices = Choices(
+        choices = self.choices_class(
             ('ONE', 1, ugettext_lazy('one')),
             ('TWO', 2, ugettext_lazy('two')),
         )
@@ -617,7 +1123,7 @@ class ChoicesTestCase(BaseTestCase):
         self.assertEqual(unpickled_choices.ONE.display.one, 'money')
 
         # With a name, extra arguments and subsets
-        OTHER_CHOICES = Choices(
+        OTHER_CHOICES = self.choices_class(
             'ALL',
             ('ONE', 1, 'One for the money'),
             ('TWO', 2, 'Two for the show'),
@@ -639,10 +1145,74 @@ class ChoicesTestCase(BaseTestCase):
         self.assertEqual(unpickled_choices.ODD, OTHER_CHOICES.ODD)
         self.assertEqual(unpickled_choices.EVEN, OTHER_CHOICES.EVEN)
 
+    def test_codes(self):
+        """Test that codes are append-only, shared with subsets, and pickled."""
+
+        self.MY_CHOICES.set_codes({'ONE': 10, 'TWO': 20})
+        self.assertEqual(self.MY_CHOICES.codes, {'ONE': 10, 'TWO': 20})
+        self.assertEqual(self.MY_CHOICES.ODD.codes, {'ONE': 10})
+
+        # Setting the same codes again is allowed, not changing them.
+        self.MY_CHOICES.set_codes({'ONE': 10, 'THREE': 30})
+        self.assertEqual(self.MY_CHOICES.ODD.codes, {'ONE': 10, 'THREE': 30})
+        for codes in ({'FOUR': 40}, {'ONE': -1}, {'ONE': 32768}, {'ONE': '10'}, {'ONE': True}):
+            with self.assertRaises(ValueError):
+                self.choices_class(('ONE', 1, 'One')).set_codes(codes)
+        with self.assertRaises(ValueError):
+            self.MY_CHOICES.set_codes({'ONE': 11})
+        self.MY_CHOICES.add_choices(('FOUR', 4, 'Four'))
+        with self.assertRaises(ValueError):
+            self.MY_CHOICES.set_codes({'FOUR': 10})
+        self.assertEqual(self.MY_CHOICES.codes, {'ONE': 10, 'TWO': 20, 'THREE': 30})
+
+        # Subsets created after get the codes of their constants.
+        self.MY_CHOICES.add_subset('EVEN', ('TWO', 'FOUR'))
+        self.assertEqual(self.MY_CHOICES.EVEN.codes, {'TWO': 20})
+
+        unpickled_choices = pickle.loads(pickle.dumps(self.MY_CHOICES))
+        self.assertEqual(unpickled_choices.codes, self.MY_CHOICES.codes)
+        self.assertEqual(unpickled_choices.ODD.codes, {'ONE': 10, 'THREE': 30})
+
+    def test_pickle_by_reference(self):
+        """Test that a ``Choices`` with an ``import_path`` is pickled as a reference."""
+
+        for obj in (
+            REFERENCED_CHOICES,
+            REFERENCED_CHOICES.ODD,
+            REFERENCED_CHOICES.for_constant('ONE'),
+            REFERENCED_CHOICES.ONE,
+            REFERENCED_CHOICES.ONE.constant,
+            REFERENCED_CHOICES.ONE.display,
+            REFERENCED_CHOICES.ODD.for_constant('THREE').value,
+        ):
+            pickled = pickle.dumps(obj)
+            # We get the exact same object.
+            self.assertIs(pickle.loads(pickled), obj)
+            # And the pickled data doesn't contain the whole entry.
+            self.assertNotIn(b'money', pickled)
+
+        self.assertLess(len(pickle.dumps(REFERENCED_CHOICES)), len(pickle.dumps(self.MY_CHOICES)))
+
+        # Copies are the same object too.
+        self.assertIs(copy(REFERENCED_CHOICES), REFERENCED_CHOICES)
+        self.assertIs(deepcopy(REFERENCED_CHOICES), REFERENCED_CHOICES)
+
+        # Entries not coming from a ``Choices`` with an ``import_path`` are fully pickled.
+        entry = self.MY_CHOICES.for_constant('ONE')
+        self.assertIsNot(pickle.loads(pickle.dumps(entry)), entry)
+        self.assertEqual(pickle.loads(pickle.dumps(entry)), entry)
+
+    def test_pickle_by_invalid_reference(self):
+        """Test that a ``Choices`` with a wrong ``import_path`` cannot be pickled."""
+
+        for import_path in ('%s.REFERENCED_CHOICES' % __name__, 'foo.bar.BAZ'):
+            with self.assertRaises(pickle.PicklingError):
+                pickle.dumps(self.choices_class(('FOO', 1, 'foo'), import_path=import_path))
+
     def test_django_ugettext_lazy(self):
         """Test that a choices object using ugettext_lazy could be pickled and copied."""
 
-        lazy_choices = Choices(
+        lazy_choices = self.choices_class(
             ('ONE', 1, ugettext_lazy('One for the money')),
             ('TWO', 2, ugettext_lazy('Two for the show')),
             ('THREE', 3, ugettext_lazy('Three to get ready')),
@@ -665,7 +1235,7 @@ class ChoicesTestCase(BaseTestCase):
     def test_bool(self):
         """Test that having 0 or "" return `False` in a boolean context"""
 
-        bool_choices = Choices(
+        bool_choices = self.choices_class(
             ('', 0, ''),
             ('FOO', 1, 'bar'),
         )
@@ -684,7 +1254,7 @@ class ChoicesTestCase(BaseTestCase):
     def test_dict_class(self):
         """Test that the dict_class argument is taken into account"""
 
-        dict_choices = Choices(
+        dict_choices = self.choices_class(
             ('FOO', 1, 'foo'),
             ('BAR', 2, 'bar')
         )
@@ -694,7 +1264,7 @@ class ChoicesTestCase(BaseTestCase):
         self.assertIsInstance(dict_choices.values, dict)
         self.assertIsInstance(dict_choices.displays, dict)
 
-        ordered_dict_choices = Choices(
+        ordered_dict_choices = self.choices_class(
             ('FOO', 1, 'foo'),
             ('BAR', 2, 'bar'),
             dict_class=OrderedDict
@@ -716,7 +1286,7 @@ class ChoicesTestCase(BaseTestCase):
         self.assertIsInstance(ordered_choices.displays, OrderedDict)
 
     def test_passing_choice_entry(self):
-        MY_CHOICES = Choices(
+        MY_CHOICES = self.choices_class(
             ChoiceEntry(('A', 'aa', 'aaa', {'foo': 'bar'})),
             ('B', 'bb', 'bbb'),
         )
@@ -726,7 +1296,7 @@ class ChoicesTestCase(BaseTestCase):
         self.assertEqual(MY_CHOICES.B.display, 'bbb')
 
     def test_accessing_attributes(self):
-        MY_CHOICES = Choices(
+        MY_CHOICES = self.choices_class(
             ('FOO', 1, 'foo', {'foo': 'foo1', 'bar': 'bar1'}),
             ('BAR', 2, 'bar', {'foo': 'foo2', 'bar': 'bar2'}),
         )
@@ -744,7 +1314,1598 @@ class ChoicesTestCase(BaseTestCase):
     def test_invalid_attributes(self):
         for invalid_key in {'constant', 'value', 'display'}:
             with self.assertRaises(AssertionError):
-                Choices(('FOO', '1', 'foo', {invalid_key: 'xxx'}))
+                self.choices_class(('FOO', '1', 'foo', {invalid_key: 'xxx'}))
+
+    def test_concurrent_readers_and_writers(self):
+        """Test that readers never see a partially added batch of choices."""
+
+        MY_CHOICES = self.choices_class(('ZERO', 0, 'Zero'))
+        nb_writers, nb_batches, batch_size = 4, 50, 5
+        errors = []
+        writers_done = threading.Event()
+
+        def read():
+            try:
+                while not writers_done.is_set():
+                    # Read in this order, as choices are only added: each one has at least the
+                    # choices of the previous one.
+                    choices = list(MY_CHOICES)
+                    values = MY_CHOICES.values
+                    length, django_choices = len(MY_CHOICES), MY_CHOICES.choices
+                    # The number of choices is always a complete number of batches.
+                    self.assertEqual((len(choices) - 1) % batch_size, 0)
+                    self.assertEqual((len(values) - 1) % batch_size, 0)
+                    # Iteration, ``len`` and ``choices`` agree with the lookups.
+                    self.assertLessEqual(len(choices), len(values))
+                    for value, __ in choices:
+                        self.assertIn(value, values)
+                    self.assertGreaterEqual(length, len(values))
+                    self.assertGreaterEqual(len(django_choices), len(values))
+
+                    entries = MY_CHOICES.entries
+                    self.assertEqual((len(entries) - 1) % batch_size, 0)
+                    for entry in entries:
+                        self.assertIs(MY_CHOICES.for_value(entry.value), entry)
+                        self.assertIs(MY_CHOICES.for_constant(entry.constant), entry)
+                        self.assertIs(MY_CHOICES.for_display(entry.display), entry)
+                        self.assertEqual(getattr(MY_CHOICES, entry.constant), entry.value)
+                        self.assertIn(entry.value, MY_CHOICES)
+            except Exception as exc:  # pylint: disable=broad-except
+                errors.append(exc)
+
+        def write(writer):
+            try:
+                for batch in range(nb_batches):
+                    start = 1 + (writer * nb_batches + batch) * batch_size
+                    MY_CHOICES.add_choices(*[
+                        ('C%d' % value, value, 'Choice %d' % value)
+                        for value in range(start, start + batch_size)
+                    ])
+            except Exception as exc:  # pylint: disable=broad-except
+                errors.append(exc)
+
+        readers = [threading.Thread(target=read) for __ in range(4)]
+        writers = [threading.Thread(target=write, args=(writer, )) for writer in range(nb_writers)]
+
+        # Force frequent thread switches (python 3 only).
+        switch_interval = getattr(sys, 'getswitchinterval', lambda: None)()
+        if switch_interval:
+            sys.setswitchinterval(1e-6)
+        try:
+            for thread in readers + writers:
+                thread.start()
+            for thread in writers:
+                thread.join()
+            writers_done.set()
+            for thread in readers:
+                thread.join()
+        finally:
+            if switch_interval:
+                sys.setswitchinterval(switch_interval)
+
+        self.assertEqual(errors, [])
+
+        # No choice was lost.
+        nb_choices = 1 + nb_writers * nb_batches * batch_size
+        self.assertEqual(len(MY_CHOICES), nb_choices)
+        self.assertEqual(len(MY_CHOICES.entries), nb_choices)
+        self.assertEqual(len(MY_CHOICES.values), nb_choices)
+        self.assertEqual(MY_CHOICES.C1000, 1000)
+
+
+class ColumnarChoicesTestCase(ChoicesTestCase):
+    """Run all the ``Choices`` tests on ``ColumnarChoices``, and test its specificities."""
+
+    choices_class = ColumnarChoices
+
+    def test_values_columns(self):
+        """Test that integer values are stored in an array, and other values in the pool."""
+
+        self.assertEqual(self.MY_CHOICES._storage.values.typecode, INT_TYPECODE)
+
+        # Switching to the pool when a non-integer value is added.
+        self.MY_CHOICES.add_choices(('FOUR', '4', 'Four'), ('BIG', 2 ** 70, 'Big'))
+        self.assertEqual(self.MY_CHOICES._storage.values.typecode, 'I')
+        self.assertEqual(self.MY_CHOICES.ONE, 1)
+        self.assertEqual(self.MY_CHOICES.FOUR, '4')
+        self.assertEqual(self.MY_CHOICES.BIG, 2 ** 70)
+        self.assertEqual(self.MY_CHOICES.ODD, [(1, 'One for the money'), (3, 'Three to get ready')])
+
+        # Integers are stored in the array only within its bounds.
+        MY_CHOICES = ColumnarChoices(('MIN', _INT_MIN, 'Min'), ('MAX', _INT_MAX, 'Max'))
+        self.assertEqual(MY_CHOICES._storage.values.typecode, INT_TYPECODE)
+        MY_CHOICES.add_choices(('OVER', _INT_MAX + 1, 'Over'))
+        self.assertEqual(MY_CHOICES._storage.values.typecode, 'I')
+        self.assertEqual([entry.value for entry in MY_CHOICES.entries], [_INT_MIN, _INT_MAX, _INT_MAX + 1])
+
+        # Each text is stored once.
+        MY_CHOICES = ColumnarChoices(('A', 1, 'Same'), ('B', 2, 'Same'), ('Same', 3, 'Other'))
+        self.assertEqual(MY_CHOICES._storage.pool, ['A', 'Same', 'B', 'Other'])
+
+    def test_entries_cache(self):
+        """Test that entries are created lazily, in a bounded cache shared with subsets."""
+
+        MY_CHOICES = ColumnarChoices(
+            *[('C%d' % value, value, 'Choice %d' % value) for value in range(10)],
+            entries_cache_size=4
+        )
+        MY_CHOICES.add_subset('SMALL', ('C1', 'C2'))
+        storage = MY_CHOICES._storage
+        self.assertIs(MY_CHOICES.SMALL._storage, storage)
+        self.assertEqual(storage.entries, {})
+
+        entry = MY_CHOICES.for_value(1)
+        self.assertIs(MY_CHOICES.SMALL.for_constant('C1'), entry)
+        self.assertIs(MY_CHOICES.C1.choice_entry, entry)
+        self.assertEqual(len(storage.entries), 1)
+
+        # The cache never grows above its size, but entries are always equal.
+        self.assertEqual(len(list(MY_CHOICES.entries)), 10)
+        self.assertEqual(len(storage.entries), 4)
+        self.assertEqual(MY_CHOICES.for_value(1), entry)
+
+        # The least recently used entries are removed first.
+        storage.entries.clear()
+        entries = [MY_CHOICES.for_value(value) for value in range(4)]
+        self.assertIs(MY_CHOICES.for_value(0), entries[0])
+        MY_CHOICES.for_value(4)
+        self.assertEqual(list(storage.entries), [2, 3, 0, 4])
+        self.assertIs(MY_CHOICES.for_value(0), entries[0])
+
+        # Iterating on the choices doesn't create entries.
+        storage.entries.clear()
+        self.assertEqual(list(MY_CHOICES)[:2], [(0, 'Choice 0'), (1, 'Choice 1')])
+        self.assertEqual(storage.entries, {})
+
+        # The size of the cache is kept when pickling.
+        self.assertEqual(pickle.loads(pickle.dumps(MY_CHOICES)).entries_cache_size, 4)
+
+    def test_dicts(self):
+        """Test that ``constants``, ``values`` and ``displays`` are mappings, cached until update."""
+
+        for name, key in (('constants', 'ONE'), ('values', 1), ('displays', 'One for the money')):
+            view = getattr(self.MY_CHOICES, name)
+            self.assertIsInstance(view, Mapping)
+            self.assertIs(getattr(self.MY_CHOICES, name), view)
+            self.assertIs(view[key], self.MY_CHOICES.for_value(1))
+            self.assertIn(key, view)
+            self.assertEqual(len(view), 3)
+            with self.assertRaises(TypeError):
+                view[key] = None
+
+        self.assertEqual(self.MY_CHOICES.constants, {
+            'ONE': ('ONE', 1, 'One for the money'),
+            'TWO': ('TWO', 2, 'Two for the show'),
+            'THREE': ('THREE', 3, 'Three to get ready'),
+        })
+        self.assertEqual(dict(self.MY_CHOICES.values), {
+            1: ('ONE', 1, 'One for the money'),
+            2: ('TWO', 2, 'Two for the show'),
+            3: ('THREE', 3, 'Three to get ready'),
+        })
+        # As for ``Choices``, the keys are the choice attributes.
+        self.assertIs(list(self.MY_CHOICES.constants)[0], self.MY_CHOICES.ONE.constant)
+
+        # Views are built again when choices are added.
+        entries = self.MY_CHOICES.entries
+        self.assertEqual(entries[1:], [('TWO', 2, 'Two for the show'),
+                                       ('THREE', 3, 'Three to get ready')])
+        self.MY_CHOICES.add_choices(('FOUR', 4, 'Four'))
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(len(self.MY_CHOICES.entries), 4)
+        self.assertEqual(len(self.MY_CHOICES.constants), 4)
+
+    def test_dict_class(self):
+        """Test that the views keep the order of the choices, whatever the ``dict_class``."""
+
+        for dict_class in (dict, OrderedDict):
+            MY_CHOICES = self.choices_class(('FOO', 1, 'foo'), ('BAR', 2, 'bar'),
+                                            dict_class=dict_class)
+            self.assertIs(MY_CHOICES.dict_class, dict_class)
+            self.assertEqual(list(MY_CHOICES.constants), ['FOO', 'BAR'])
+            self.assertEqual(list(MY_CHOICES.values.keys()), [1, 2])
+            self.assertEqual(list(MY_CHOICES.displays), ['foo', 'bar'])
+
+    def test_add(self):
+        """Test that adding a list returns all the ``(value, display name)`` tuples, as a list."""
+
+        self.assertEqual(self.MY_CHOICES + [(4, 'Four')], [
+            (1, 'One for the money'), (2, 'Two for the show'), (3, 'Three to get ready'),
+            (4, 'Four')])
+        self.assertEqual([(0, 'Zero')] + self.MY_CHOICES.ODD, [
+            (0, 'Zero'), (1, 'One for the money'), (3, 'Three to get ready')])
+        self.assertEqual(self.MY_CHOICES + [], list(Choices(
+            ('ONE', 1, 'One for the money'), ('TWO', 2, 'Two for the show'),
+            ('THREE', 3, 'Three to get ready'))))
+        with self.assertRaises(TypeError):
+            self.MY_CHOICES + ((4, 'Four'), )
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+    def test_memory_usage(self):
+        """Test that a ``ColumnarChoices`` takes a lot less memory than a ``Choices``."""
+
+        choices = [('C%d' % value, value, 'Choice %d' % value) for value in range(2000)]
+
+        choices_size = measure_memory(lambda: Choices(*choices))[0]
+        columnar_size, columnar = measure_memory(lambda: ColumnarChoices(*choices))
+
+        self.assertLess(columnar_size * 3, choices_size)
+
+        # ``memory_usage`` counts the columns, shared with subsets, apart.
+        columnar.add_subset('HALF', ['C%d' % value for value in range(0, 2000, 2)])
+        usage = columnar.memory_usage()
+        self.assertGreater(usage['columns'], usage['subsets'])
+        self.assertEqual(usage['entries'], 0)
+        self.assertEqual(usage['total'], sum(size for part, size in usage.items() if part != 'total'))
+
+
+def measure_memory(func):
+    """Return the memory allocated by ``func`` and still used after it returns, and its result."""
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        # Entries created while validating choices are in reference cycles.
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+class MemoryUsageTestCase(unittest.TestCase):
+    """Test the memory used by ``Choices``, with ``memory_usage`` and ``tracemalloc``."""
+
+    # Maximum number of bytes used per entry, for each class, and per entry of a subset.
+    BUDGETS = {
+        Choices: 2048,
+        OrderedChoices: 2304,
+        AutoChoices: 2560,
+        'subset': 512,
+    }
+
+    def test_memory_usage(self):
+        """Test the breakdown returned by ``memory_usage``."""
+
+        MY_CHOICES = Choices(
+            ('ONE', 1, 'One for the money', {'one': 'money'}),
+            ('TWO', 2, 'Two for the show'),
+        )
+        usage = MY_CHOICES.memory_usage()
+        self.assertEqual(usage['total'], sum(size for part, size in usage.items() if part != 'total'))
+        for part in ('entries', 'attributes', 'indexes', 'extra_attributes'):
+            self.assertGreater(usage[part], 0)
+        self.assertEqual(usage['subsets'], 0)
+
+        # Entries are shared with subsets, so only their indexes are counted.
+        MY_CHOICES.add_subset('ODD', ('ONE', ))
+        subset_usage = MY_CHOICES.memory_usage()
+        self.assertGreater(subset_usage['subsets'], 0)
+        self.assertEqual(subset_usage['subsets'], MY_CHOICES.ODD.memory_usage()['indexes'])
+
+        shallow_usage = MY_CHOICES.memory_usage(deep=False)
+        self.assertLess(shallow_usage['attributes'], subset_usage['attributes'])
+        self.assertEqual(shallow_usage['entries'], subset_usage['entries'])
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+    def test_memory_usage_matches_tracemalloc(self):
+        """Test that ``memory_usage`` is close to the memory really allocated."""
+
+        choices = [('C%d' % value, value, 'Choice %d' % value) for value in range(1000)]
+        traced, MY_CHOICES = measure_memory(lambda: Choices(*choices))
+        self.assertLess(abs(MY_CHOICES.memory_usage()['total'] - traced), traced * 0.25)
+
+    def assert_budgets(self, nb_entries):
+        """Check the memory used per entry, with ``nb_entries`` entries, against ``BUDGETS``."""
+
+        choices = [('C%d' % value, value, 'Choice %d' % value) for value in range(nb_entries)]
+        subset_constants = [choice[0] for choice in choices[::2]]
+
+        for klass in (Choices, OrderedChoices, AutoChoices):
+            args = [choice[0] for choice in choices] if klass is AutoChoices else choices
+            size, obj = measure_memory(lambda: klass(*args))
+            self.assertLessEqual(size // nb_entries, self.BUDGETS[klass], klass.__name__)
+
+            size = measure_memory(lambda: obj.add_subset('HALF', subset_constants))[0]
+            self.assertLessEqual(size // len(subset_constants), self.BUDGETS['subset'],
+                                 '%s subset' % klass.__name__)
+
+            obj = None
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+    def test_budgets_1k(self):
+        """Test the memory used per entry with 1,000 entries."""
+        self.assert_budgets(1000)
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+    def test_budgets_10k(self):
+        """Test the memory used per entry with 10,000 entries."""
+        self.assert_budgets(10000)
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+    @unittest.skipIf(not os.environ.get('EXTENDED_CHOICES_SLOW_TESTS'),
+                     "set EXTENDED_CHOICES_SLOW_TESTS to run it")
+    def test_budgets_100k(self):
+        """Test the memory used per entry with 100,000 entries (about 40 seconds)."""
+        self.assert_budgets(100000)
+
+
+class InstrumentationTestCase(BaseTestCase):
+    """Tests of the instrumentation of the lookups."""
+
+    def make_choices(self, choices_class=Choices):
+        return choices_class(
+            ('ONE', 1, 'One'),
+            ('TWO', 2, 'Two'),
+        )
+
+    def do_lookups(self, choices):
+        choices.for_value(1)
+        choices.for_constant('TWO')
+        with self.assertRaises(KeyError):
+            choices.for_display('Three')
+        self.assertTrue(choices.has_display('One'))
+        self.assertFalse(choices.has_constant('THREE'))
+        self.assertEqual(choices['ONE'], 1)
+        self.assertNotIn(3, choices)
+
+    def test_instance(self):
+        """Test that a single instance can be instrumented, even columnar ones."""
+
+        for choices_class in (Choices, ColumnarChoices):
+            choices = self.make_choices(choices_class)
+            other = self.make_choices(choices_class)
+            instrument(choices)
+            self.addCleanup(uninstrument, choices)
+
+            self.do_lookups(choices)
+            self.do_lookups(other)
+
+            stats = get_lookup_stats(choices)
+            self.assertEqual(
+                dict((name, (counters['hits'], counters['misses']))
+                     for name, counters in stats.items()),
+                {
+                    'for_value': (1, 0),
+                    'for_constant': (1, 0),
+                    'for_display': (0, 1),
+                    'has_display': (1, 0),
+                    'has_constant': (0, 1),
+                    '__getitem__': (1, 0),
+                    '__contains__': (0, 1),
+                    # Used by ``__contains__``.
+                    'has_value': (0, 1),
+                }
+            )
+            self.assertEqual(get_lookup_stats(other), {})
+
+            # Still the same for the outside world.
+            self.assertEqual(type(choices).__name__, choices_class.__name__)
+            self.assertIsInstance(choices, choices_class)
+            unpickled = pickle.loads(pickle.dumps(choices))
+            self.assertIs(type(unpickled), choices_class)
+            self.assertEqual(unpickled, choices)
+
+            with self.assertRaises(RuntimeError):
+                instrument(choices)
+
+            uninstrument(choices)
+            self.assertIs(type(choices), choices_class)
+            self.assertEqual(get_lookup_stats(choices), {})
+
+    def test_global(self):
+        """Test that all instances can be instrumented, and that it's removed after."""
+
+        original_for_value = Choices.__dict__['for_value']
+        choices = self.make_choices()
+        instrument()
+        self.addCleanup(uninstrument)
+        columnar = self.make_choices(ColumnarChoices)
+
+        self.do_lookups(choices)
+        choices.for_value(2)
+        columnar.for_value(1)
+
+        self.assertEqual(get_lookup_stats(choices)['for_value']['calls'], 2)
+        self.assertEqual(get_lookup_stats(columnar)['for_value']['calls'], 1)
+        # Validation of the new choices of ``columnar`` used ``has_constant`` and ``has_value``.
+        self.assertEqual(get_lookup_stats(columnar)['has_constant']['misses'], 2)
+
+        # Reset.
+        self.assertEqual(get_lookup_stats(choices, reset=True)['for_value']['calls'], 2)
+        self.assertEqual(get_lookup_stats(choices), {})
+
+        # Instrumenting an instance too does not count twice.
+        instrument(choices)
+        choices.for_value(1)
+        self.assertEqual(get_lookup_stats(choices)['for_value']['calls'], 1)
+        uninstrument(choices)
+
+        with self.assertRaises(RuntimeError):
+            instrument()
+
+        uninstrument()
+        self.assertIs(Choices.__dict__['for_value'], original_for_value)
+        self.assertEqual(get_lookup_stats(choices), {})
+
+    def test_sampling_and_callback(self):
+        """Test that calls can be timed, and that the callback is called for each of them."""
+
+        with self.assertRaises(ValueError):
+            instrument(sample_rate=2)
+
+        calls = []
+        choices = self.make_choices()
+        instrument(choices, sample_rate=0.5, callback=lambda *args: calls.append(args))
+        self.addCleanup(uninstrument, choices)
+
+        for __ in range(4):
+            choices.for_value(1)
+        with self.assertRaises(KeyError):
+            choices.for_value(3)
+
+        counters = get_lookup_stats(choices)['for_value']
+        self.assertEqual((counters['calls'], counters['hits'], counters['misses']), (5, 4, 1))
+        self.assertEqual(counters['timed'], 2)
+        self.assertGreaterEqual(counters['total_time'], counters['max_time'])
+        self.assertGreater(counters['max_time'], 0)
+
+        self.assertEqual(len(calls), 5)
+        self.assertEqual([call[:3] for call in calls[-2:]],
+                         [(choices, 'for_value', True), (choices, 'for_value', False)])
+        self.assertEqual([call[3] is None for call in calls], [True, False, True, False, True])
+
+
+class InspectorTestCase(BaseTestCase):
+    """Tests of the inspection of ``Choices``, and of the command line interface."""
+
+    def test_inspect_choices(self):
+        """Test the report about a ``Choices`` instance."""
+
+        report = inspect_choices(self.MY_CHOICES)
+        self.assertEqual(report['class'], 'Choices')
+        self.assertEqual((report['entries'], report['subsets']), (3, 1))
+        self.assertEqual(report['memory'], self.MY_CHOICES.memory_usage()['total'])
+        self.assertEqual(report['value_types'], {'int': 3})
+        self.assertEqual(report['fast_paths'],
+                         ['inline SQL values', 'BETWEEN lookups', 'ChoiceSet byte tables'])
+
+        report = inspect_choices(ColumnarChoices(('A', 1, 'a'), ('B', 10, 'b')))
+        self.assertEqual(report['fast_paths'],
+                         ['inline SQL values', 'ChoiceSet byte tables', 'columnar integer values'])
+
+        report = inspect_choices(Choices(('A', 'a', 'A'), ('B', 2, 'B'), ('C', 'c', 'C')))
+        self.assertEqual(report['value_types'], {'str' if six.PY3 else 'unicode': 2, 'int': 1})
+        self.assertEqual(report['fast_paths'], ['ChoiceSet byte tables'])
+
+        report = inspect_choices(AutoChoices(*['C%d' % index for index in range(65)]))
+        self.assertEqual(report['fast_paths'], [])
+
+        report = inspect_choices(REFERENCED_CHOICES)
+        self.assertIn('pickled by reference', report['fast_paths'])
+
+    def test_benchmark_choices(self):
+        """Test that the main lookups are timed."""
+
+        durations = benchmark_choices(self.MY_CHOICES, number=10)
+        self.assertEqual(sorted(durations), ['attribute', 'for_constant', 'for_display',
+                                             'for_value', 'has_value (missing)'])
+        self.assertEqual(benchmark_choices(Choices(), number=10), {})
+
+    def test_find_choices(self):
+        """Test that the ``Choices`` of the loaded modules are found, only once."""
+
+        found = find_choices()
+        found_ids = [id(choices) for path, choices in found]
+        self.assertIn(id(REFERENCED_CHOICES), found_ids)
+        self.assertEqual(len(found_ids), len(set(found_ids)))
+        self.assertEqual(found, sorted(found, key=lambda item: item[0]))
+
+    def call_main(self, *args):
+        """Call the command line interface and return its exit code and output."""
+
+        output, stdout, stderr = six.StringIO(), sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = output
+        try:
+            code = main(list(args))
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+        return code, output.getvalue()
+
+    def test_main(self):
+        """Test the command line interface."""
+
+        path = '%s.REFERENCED_CHOICES' % __name__
+
+        code, output = self.call_main(path, '--number', '10')
+        self.assertEqual(code, 0)
+        self.assertIn('%s (Choices)' % path, output)
+        self.assertIn('entries: 3,', output)
+        self.assertIn('for_value', output)
+
+        code, output = self.call_main(path, '--json', '--no-benchmark')
+        self.assertEqual(code, 0)
+        report = json.loads(output)[path]
+        self.assertEqual(report['entries'], 3)
+        self.assertNotIn('benchmark', report)
+
+        code, output = self.call_main('%s.BaseTestCase' % __name__)
+        self.assertEqual(code, 2)
+        self.assertIn('is not a ``Choices`` instance', output)
+
+    def test_main_without_settings(self):
+        """Test that ``--all`` without configured settings is reported, in a new process."""
+
+        import subprocess
+        env = dict((key, value) for key, value in os.environ.items()
+                   if key != 'DJANGO_SETTINGS_MODULE')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        process = subprocess.Popen([sys.executable, '-m', 'extended_choices', '--all'], cwd=root,
+                                   env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        __, stderr = process.communicate()
+        self.assertEqual(process.returncode, 2)
+        self.assertIn(b'set DJANGO_SETTINGS_MODULE to use --all', stderr)
+
+
+class DatabaseTestCase(BaseTestCase):
+    """Base test case creating the table of ``ChoicesModel``."""
+
+    @classmethod
+    def setUpClass(cls):
+        super(DatabaseTestCase, cls).setUpClass()
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(ChoicesModel)
+
+    @classmethod
+    def tearDownClass(cls):
+        with connection.schema_editor() as schema_editor:
+            schema_editor.delete_model(ChoicesModel)
+        super(DatabaseTestCase, cls).tearDownClass()
+
+    def tearDown(self):
+        ChoicesModel.objects.all().delete()
+        super(DatabaseTestCase, self).tearDown()
+
+    def create_rows(self, *states):
+        """Create a row for each given state."""
+        ChoicesModel.objects.bulk_create(ChoicesModel(state=state) for state in states)
+
+
+class ExpressionsTestCase(DatabaseTestCase):
+    """Tests of the expressions to use display names and order of ``Choices`` in the database."""
+
+    def test_display_expression(self):
+        """Test that the display names can be computed by the database."""
+
+        self.create_rows(1, 2, 3, 4, None)
+
+        queryset = ChoicesModel.objects.annotate(
+            state_display=self.MY_CHOICES.display_expression('state'),
+        ).order_by('state_display', 'state')
+        self.assertEqual(list(queryset.values_list('state', 'state_display')), [
+            (None, None),
+            (4, None),
+            (1, 'One for the money'),
+            (3, 'Three to get ready'),
+            (2, 'Two for the show'),
+        ])
+
+        # Display names are passed as parameters, and string values too.
+        choices = Choices(('A', 'a%s', "100% 'A'"), ('B', 'b', 'B'))
+        ChoicesModel.objects.create(name='a%s')
+        queryset = ChoicesModel.objects.filter(name__isnull=False).annotate(
+            name_display=choices.display_expression('name'))
+        self.assertEqual(queryset.get().name_display, "100% 'A'")
+
+    def test_chunked_display_expression(self):
+        """Test that many integer values are split in chunks, each with its own ``CASE``."""
+
+        choices = Choices(*[('C%d' % index, index, 'Choice %d' % index)
+                            for index in reversed(range(10 * CASE_CHUNK_SIZE))])
+        expression = choices.display_expression('state')
+        sql = ''.join(expression.sql_parts)
+        self.assertEqual(sql.count('BETWEEN'), 10)
+        self.assertEqual(sql.count('CASE'), 11)
+        self.assertEqual(len(expression.mapping_params), 10 * CASE_CHUNK_SIZE)
+
+        last = 10 * CASE_CHUNK_SIZE - 1
+        self.create_rows(-1, 0, CASE_CHUNK_SIZE - 1, CASE_CHUNK_SIZE, last, last + 1, None)
+        queryset = ChoicesModel.objects.annotate(state_display=expression).order_by('pk')
+        self.assertEqual(list(queryset.values_list('state_display', flat=True)), [
+            None,
+            'Choice 0',
+            'Choice %d' % (CASE_CHUNK_SIZE - 1),
+            'Choice %d' % CASE_CHUNK_SIZE,
+            'Choice %d' % last,
+            None,
+            None,
+        ])
+
+        # String values are not split.
+        choices = Choices(*[('C%d' % index, 'v%d' % index, 'Choice %d' % index)
+                            for index in range(10 * CASE_CHUNK_SIZE)])
+        sql = ''.join(choices.display_expression('name').sql_parts)
+        self.assertEqual((sql.count('BETWEEN'), sql.count('CASE')), (0, 1))
+
+    def test_order_expression(self):
+        """Test the ordering by display name or declaration, unknown values last."""
+
+        self.create_rows(4, 2, 1, 3)
+
+        def ordered(by):
+            queryset = ChoicesModel.objects.order_by(
+                self.MY_CHOICES.order_expression('state', by=by))
+            return list(queryset.values_list('state', flat=True))
+
+        self.assertEqual(ordered('display'), [1, 3, 2, 4])
+        self.assertEqual(ordered('declaration'), [1, 2, 3, 4])
+
+        with self.assertRaises(ValueError):
+            self.MY_CHOICES.order_expression('state', by='value')
+
+    def test_compact_order_expression(self):
+        """Test that consecutive values with consecutive ranks use ranges."""
+
+        choices = Choices(*[('C%d' % index, index, 'Choice %04d' % index) for index in range(1000)])
+        choices.add_choices(('LAST', 2000, 'Choice 0500 bis'), ('MINUS', -1, 'Choice'))
+        expression = choices.order_expression('state', by='declaration')
+        self.assertEqual((len(expression.ranges), len(expression.mapping)), (1, 2))
+        # -1 ('Choice') to 500 ('Choice 0500'), then 2000 ('Choice 0500 bis'), then 501 to 999.
+        expression = choices.order_expression('state', by='display')
+        self.assertEqual((len(expression.ranges), len(expression.mapping)), (2, 1))
+
+        self.create_rows(2000, 501, 0, 999, -1, 500)
+        queryset = ChoicesModel.objects.order_by(choices.order_expression('state', by='display'))
+        self.assertEqual(list(queryset.values_list('state', flat=True)),
+                         [-1, 0, 500, 2000, 501, 999])
+
+        # String values cannot be compacted.
+        choices = Choices(('A', 'a', 'A'), ('B', 'b', 'B'))
+        self.assertEqual(len(choices.order_expression('name', by='declaration').mapping), 2)
+
+    def test_cache(self):
+        """Test that expressions are cached, per language for lazy display names."""
+
+        from django.utils import translation
+
+        expression = self.MY_CHOICES.display_expression('state')
+        self.assertIs(self.MY_CHOICES.display_expression('state'), expression)
+        self.assertIsNot(self.MY_CHOICES.display_expression('other'), expression)
+
+        # Adding choices resets the cache.
+        self.MY_CHOICES.add_choices(('FOUR', 4, 'And four to go'))
+        new_expression = self.MY_CHOICES.display_expression('state')
+        self.assertIsNot(new_expression, expression)
+        self.assertEqual(len(new_expression.mapping), 4)
+
+        lazy_choices = self.choices_class(('ONE', 1, ugettext_lazy('One')))
+        with translation.override('fr'):
+            expression = lazy_choices.display_expression('state')
+            self.assertIs(lazy_choices.display_expression('state'), expression)
+        with translation.override('en'):
+            self.assertIsNot(lazy_choices.display_expression('state'), expression)
+
+    def test_columnar_choices(self):
+        """Test that expressions work with ``ColumnarChoices``."""
+
+        choices = ColumnarChoices(('ONE', 1, 'One'), ('TWO', 2, 'Two'))
+        self.create_rows(2, 1)
+        queryset = ChoicesModel.objects.order_by(choices.order_expression('state'))
+        self.assertEqual(list(queryset.values_list('state', flat=True)), [1, 2])
+
+        choices.add_choices(('ZERO', 0, 'Zero'))
+        self.create_rows(0)
+        queryset = ChoicesModel.objects.order_by(choices.order_expression('state'))
+        self.assertEqual(list(queryset.values_list('state', flat=True)), [1, 2, 0])
+
+
+class CountByTestCase(DatabaseTestCase):
+    """Tests of the ``count_by`` method, to count rows by choice."""
+
+    def test_count_by(self):
+        """Test that counts are ordered, zero-filled, with unknown values apart, in one query."""
+
+        from django.test.utils import CaptureQueriesContext
+
+        self.create_rows(3, 1, 3, 4, None, 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            counts = self.MY_CHOICES.count_by(ChoicesModel.objects.order_by('name'), 'state')
+        self.assertEqual(len(queries), 1)
+
+        self.assertEqual(list(counts.keys()), self.MY_CHOICES.entries)
+        self.assertEqual(list(counts.values()), [1, 0, 3])
+        self.assertEqual(counts[self.MY_CHOICES.for_constant('THREE')], 3)
+        self.assertEqual(counts.unknown, {4: 1, None: 1})
+        self.assertEqual(counts.total, 6)
+
+        # The fallback entry is not used for unknown values.
+        choices = Choices(('ONE', 1, 'One'), ('OTHER', 0, 'Other'), fallback='OTHER')
+        counts = choices.count_by(ChoicesModel.objects.all(), 'state')
+        self.assertEqual(list(counts.values()), [1, 0])
+        self.assertEqual(counts.unknown, {3: 3, 4: 1, None: 1})
+
+    def test_subset(self):
+        """Test that only the values of a subset are counted with ``subset``."""
+
+        self.create_rows(3, 1, 2, 4, 3)
+
+        for subset in ('ODD', self.MY_CHOICES.ODD):
+            counts = self.MY_CHOICES.count_by(ChoicesModel.objects.all(), 'state', subset=subset)
+            self.assertEqual(list(counts.items()), [
+                (self.MY_CHOICES.for_constant('ONE'), 1),
+                (self.MY_CHOICES.for_constant('THREE'), 2),
+            ])
+            self.assertEqual(counts.unknown, {})
+
+        with self.assertRaises(ValueError):
+            self.MY_CHOICES.count_by(ChoicesModel.objects.all(), 'state', subset='EVEN')
+
+    def test_cache(self):
+        """Test that counts are cached by query in the given dict."""
+
+        from django.test.utils import CaptureQueriesContext
+
+        self.create_rows(1, 2)
+        cache = {}
+
+        with CaptureQueriesContext(connection) as queries:
+            counts = self.MY_CHOICES.count_by(ChoicesModel.objects.all(), 'state', cache=cache)
+            self.assertIs(
+                self.MY_CHOICES.count_by(ChoicesModel.objects.all(), 'state', cache=cache), counts)
+            # Another query, or another ``Choices``, is not taken from the cache.
+            self.MY_CHOICES.count_by(
+                ChoicesModel.objects.filter(state__gt=1), 'state', cache=cache)
+            self.MY_CHOICES.count_by(ChoicesModel.objects.all(), 'state', subset='ODD', cache=cache)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(len(cache), 3)
+
+
+class LookupsTestCase(DatabaseTestCase):
+    """Tests of the ``in_subset`` and ``const`` lookups."""
+
+    def setUp(self):
+        super(LookupsTestCase, self).setUp()
+        ChoicesModel.objects.bulk_create(
+            ChoicesModel(extended_state=state, name=str(state)) for state in (1, 2, 3, 4, None))
+
+    def filtered(self, **kwargs):
+        """Return the names of the rows matching the filter, ordered."""
+        return sorted(ChoicesModel.objects.filter(**kwargs).values_list('name', flat=True))
+
+    def test_in_subset(self):
+        """Test filtering on the values of a subset, given as a ``Choices`` or by name."""
+
+        self.assertEqual(self.filtered(extended_state__in_subset=REFERENCED_CHOICES.ODD),
+                         ['1', '3'])
+        self.assertEqual(
+            self.filtered(extended_state__in_subset=ChoicesValue(REFERENCED_CHOICES.ODD)),
+            ['1', '3'])
+        self.assertEqual(self.filtered(extended_state__in_subset='ODD'), ['1', '3'])
+        self.assertEqual(self.filtered(extended_state__in_subset=ChoicesValue(REFERENCED_CHOICES)),
+                         ['1', '2', '3'])
+        self.assertEqual(self.filtered(
+            extended_state__in_subset=Choices(('FOUR', 4, 'Four'))), ['4'])
+        self.assertEqual(self.filtered(extended_state__in_subset=Choices()), [])
+        self.assertEqual(self.filtered(
+            extended_state__in_subset=ColumnarChoices(('TWO', 2, 'Two'))), ['2'])
+        # As with ``__in``, excluding keeps the rows with ``NULL``.
+        self.assertEqual(sorted(ChoicesModel.objects.exclude(
+            extended_state__in_subset='ODD').values_list('name', flat=True)), ['2', '4', 'None'])
+
+        with self.assertRaises(ValueError):
+            self.filtered(extended_state__in_subset='EVEN')
+        with self.assertRaises(ValueError):
+            self.filtered(extended_state__in_subset=[1, 3])
+        with self.assertRaises(ValueError):
+            ChoicesValue([1, 3])
+
+        # ``Choices`` are never sent as is to the database: they are wrapped, and the wrapper is
+        # rejected by the other lookups.
+        for value in (REFERENCED_CHOICES, ChoicesValue(REFERENCED_CHOICES)):
+            with self.assertRaises(ValueError):
+                self.filtered(extended_state=value)
+            with self.assertRaises(ValueError):
+                self.filtered(extended_state__in=value)
+
+    def test_lookup_sql(self):
+        """Test that the SQL uses a range for consecutive integers, and is cached."""
+
+        self.assertEqual(get_lookup_sql(self.MY_CHOICES), ('BETWEEN %s AND %s', (1, 3)))
+        self.assertEqual(get_lookup_sql(self.MY_CHOICES.ODD), ('IN (%s, %s)', (1, 3)))
+        self.assertIs(get_lookup_sql(self.MY_CHOICES.ODD), get_lookup_sql(self.MY_CHOICES.ODD))
+
+        # Adding choices resets the cache.
+        self.MY_CHOICES.add_choices(('FIVE', 5, 'Five'))
+        self.assertEqual(get_lookup_sql(self.MY_CHOICES), ('IN (%s, %s, %s, %s)', (1, 2, 3, 5)))
+
+        queryset = ChoicesModel.objects.filter(
+            extended_state__in_subset=ChoicesValue(REFERENCED_CHOICES))
+        self.assertIn('BETWEEN', str(queryset.query))
+
+    def test_const(self):
+        """Test filtering on the value of a constant."""
+
+        self.assertEqual(self.filtered(extended_state__const='TWO'), ['2'])
+        self.assertEqual(self.filtered(extended_state__const='THREE'), ['3'])
+
+        with self.assertRaises(ValueError):
+            self.filtered(extended_state__const='FOUR')
+
+
+class ConstraintsTestCase(BaseTestCase):
+    """Tests of the constraints and partial indexes built from ``Choices``."""
+
+    def test_check_constraint(self):
+        """Test that the constraint is deterministic and enforced by the database."""
+
+        from django.db import IntegrityError, transaction
+
+        choices = Choices(('THREE', 3, 'Three'), ('ONE', 1, 'One'))
+        constraint = check_constraint(choices, 'state')
+        self.assertEqual(constraint.name, '%(app_label)s_%(class)s_state_choices')
+        self.assertEqual(constraint.check, models.Q(state__in=[1, 3]))
+        self.assertEqual(check_constraint(Choices(('ONE', 1, 'One'), ('THREE', 3, 'Three')),
+                                          'state'), constraint)
+        # Values that cannot be sorted stay in their order.
+        self.assertEqual(check_constraint(Choices(('A', 'a', 'A'), ('ONE', 1, 'One')),
+                                          'state', name='foo').check,
+                         models.Q(state__in=['a', 1]))
+
+        class ConstrainedModel(models.Model):
+            state = models.IntegerField(null=True)
+
+            class Meta:
+                app_label = 'extended_choices'
+                constraints = [check_constraint(choices, 'state')]
+
+        self.assertEqual(ConstrainedModel._meta.constraints[0].name,
+                         'extended_choices_constrainedmodel_state_choices')
+
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(ConstrainedModel)
+        try:
+            ConstrainedModel.objects.bulk_create([ConstrainedModel(state=1),
+                                                  ConstrainedModel(state=None)])
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                ConstrainedModel.objects.bulk_create([ConstrainedModel(state=2)])
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                ConstrainedModel.objects.update(state=2)
+            self.assertEqual(ConstrainedModel.objects.count(), 2)
+        finally:
+            with connection.schema_editor() as schema_editor:
+                schema_editor.delete_model(ConstrainedModel)
+
+    def test_subset_indexes(self):
+        """Test that the partial indexes are deterministic and created by the database."""
+
+        self.MY_CHOICES.add_subset('ALL_BUT_ONE_IN_A_VERY_LONG_NAME', ('TWO', 'THREE'))
+        indexes = subset_indexes(self.MY_CHOICES, 'state', prefix='content')
+        self.assertEqual([index.name for index in indexes], [
+            'content_state_odd',
+            get_index_name('content', 'state', 'ALL_BUT_ONE_IN_A_VERY_LONG_NAME')])
+        self.assertEqual(len(indexes[1].name), 30)
+        self.assertEqual(indexes[0].condition, models.Q(state__in=[1, 3]))
+        self.assertEqual(indexes, subset_indexes(self.MY_CHOICES, 'state', prefix='content'))
+
+        # Names can be given, for each subset.
+        self.assertEqual([index.name for index in subset_indexes(
+            self.MY_CHOICES, 'state', prefix='content', names={'ODD': 'odd_states'})],
+            ['odd_states', indexes[1].name])
+        index = subset_index(self.MY_CHOICES, 'state', 'ODD', fields=['name', 'state'],
+                             name='name_state_odd')
+        self.assertEqual((index.fields, index.name), (['name', 'state'], 'name_state_odd'))
+
+        with self.assertRaises(ValueError):
+            subset_index(self.MY_CHOICES, 'state', 'EVEN', prefix='content')
+        # Without name nor prefix, the names of the indexes of different models would collide.
+        with self.assertRaises(ValueError):
+            subset_indexes(self.MY_CHOICES, 'state')
+
+        # Two models indexing the same field and subset.
+        class IndexedModel(models.Model):
+            state = models.IntegerField(null=True)
+
+            class Meta:
+                app_label = 'extended_choices'
+                indexes = subset_indexes(REFERENCED_CHOICES, 'state', ['ODD'], prefix='indexed')
+
+        class OtherIndexedModel(models.Model):
+            state = models.IntegerField(null=True)
+
+            class Meta:
+                app_label = 'extended_choices'
+                indexes = subset_indexes(REFERENCED_CHOICES, 'state', ['ODD'], prefix='other')
+
+        for model, name in ((IndexedModel, 'indexed_state_odd'),
+                            (OtherIndexedModel, 'other_state_odd')):
+            self.assertEqual(model.check(), [])
+            with connection.schema_editor() as schema_editor:
+                schema_editor.create_model(model)
+            self.addCleanup(self.delete_model, model)
+            with connection.cursor() as cursor:
+                index_constraints = connection.introspection.get_constraints(
+                    cursor, model._meta.db_table)
+            self.assertEqual(index_constraints[name]['columns'], ['state'])
+
+    def delete_model(self, model):
+        """Drop the table of a model created by a test."""
+        with connection.schema_editor() as schema_editor:
+            schema_editor.delete_model(model)
+
+
+class ReferencesTestCase(BaseTestCase):
+    """Tests of the references to ``Choices`` in migrations."""
+
+    def test_deconstruct(self):
+        """Test that choices having an import path are deconstructed as a reference."""
+
+        field = ExtendedChoiceIntegerField(choices=REFERENCED_CHOICES)
+        kwargs = field.deconstruct()[3]
+        self.assertIsInstance(kwargs['choices'], ChoicesReference)
+        self.assertIs(kwargs['choices'].choices, REFERENCED_CHOICES)
+        self.assertIs(field.clone().choices, REFERENCED_CHOICES)
+
+        # Without import path, Django deconstructs choices as a list.
+        field = ExtendedChoiceIntegerField(choices=self.MY_CHOICES)
+        self.assertEqual(field.deconstruct()[3]['choices'], [
+            (1, 'One for the money'), (2, 'Two for the show'), (3, 'Three to get ready')])
+
+    def test_serialize(self):
+        """Test that references are written as import paths in migrations."""
+
+        from django.db.migrations.writer import MigrationWriter
+
+        string, imports = MigrationWriter.serialize(
+            ExtendedChoiceIntegerField(choices=REFERENCED_CHOICES.ODD))
+        self.assertEqual(string, 'extended_choices.fields.ExtendedChoiceIntegerField('
+                                 'choices=%s.REFERENCED_CHOICES.ODD)' % __name__)
+        self.assertEqual(imports, {'import extended_choices.fields', 'import %s' % __name__})
+
+    def test_fingerprint(self):
+        """Test that references are compared by fingerprint, by the migrations autodetector."""
+
+        from django.db.migrations.autodetector import MigrationAutodetector
+        from django.db.migrations.state import ModelState, ProjectState
+
+        same = Choices(*REFERENCED_CHOICES.entries, import_path=REFERENCED_CHOICES.import_path)
+        self.assertEqual(get_fingerprint(same), get_fingerprint(REFERENCED_CHOICES))
+        self.assertEqual(ChoicesReference(same), ChoicesReference(REFERENCED_CHOICES))
+
+        other = Choices(('ONE', 1, 'One'), import_path=REFERENCED_CHOICES.import_path)
+        self.assertNotEqual(ChoicesReference(other), ChoicesReference(REFERENCED_CHOICES))
+
+        def get_state(choices):
+            state = ProjectState()
+            state.add_model(ModelState('extended_choices', 'Content', [
+                ('id', models.AutoField(primary_key=True)),
+                ('state', ExtendedChoiceIntegerField(choices=choices)),
+            ]))
+            return state
+
+        def detect_changes(from_choices, to_choices):
+            autodetector = MigrationAutodetector(get_state(from_choices), get_state(to_choices))
+            return autodetector._detect_changes()  # pylint: disable=protected-access
+
+        self.assertEqual(detect_changes(REFERENCED_CHOICES, same), {})
+        changes = detect_changes(REFERENCED_CHOICES, other)
+        self.assertEqual([operation.__class__.__name__
+                          for operation in changes['extended_choices'][0].operations],
+                         ['AlterField'])
+
+        # The fingerprint is reset when choices are added.
+        fingerprint = get_fingerprint(self.MY_CHOICES)
+        self.MY_CHOICES.add_choices(('FOUR', 4, 'Four'))
+        self.assertNotEqual(get_fingerprint(self.MY_CHOICES), fingerprint)
+
+
+class ConvertTrackingChoices(Choices):
+    """``Choices`` saving the choices validated by ``_convert_choices``."""
+
+    converted = []
+
+    def _convert_choices(self, choices):
+        if choices:
+            self.converted.append(choices)
+        return super(ConvertTrackingChoices, self)._convert_choices(choices)
+
+
+class ChoiceSetTestCase(BaseTestCase):
+    """Tests of ``ChoiceSet``."""
+
+    def test_items(self):
+        """Test that sets are created from, and look up, entries, values and constants."""
+
+        one, two, three = self.MY_CHOICES.entries
+        choice_set = ChoiceSet(self.MY_CHOICES, [one, 3])
+
+        self.assertEqual(choice_set.mask, 5)
+        self.assertEqual(choice_set, ChoiceSet(self.MY_CHOICES, ['ONE', self.MY_CHOICES.THREE]))
+        self.assertEqual(choice_set, ChoiceSet(self.MY_CHOICES, self.MY_CHOICES.ODD))
+        self.assertEqual(ChoiceSet(self.MY_CHOICES), ChoiceSet.from_mask(self.MY_CHOICES, 0))
+        self.assertEqual(list(choice_set), [one, three])
+        self.assertEqual(choice_set.constants, ['ONE', 'THREE'])
+        self.assertEqual(choice_set.values, [1, 3])
+        self.assertEqual(len(choice_set), 2)
+        self.assertTrue(choice_set)
+        self.assertFalse(ChoiceSet(self.MY_CHOICES))
+
+        for item in (one, 1, 'ONE', self.MY_CHOICES.ONE, three):
+            self.assertIn(item, choice_set)
+        for item in (two, 2, 'TWO', 4, 'FOUR', [1]):
+            self.assertNotIn(item, choice_set)
+
+        with self.assertRaises(ValueError):
+            ChoiceSet(self.MY_CHOICES, [4])
+
+        # Bits without entry are ignored.
+        self.assertEqual(ChoiceSet.from_mask(self.MY_CHOICES, 0b1101), choice_set)
+
+    def test_operators(self):
+        """Test the set operators and comparisons."""
+
+        odd = ChoiceSet.from_subset(self.MY_CHOICES, 'ODD')
+        one_two = ChoiceSet(self.MY_CHOICES, [1, 2])
+
+        def constants(choice_set):
+            return choice_set.constants
+
+        self.assertEqual(constants(odd | one_two), ['ONE', 'TWO', 'THREE'])
+        self.assertEqual(constants(odd & one_two), ['ONE'])
+        self.assertEqual(constants(odd - one_two), ['THREE'])
+        self.assertEqual(constants(odd ^ one_two), ['TWO', 'THREE'])
+        self.assertEqual(constants(odd | {2}), ['ONE', 'TWO', 'THREE'])
+        self.assertEqual(constants({'ONE', 'TWO'} - odd), ['TWO'])
+        self.assertEqual(constants(odd.union([2])), ['ONE', 'TWO', 'THREE'])
+        self.assertEqual(constants(odd.intersection(['TWO', 'THREE'])), ['THREE'])
+        self.assertEqual(constants(odd.difference([1])), ['THREE'])
+        self.assertEqual(constants(odd.symmetric_difference([1, 2])), ['TWO', 'THREE'])
+
+        self.assertTrue(odd & one_two < one_two)
+        self.assertTrue(odd <= odd)
+        self.assertFalse(odd < odd)
+        self.assertTrue(odd | one_two > odd)
+        self.assertTrue(odd >= {'ONE'})
+        self.assertTrue(odd.issubset([1, 2, 3]))
+        self.assertTrue(odd.issuperset([3]))
+        self.assertTrue(odd.isdisjoint([2]))
+        self.assertFalse(odd.isdisjoint(one_two))
+
+        with self.assertRaises(TypeError):
+            odd | [2]
+        with self.assertRaises(ValueError):
+            odd | ChoiceSet(deepcopy(self.MY_CHOICES), [2])
+
+    def test_unknown_items(self):
+        """Test that items of python sets not in the choices follow the set semantics."""
+
+        odd = ChoiceSet.from_subset(self.MY_CHOICES, 'ODD')
+        one, two, three = self.MY_CHOICES.entries
+
+        # They are not in the result of ``&`` and ``-``, that is still a ``ChoiceSet``.
+        self.assertEqual((odd & {1, 4}).constants, ['ONE'])
+        self.assertEqual((odd - {1, 'FOUR'}).constants, ['THREE'])
+        self.assertEqual(odd.intersection([3, 4]).constants, ['THREE'])
+        self.assertTrue(odd.isdisjoint([2, 4]))
+
+        # Else the result is a ``frozenset`` of the entries and of these items.
+        self.assertEqual(odd | {2, 4}, frozenset([one, two, three, 4]))
+        self.assertEqual({2, 4} | odd, frozenset([one, two, three, 4]))
+        self.assertEqual(odd ^ {1, 4}, frozenset([three, 4]))
+        self.assertEqual({1, 2, 4} - odd, frozenset([two, 4]))
+        self.assertEqual(odd.union([4]), frozenset([one, three, 4]))
+        self.assertIsInstance(odd | {2}, ChoiceSet)
+
+        self.assertTrue(odd <= {1, 3, 4})
+        self.assertTrue(odd < {1, 3, 4})
+        self.assertFalse(odd >= {1, 4})
+        self.assertFalse(odd > {4})
+        self.assertTrue(odd > {1})
+        self.assertTrue(odd.issubset([1, 3, 4]))
+        self.assertFalse(odd.issuperset([1, 4]))
+
+    def test_contains_added_choices(self):
+        """Test that ``in`` finds the values of entries added after the creation of the set."""
+
+        choice_set = ChoiceSet(self.MY_CHOICES, [1])
+        self.MY_CHOICES.add_choices(('FOUR', 4, 'Four'))
+        self.assertNotIn(4, choice_set)
+        self.assertIn(4, choice_set | {4})
+        self.assertIn(4, ChoiceSet.from_mask(self.MY_CHOICES, 0b1000))
+        self.assertIn(1, choice_set)
+
+    def test_hash(self):
+        """Test that sets are hashable, equal only to sets of the same ``Choices``."""
+
+        odd = ChoiceSet(self.MY_CHOICES, [1, 3])
+        cache = {odd: 'odd'}
+        self.assertEqual(cache[ChoiceSet(self.MY_CHOICES, ['THREE', 'ONE'])], 'odd')
+        self.assertNotEqual(odd, ChoiceSet(deepcopy(self.MY_CHOICES), [1, 3]))
+        self.assertNotEqual(odd, frozenset(odd))
+        self.assertEqual(frozenset(odd), frozenset(self.MY_CHOICES.ODD.entries))
+
+    def test_subsets(self):
+        """Test the conversion to and from subsets."""
+
+        odd = ChoiceSet.from_subset(self.MY_CHOICES, 'ODD')
+        subset = odd.to_subset()
+        self.assertEqual(subset, self.MY_CHOICES.ODD)
+        self.assertIs(subset.for_value(1), self.MY_CHOICES.for_value(1))
+
+        with self.assertRaises(ValueError):
+            ChoiceSet.from_subset(self.MY_CHOICES, 'EVEN')
+
+        # A set of a subset.
+        subset_set = ChoiceSet(self.MY_CHOICES.ODD, ['THREE'])
+        self.assertEqual(subset_set.mask, 2)
+        self.assertNotIn('TWO', subset_set)
+
+    def test_added_choices(self):
+        """Test that sets are still valid, and can use new entries, when choices are added."""
+
+        choice_set = ChoiceSet(self.MY_CHOICES, [1, 3])
+        self.MY_CHOICES.add_choices(('FOUR', 4, 'Four'))
+        self.assertEqual(choice_set.constants, ['ONE', 'THREE'])
+        self.assertEqual((choice_set | {4}).constants, ['ONE', 'THREE', 'FOUR'])
+
+    def test_many_entries(self):
+        """Test sets of ``Choices`` having too many entries for byte tables."""
+
+        choices = Choices(*[('C%d' % index, index, 'Choice %d' % index) for index in range(200)])
+        self.assertIsNone(get_bit_tables(choices).byte_tables)
+
+        choice_set = ChoiceSet(choices, range(0, 200, 7))
+        self.assertEqual(choice_set.values, list(range(0, 200, 7)))
+        self.assertIn(196, choice_set)
+        self.assertEqual(len(choice_set - ChoiceSet(choices, [0, 196])), len(range(0, 200, 7)) - 2)
+
+    def test_pickle(self):
+        """Test that sets of ``Choices`` having an import path are pickled by reference."""
+
+        choice_set = ChoiceSet(REFERENCED_CHOICES, REFERENCED_CHOICES.ODD)
+        self.assertEqual(pickle.loads(pickle.dumps(choice_set)), choice_set)
+
+
+class SchemaTestCase(BaseTestCase):
+    """Test the export of ``Choices`` to a schema and the loading from it."""
+
+    def assertSameChoices(self, loaded, original):
+        """Check that the two ``Choices`` instances have the same content."""
+        self.assertIs(loaded.__class__, original.__class__)
+        self.assertIs(loaded.dict_class, original.dict_class)
+        self.assertEqual(loaded._mutable, original._mutable)
+        self.assertEqual(loaded.entries, original.entries)
+        self.assertEqual(list(loaded.values), list(original.values))
+        self.assertEqual([entry.attributes for entry in loaded.entries],
+                         [entry.attributes for entry in original.entries])
+        self.assertEqual(loaded.subsets, original.subsets)
+        self.assertEqual(loaded.codes, original.codes)
+        self.assertEqual(loaded.fallback, original.fallback)
+        self.assertEqual(bool(loaded.unknown_values), bool(original.unknown_values))
+        if original.unknown_values:
+            self.assertEqual(loaded.unknown_values.max_size, original.unknown_values.max_size)
+        for name in original.subsets:
+            self.assertEqual(getattr(loaded, name).entries, getattr(original, name).entries)
+            self.assertEqual(getattr(loaded, name).codes, getattr(original, name).codes)
+            self.assertEqual(getattr(loaded, name).fallback, getattr(original, name).fallback)
+            # Entries are shared with the subsets.
+            for entry in getattr(loaded, name).entries:
+                self.assertIs(entry, loaded.for_constant(entry.constant))
+
+    def test_round_trip(self):
+        """Test that exported choices are loaded back with the same content."""
+
+        ordered = OrderedChoices(('FOO', 'foo', 'Foo'), ('BAR', 'bar', 'Bar', {'bar': [1, 2]}))
+        ordered.add_subset('BARS', ('BAR', ))
+        auto = AutoChoices('FOO', ('BAR', {'bar': 1}), name='ALL')
+        configured = Choices(('UNKNOWN', 0, 'Unknown'), ('FOO', 1, 'Foo'), fallback='UNKNOWN',
+                             track_unknown=10, codes={'UNKNOWN': 0, 'FOO': 7})
+        configured.add_subset('KNOWN', ('FOO', ))
+        configured.add_subset('ALL', ('UNKNOWN', 'FOO'))
+
+        for original in (self.MY_CHOICES, ordered, auto, self.MY_CHOICES.ODD, configured):
+            self.assertSameChoices(Choices.from_dict(original.to_dict()), original)
+            self.assertSameChoices(Choices.from_json(original.to_json()), original)
+            # Without the fingerprint, the choices are loaded by ``add_choices``.
+            data = original.to_dict()
+            data['fingerprint'] = None
+            self.assertSameChoices(Choices.from_dict(data), original)
+
+        # The fallback and the tracking of unknown keys work, also in subsets.
+        loaded = Choices.from_json(configured.to_json())
+        self.assertEqual(loaded.get_for_value(5).constant, 'UNKNOWN')
+        self.assertEqual(loaded.ALL.get_for_value(6).constant, 'UNKNOWN')
+        self.assertEqual(sorted(loaded.unknown_values.most_common()),
+                         [(('value', 5), 1), (('value', 6), 1)])
+
+        # Schemas of version 1 have no codes, fallback or tracking of unknown keys.
+        data = self.MY_CHOICES.to_dict()
+        for key in ('codes', 'fallback', 'track_unknown'):
+            del data[key]
+        data['version'] = 1
+        data['fingerprint'] = compute_fingerprint(data)
+        self.assertSameChoices(Choices.from_dict(data), self.MY_CHOICES)
+
+        # The new instance behaves as a normal one.
+        loaded = Choices.from_json(self.MY_CHOICES.to_json())
+        self.assertEqual(loaded.ONE, 1)
+        self.assertEqual(loaded.ONE.one, 'money')
+        self.assertEqual(loaded.for_display('Two for the show').constant, 'TWO')
+        loaded.add_choices(('FOUR', 4, 'And four to go'))
+        self.assertEqual(loaded.FOUR, 4)
+
+    def test_loading_checks_class(self):
+        """Test that the loaded class must be a subclass of the class used to load."""
+
+        data = self.MY_CHOICES.to_dict()
+        with self.assertRaises(ValueError):
+            AutoChoices.from_dict(data)
+
+        data['class'] = 'extended_choices.helpers.ChoiceEntry'
+        with self.assertRaises(ValueError):
+            Choices.from_dict(data)
+
+        data = self.MY_CHOICES.to_dict()
+        data['version'] = 0
+        with self.assertRaises(ValueError):
+            Choices.from_dict(data)
+
+        # Modules are never imported: classes must already be loaded, and dict classes allowed.
+        data = self.MY_CHOICES.to_dict()
+        self.assertNotIn('tabnanny', sys.modules)
+        data['class'] = 'tabnanny.Choices'
+        with self.assertRaises(ValueError):
+            Choices.from_dict(data)
+        self.assertNotIn('tabnanny', sys.modules)
+        data = self.MY_CHOICES.to_dict()
+        data['dict_class'] = 'collections.defaultdict'
+        with self.assertRaises(ValueError):
+            Choices.from_dict(data)
+        data['dict_class'] = 'collections.OrderedDict'
+        self.assertIs(Choices.from_dict(data).dict_class, OrderedDict)
+        data['class'] = '%s.ConvertTrackingChoices' % __name__
+        self.assertIs(type(Choices.from_dict(data)), ConvertTrackingChoices)
+
+    def test_fingerprint(self):
+        """Test that choices are validated by ``add_choices`` only when the fingerprint changed."""
+
+        data = ConvertTrackingChoices(('FOO', 1, 'foo'), ('BAR', 2, 'bar')).to_dict()
+        ConvertTrackingChoices.converted = []
+
+        # Unchanged data: no validation by ``add_choices``.
+        ConvertTrackingChoices.from_dict(data)
+        self.assertEqual(ConvertTrackingChoices.converted, [])
+
+        # Wrong fingerprint: validation.
+        data['displays'] = ['foo', 'baz']
+        self.assertEqual(ConvertTrackingChoices.from_dict(data).BAR.display, 'baz')
+        self.assertEqual(len(ConvertTrackingChoices.converted), 1)
+
+    def test_structure_is_always_checked(self):
+        """Test that the structure is checked even with a valid, but forged, fingerprint."""
+
+        def forged(**changes):
+            data = self.MY_CHOICES.to_dict()
+            data.update(changes)
+            data['fingerprint'] = compute_fingerprint(data)
+            return data
+
+        for changes in (
+                {'values': [1, 1, 3]},
+                {'values': [1, 2]},
+                {'constants': ['ONE', 'TWO', 'add_choices']},
+                {'constants': ['ONE', 'TWO', 'subsets']},
+                {'constants': ['ONE', 'TWO', 3]},
+                {'values': [1, 2, {}]},
+                {'attributes': [None, None, 'money']},
+                {'subsets': [['for_value', ['ONE']]]},
+                {'subsets': [['ODD', ['ONE']], ['ODD', ['TWO']]]},
+                {'subsets': [['ONE', ['ONE']]]},
+                {'subsets': [['ODD', ['FOUR']]]},
+                {'subsets': [['ODD', [['ONE']]]]},
+                {'subsets': [['ODD', [{}]]]},
+                {'subsets': [['ODD']]},
+                {'subsets': {'ODD': ['ONE']}},
+                {'codes': {'FOUR': 4}},
+                {'codes': {'ONE': '1'}},
+                {'codes': {'ONE': 1, 'TWO': 1}},
+                {'codes': {'ONE': 40000}},
+                {'codes': [['ONE', 1]]},
+                {'fallback': 'FOUR'},
+                {'fallback': ['ONE']},
+                {'track_unknown': 0},
+                {'track_unknown': '10'},
+        ):
+            with self.assertRaises(ValueError):
+                Choices.from_dict(forged(**changes))
+
+        # Values that were tuples are loaded as tuples, not as the lists of JSON.
+        choices = Choices(('ORIGIN', (0, 0), 'Origin'), ('NESTED', (1, (2, 3)), 'Nested'))
+        for loaded in (Choices.from_json(choices.to_json()),
+                       Choices.from_json(choices.to_json().replace('"fingerprint"', '"f"'))):
+            self.assertEqual(loaded.NESTED, (1, (2, 3)))
+            self.assertIs(loaded.for_value((0, 0)).constant, loaded.ORIGIN.constant)
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        """Test that choices can be exported and loaded with msgpack."""
+
+        self.assertSameChoices(Choices.from_msgpack(self.MY_CHOICES.to_msgpack()), self.MY_CHOICES)
+
+
+class PackedChoicesTestCase(BaseTestCase):
+    """Test the ``PackedChoices`` class."""
+
+    def assertSameLookups(self, packed, choices):
+        """Check that all lookups in ``packed`` return the same entries as in ``choices``."""
+        self.assertEqual(len(packed), len(choices))
+        for entry in choices.entries:
+            for packed_entry in (packed.for_constant(entry.constant),
+                                 packed.for_value(entry.value),
+                                 packed.for_display(entry.display)):
+                self.assertEqual(packed_entry, entry)
+                self.assertEqual(packed_entry.attributes, entry.attributes)
+            self.assertTrue(packed.has_constant(entry.constant))
+            self.assertTrue(packed.has_value(entry.value))
+            self.assertTrue(packed.has_display(entry.display))
+            self.assertIn(entry.value, packed)
+
+    def test_lookups(self):
+        """Test that entries are found by constant, value and display."""
+
+        self.assertSameLookups(PackedChoices(pack_choices(self.MY_CHOICES)), self.MY_CHOICES)
+
+        # With negative and big integers, declared not sorted.
+        choices = Choices(('A', 2 ** 40, 'a'), ('B', -5, 'b'), ('C', 0, 'c'), ('D', 7, 'd'))
+        self.assertSameLookups(PackedChoices(pack_choices(choices)), choices)
+
+        # With strings values, including non-ascii ones.
+        choices = AutoChoices('FOO', 'BAR', ('BAZ', 'b\xe4z', 'B\xe4z'), ('QUX', {'qux': 1}))
+        self.assertSameLookups(PackedChoices(pack_choices(choices)), choices)
+
+        # Many entries.
+        choices = Choices(*[('C%d' % i, i * 3, 'Choice %d' % i) for i in range(1000)])
+        self.assertSameLookups(PackedChoices(pack_choices(choices)), choices)
+
+        # No entries.
+        packed = PackedChoices(pack_choices(Choices()))
+        self.assertEqual(len(packed), 0)
+        self.assertFalse(packed.has_value(1))
+
+    def test_missing_keys(self):
+        """Test that missing keys raise ``KeyError`` for ``for_*`` methods."""
+
+        packed = PackedChoices(pack_choices(self.MY_CHOICES))
+        for method, key in ((packed.for_constant, 'FOUR'), (packed.for_value, 4),
+                            (packed.for_value, 'ONE'), (packed.for_value, 1.5),
+                            (packed.for_display, 'foo'), (packed.for_constant, 1)):
+            with self.assertRaises(KeyError):
+                method(key)
+        self.assertEqual(packed.for_value(1.0).constant, 'ONE')
+
+    def test_entries_are_created_once(self):
+        """Test that entries are created on demand, only once."""
+
+        packed = PackedChoices(pack_choices(self.MY_CHOICES))
+        self.assertEqual(packed._entries, {})
+        self.assertTrue(packed.has_value(1))
+        self.assertEqual(packed._entries, {})
+        self.assertIs(packed.for_value(1), packed.for_constant('ONE'))
+        self.assertEqual(list(packed._entries), [0])
+
+    def test_attributes_are_decoded_lazily(self):
+        """Test that the attributes of an entry are only decoded when the entry is created."""
+
+        choices = Choices(('ONE', 1, 'One', {'hidden': False}), ('TWO', 2, 'Two', {'hidden': True}))
+        data = bytearray(pack_choices(choices))
+        start = data.index(b'{"hidden": true}')
+        data[start:start + 16] = b'{"hidden": tru!}'
+
+        # The invalid JSON of the second entry doesn't prevent to use the first one.
+        packed = PackedChoices(data)
+        self.assertIs(packed.for_value(1).hidden, False)
+        self.assertTrue(packed.has_value(2))
+        with self.assertRaises(ValueError):
+            packed.for_value(2)
+
+    def test_invalid_values(self):
+        """Test that only integers or strings values can be packed."""
+
+        for choices in (Choices(('A', 1, 'a'), ('B', 'b', 'b')),
+                        Choices(('A', 1.5, 'a')),
+                        Choices(('A', 2 ** 64, 'a'))):
+            with self.assertRaises(ValueError):
+                pack_choices(choices)
+
+        with self.assertRaises(ValueError):
+            PackedChoices(b'foo' * 10)
+
+    def test_lazy_displays(self):
+        """Test that lazy displays are packed as strings."""
+
+        packed = PackedChoices(pack_choices(Choices(('ONE', 1, ugettext_lazy('One')))))
+        self.assertEqual(packed.for_display('One').constant, 'ONE')
+
+    @unittest.skipIf(not hasattr(os, 'fork'), "os.fork is not available")
+    def test_shared_choices_in_forked_process(self):
+        """Test that a forked process can use choices shared by its parent."""
+
+        shared = SharedChoices.create(self.MY_CHOICES)
+        self.addCleanup(shared.close)
+        self.assertSameLookups(shared, self.MY_CHOICES)
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if not pid:  # pragma: no cover
+            os.close(read_fd)
+            os.write(write_fd, shared.for_value(2).display.encode('utf-8'))
+            os._exit(0)
+
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        self.assertEqual(os.read(read_fd, 100), b'Two for the show')
+        os.close(read_fd)
+
+    @unittest.skipIf(shared_memory is None, "multiprocessing.shared_memory is not available")
+    def test_named_shared_choices(self):
+        """Test that choices can be shared by name."""
+
+        name = 'extended_choices_test_%d' % os.getpid()
+        shared = SharedChoices.create(self.MY_CHOICES, name=name)
+        self.addCleanup(shared.unlink)
+        self.addCleanup(shared.close)
+
+        attached = SharedChoices.attach(name)
+        self.assertSameLookups(attached, self.MY_CHOICES)
+        attached.close()
+
+    @unittest.skipIf(shared_memory is None, "multiprocessing.shared_memory is not available")
+    def test_attach_in_threads(self):
+        """Test that attaching doesn't prevent other threads to track their shared memory."""
+
+        from multiprocessing import resource_tracker
+        register = resource_tracker.register
+        registered = []
+
+        def record(name, rtype):
+            registered.append(name)
+            register(name, rtype)
+
+        resource_tracker.register = record
+        self.addCleanup(setattr, resource_tracker, 'register', register)
+
+        name = 'extended_choices_test_threads_%d' % os.getpid()
+        shared = SharedChoices.create(self.MY_CHOICES, name=name)
+        self.addCleanup(shared.unlink)
+        self.addCleanup(shared.close)
+
+        attached, created = [], []
+
+        def attach():
+            for __ in range(200):
+                attached.append(SharedChoices.attach(name))
+
+        def create():
+            for index in range(100):
+                memory = shared_memory.SharedMemory(
+                    name='%s_%d' % (name, index), create=True, size=8)
+                created.append(memory)
+
+        threads = [threading.Thread(target=attach) for __ in range(4)]
+        threads.append(threading.Thread(target=create))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for memory in created:
+            memory.close()
+            memory.unlink()
+
+        self.assertIs(resource_tracker.register, record)
+        self.assertEqual(len(attached), 800)
+        for instance in attached:
+            self.assertEqual(instance.ONE, 1)
+            instance.close()
+
+        # Every block created by the other thread is still tracked.
+        if os.name == 'posix':
+            for memory in created:
+                self.assertIn(memory._name, registered)
+
+
+class MmapChoicesTestCase(BaseTestCase):
+    """Test the ``MmapChoices`` class."""
+
+    def setUp(self):
+        super(MmapChoicesTestCase, self).setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'choices')
+
+    def get_mmap_choices(self, choices):
+        """Write the choices in a file and return a ``MmapChoices`` reading it."""
+        build_mmap_file(choices, self.path)
+        mmap_choices = MmapChoices(self.path)
+        self.addCleanup(mmap_choices.close)
+        return mmap_choices
+
+    def test_read_api(self):
+        """Test that ``MmapChoices`` provides the read API of ``Choices``."""
+
+        mmap_choices = self.get_mmap_choices(self.MY_CHOICES)
+
+        self.assertEqual(len(mmap_choices), 3)
+        self.assertEqual(list(mmap_choices), list(self.MY_CHOICES))
+        self.assertEqual(mmap_choices.choices, self.MY_CHOICES.choices)
+        self.assertEqual(list(mmap_choices.iter_entries()), self.MY_CHOICES.entries)
+
+        self.assertEqual(mmap_choices.for_constant('ONE'), ('ONE', 1, 'One for the money'))
+        self.assertEqual(mmap_choices.for_constant('ONE').one, 'money')
+        self.assertEqual(mmap_choices.for_value(2).constant, 'TWO')
+        self.assertEqual(mmap_choices.for_display('Three to get ready').value, 3)
+        self.assertTrue(mmap_choices.has_constant('TWO'))
+        self.assertFalse(mmap_choices.has_value(4))
+        self.assertIn(3, mmap_choices)
+
+        self.assertEqual(mmap_choices.ONE, 1)
+        self.assertEqual(mmap_choices['TWO'], 2)
+        self.assertEqual(mmap_choices[0], (1, 'One for the money'))
+        self.assertEqual(mmap_choices[-1], (3, 'Three to get ready'))
+        with self.assertRaises(AttributeError):
+            mmap_choices.FOUR
+        with self.assertRaises(KeyError):
+            mmap_choices['FOUR']
+        with self.assertRaises(IndexError):
+            mmap_choices[3]
+
+    def test_huge_catalog(self):
+        """Test lookups in a catalog with many entries."""
+
+        choices = AutoDisplayChoices()
+        for start in range(0, 20000, 1000):
+            choices.add_choices(*[('CODE_%d' % i, 'c%05d' % i) for i in range(start, start + 1000)])
+
+        mmap_choices = self.get_mmap_choices(choices)
+        self.assertEqual(len(mmap_choices), 20000)
+        for i in (0, 1, 9999, 12345, 19999):
+            self.assertEqual(mmap_choices.for_value('c%05d' % i).constant, 'CODE_%d' % i)
+            self.assertEqual(mmap_choices.for_constant('CODE_%d' % i).value, 'c%05d' % i)
+            self.assertEqual(mmap_choices.for_display('Code %d' % i).value, 'c%05d' % i)
+        self.assertFalse(mmap_choices.has_value('c20000'))
+
+    def test_django_field(self):
+        """Test that ``MmapChoices`` can be used as choices of a django field."""
+
+        from django.db.models import IntegerField
+        field = IntegerField(choices=self.get_mmap_choices(self.MY_CHOICES))
+        self.assertEqual(field._check_choices(), [])
+        field.validate(1, None)
+        with self.assertRaises(ValidationError):
+            field.validate(4, None)
+
+    def test_rebuild_file(self):
+        """Test that rebuilding the file doesn't affect instances reading the previous one."""
+
+        mmap_choices = self.get_mmap_choices(self.MY_CHOICES)
+        new_mmap_choices = self.get_mmap_choices(Choices(('FOUR', 4, 'And four to go')))
+
+        self.assertEqual(mmap_choices.for_value(1).constant, 'ONE')
+        self.assertFalse(mmap_choices.has_value(4))
+        self.assertEqual(new_mmap_choices.for_value(4).constant, 'FOUR')
+        self.assertFalse(new_mmap_choices.has_value(1))
+
+    @unittest.skipIf(os.name != 'posix', "file modes are only checked on posix")
+    def test_file_mode(self):
+        """Test that the file is readable by all, masked by the umask, as any new file."""
+
+        for umask, mode in ((0o022, 0o644), (0o077, 0o600)):
+            previous_umask = os.umask(umask)
+            try:
+                build_mmap_file(self.MY_CHOICES, self.path)
+            finally:
+                os.umask(previous_umask)
+            self.assertEqual(os.stat(self.path).st_mode & 0o777, mode)
 
 
 class ChoiceAttributeMixinTestCase(BaseTestCase):
@@ -779,7 +2940,9 @@ class ChoiceAttributeMixinTestCase(BaseTestCase):
     def test_it_should_create_classes_on_the_fly(self):
         """Test that ``get_class_for_value works and cache its results."""
 
-        # Empty list of cached classes to really test.
+        # Empty list of cached classes to really test (and restore the real one after the test).
+        self.addCleanup(setattr, ChoiceAttributeMixin, '_classes_by_type',
+                        ChoiceAttributeMixin._classes_by_type)
         ChoiceAttributeMixin._classes_by_type = {}
 
         # Create a class on the fly.
@@ -811,6 +2974,39 @@ class ChoiceAttributeMixinTestCase(BaseTestCase):
         self.assertEqual(float_attr, 1.5)
         self.assertIsInstance(float_attr, float)
 
+    def test_common_classes_should_be_created_at_import(self):
+        """Test that classes for common types are already in the cache."""
+
+        for value in (1, 'foo', b'foo', 1.5, Decimal('1.5'), ugettext_lazy('foo')):
+            self.assertIn(value.__class__, ChoiceAttributeMixin._classes_by_type)
+
+    def test_concurrent_class_creation(self):
+        """Test that concurrent threads get the same class for a new type."""
+
+        class MyInt(int):
+            pass
+
+        class MyChoiceAttributeMixin(ChoiceAttributeMixin):
+            _classes_by_type = {}
+
+        start = threading.Event()
+        classes = []
+
+        def get_class():
+            start.wait()
+            classes.append(MyChoiceAttributeMixin.get_class_for_value(MyInt(1)))
+
+        threads = [threading.Thread(target=get_class) for __ in range(20)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(classes), 20)
+        self.assertEqual(len(set(classes)), 1)
+        self.assertIs(MyChoiceAttributeMixin._classes_by_type[MyInt], classes[0])
+
     def test_it_should_access_choice_entry_attributes(self):
         """Test that an instance can access the choice entry and its attributes."""
         IntClass = ChoiceAttributeMixin.get_class_for_value(1)
@@ -938,6 +3134,91 @@ class ChoiceEntryTestCase(BaseTestCase):
         with self.assertRaises(ValueError):
             ChoiceEntry(('FOO', None, 'foo'))
 
+    def test_interning(self):
+        """Test that strings can be shared by all the entries of all ``Choices``."""
+
+        # Strings built at runtime, like when loaded from a file, are distinct objects.
+        def build(*parts):
+            return ''.join(parts)
+
+        first = Choices((build('ACT', 'IVE'), 1, build('Act', 'ive')))
+        second = Choices((build('ACT', 'IVE'), 1, build('Act', 'ive')))
+        self.assertIsNot(first.ACTIVE.display.original_value,
+                         second.ACTIVE.display.original_value)
+
+        enable_interning()
+        self.addCleanup(disable_interning)
+        stats = get_interning_stats()
+        self.assertTrue(stats['enabled'])
+
+        first = Choices((build('ACT', 'IVE'), 1, build('Act', 'ive')))
+        second = Choices((build('ACT', 'IVE'), build('act', 'ive'), build('Act', 'ive')))
+        for attribute in ('constant', 'display'):
+            self.assertIs(getattr(first.ACTIVE, attribute).original_value,
+                          getattr(second.ACTIVE, attribute).original_value)
+        # Each entry still has its own attributes.
+        self.assertIsNot(first.ACTIVE.display, second.ACTIVE.display)
+        self.assertEqual(second.ACTIVE, 'active')
+
+        new_stats = get_interning_stats()
+        self.assertEqual(new_stats['hits'] - stats['hits'], 2)
+        self.assertGreater(new_stats['bytes_saved'], stats['bytes_saved'])
+        self.assertEqual(new_stats['strings'] - stats['strings'], 3)
+
+        disable_interning()
+        self.assertFalse(get_interning_stats()['enabled'])
+        self.assertEqual(get_interning_stats()['strings'], 0)
+
+    def test_interning_pruning(self):
+        """Test that the interned strings no longer used are removed when the table grows."""
+
+        def build(prefix, size):
+            return Choices(*[(''.join([prefix, str(index)]), index, ''.join([prefix, 'display']))
+                             for index in range(size)])
+
+        enable_interning()
+        self.addCleanup(disable_interning)
+
+        kept = build('KEPT_', 100)
+        for index in range(10):
+            build('FREED_%d_' % index, MIN_INTERNED_STRINGS_PRUNING_SIZE // 2)
+            # Entries reference themselves through their attributes.
+            gc.collect()
+
+        strings = get_interning_stats()['strings']
+        self.assertLess(strings, 2 * MIN_INTERNED_STRINGS_PRUNING_SIZE)
+        self.assertGreaterEqual(strings, 101)
+
+        # The strings still used are still shared.
+        self.assertIs(build('KEPT_', 1).KEPT_0.constant.original_value,
+                      kept.KEPT_0.constant.original_value)
+        self.assertIs(build('KEPT_', 1).KEPT_0.display.original_value,
+                      kept.KEPT_99.display.original_value)
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+    def test_interning_memory(self):
+        """Test that interning frees the given strings, and that the stats match the memory saved."""
+
+        def build_all():
+            # Strings built at runtime, like when loaded from a file, are distinct objects.
+            return [Choices(*[(''.join(['CONSTANT_', str(index)]), index,
+                               ''.join(['Display name of the choice ', str(index)]))
+                              for index in range(20)])
+                    for __ in range(100)]
+
+        size_without = measure_memory(build_all)[0]
+
+        enable_interning()
+        self.addCleanup(disable_interning)
+        size_with, all_choices = measure_memory(build_all)
+        bytes_saved = get_interning_stats()['bytes_saved']
+
+        self.assertLess(size_with, size_without)
+        # The stats count the strings shared by the entries, what tracemalloc sees.
+        self.assertGreater(bytes_saved, 0)
+        self.assertAlmostEqual(bytes_saved, size_without - size_with, delta=bytes_saved * 0.2)
+        del all_choices
+
 
 class AutoDisplayChoicesTestCase(BaseTestCase):
 